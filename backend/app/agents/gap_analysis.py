@@ -4,20 +4,34 @@ Instructional Gap Analysis Module
 Implements the 6-step gap computation pipeline:
 1. Retrieve SOL expectations (RAG)
 2. Extract structured expectations from SOL text
+   (from the ingest-time expectation catalog where possible)
 3. Analyze student writing for evidence
 4. Compute missing skills (gaps)
 5. Rank gaps by importance
 6. Return structured gaps for prompt generation
+
+Steps 3-5 can instead run as one fused LLM call (fused_gaps), selected per
+stage with GAP_ANALYSIS_MODE / GAP_ANALYSIS_STAGE_MODES.
 """
-from typing import List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+from typing import List, Optional, Tuple, get_args
 from pydantic import BaseModel
 from app.agents.state import InstructionalGap, StandardReference
+from app.core.config import GapPipelineMode, get_settings
 from app.core.llm import get_llm
-from app.rag.retrieval import retrieve_sol_standards_sync
+from app.rag.corpus_version import acurrent_corpus_version
+from app.rag.expectation_catalog import aget_expectation_catalog
+from app.rag.expectation_cache import get_expectation_cache, standards_fingerprint
+from app.rag.queries import STAGE_MATCH_COUNT, stage_query
+from app.rag.retrieval import (
+    describe_standards, lookup_sol_standards, retrieve_progression, retrieve_sol_standards
+)
+from app.rag.sol_metadata import chunk_grades, codes_for_stage, grade_band, skill_for, split_code
 from app.rag.tavily_search import search_tavily_educational
 from langsmith import traceable
 from langchain_core.messages import SystemMessage, HumanMessage
-import json
 
 # Skill domains that can be identified
 SKILL_DOMAINS = [
@@ -56,15 +70,8 @@ Return a JSON array of expectations:
 Only return the JSON array, no other text."""
 
 
-EVIDENCE_ANALYSIS_PROMPT = """You are an educational writing analyst. Analyze this Grade {grade_level} student's writing for evidence of the following skills.
-
-Student's Writing:
-{student_text}
-
-Skills to Look For:
-{expectations_json}
-
-INSTRUCTIONS:
+# Shared by the evidence step and the fused pipeline (quotes are highlighted in the frontend)
+EVIDENCE_RULES = """INSTRUCTIONS:
 For each skill, look for ANY evidence.
 - If the student uses descriptive adjectives (e.g., "bright yellow", "big factory"), mark Elaboration/Word Choice as "yes".
 - If the student includes character traits (e.g., "hard working", "brave"), MARK AS EVIDENCE found.
@@ -94,7 +101,18 @@ NEGATIVE CONSTRAINTS (STRICTLY FORBIDDEN):
 - DO NOT use phrases like "The student uses..." or "The writing shows..." - these are NOT student text.
 - DO NOT create analysis language as if it were a quote.
 - EVERY negative_example MUST be a word-for-word substring of the student's writing above.
-- If you cannot find exact text to quote, leave negative_examples as an empty array [].
+- If you cannot find exact text to quote, leave negative_examples as an empty array []."""
+
+
+EVIDENCE_ANALYSIS_PROMPT = """You are an educational writing analyst. Analyze this Grade {grade_level} student's writing for evidence of the following skills.
+
+Student's Writing:
+{student_text}
+
+Skills to Look For:
+{expectations_json}
+
+""" + EVIDENCE_RULES + """
 
 For each skill, identify:
 1. Whether there is evidence the student demonstrates this skill (yes/partially/no)
@@ -148,6 +166,46 @@ Return a JSON array of the gaps in priority order (highest priority first), with
 Only return the JSON array, no other text."""
 
 
+FUSED_GAP_PROMPT = """You are an educational writing coach. Analyze this Grade {grade_level} student's writing in the {stage} stage against the skills below, then decide which gaps to address first.
+
+Student's Writing:
+{student_text}
+
+Skills to Look For:
+{expectations_json}
+
+""" + EVIDENCE_RULES + """
+
+For each skill, identify:
+1. Whether there is evidence the student demonstrates this skill (yes/partially/no)
+2. Negative examples: Quotes showing ERRORS or MISSING parts (e.g. misspelled words). QUOTE THE EXACT TEXT.
+3. What's missing or needs development
+
+Then keep only the skills marked "partially" or "no" and rank them from most to least important to address NOW, considering:
+1. What's most developmentally appropriate for this grade
+2. What will have the biggest impact on their writing (Ideas/Organization > Conventions usually)
+3. What's most relevant to the current stage ({stage})
+4. DEPRIORITIZE gaps with weak evidence (only 1-2 minor instances).
+5. DEPRIORITIZE "transitions" if the student is using natural phrases (like "then", "so") unless significantly choppy.
+
+Return a JSON array of the gaps in priority order (highest priority first):
+```json
+[
+  {{
+    "skill_domain": "...",
+    "evidence_level": "partially|no",
+    "description": "What they need to work on",
+    "sol_reference": "The expectation they're not meeting",
+    "severity": "high|medium|low",
+    "negative_examples": ["EXACT QUOTE OF TEXT WITH ERROR"],
+    "missing": "What needs improvement"
+  }}
+]
+```
+
+Only return the JSON array, no other text."""
+
+
 SUFFICIENCY_CHECK_PROMPT = """You are an educational data analyst validating RAG retrieval results.
 Goal: Determine if the retrieved SOL standards are SUFFICIENT and RELEVANT for the current task.
 
@@ -179,34 +237,78 @@ Check Stage Relevance.
 Only return the JSON object."""
 
 
-@traceable(run_type="chain", name="Extract Expectations")
-async def extract_expectations(
-    standards_text: str,
-    grade_level: str,
-    stage: str
-) -> List[dict]:
-    """Step 2: Extract structured expectations from SOL text."""
-    llm = get_llm()
-    
+def standard_reference(content: str, meta: Optional[dict]) -> StandardReference:
+    """StandardReference for a retrieved chunk, tagged from its ingest metadata when known."""
+    if not meta:
+        return StandardReference(content=content)
+    standards = meta.get("standards") or []
+    strand, number = meta.get("strand"), None
+    if standards:
+        _, strand, number = split_code(standards[0])
+    return StandardReference(
+        content=content,
+        skill=skill_for(strand, number) or meta.get("strand_name"),
+        grade_band=grade_band(chunk_grades(meta)),
+        source=meta.get("file_name"),
+    )
+
+
+def expectation_extractor_id(llm=None) -> str:
+    """Identifies the extraction prompt and model; cached and catalogued expectations are only reused for the same one."""
+    llm = llm or get_llm()
+    source = EXPECTATION_EXTRACTION_PROMPT + getattr(llm, "model_name", "")
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+async def request_expectations(standards_text: str, grade_level: str, stage: str) -> List[dict]:
+    """One extraction call to the LLM; raises if the answer is not a JSON list."""
     prompt = EXPECTATION_EXTRACTION_PROMPT.format(
         grade_level=grade_level,
         stage=stage,
         standards_text=standards_text
     )
-    
+    response = await get_llm().ainvoke([
+        SystemMessage(content="You are an educational standards analyst. Return only valid JSON."),
+        HumanMessage(content=prompt)
+    ])
+
+    # Extract JSON from response
+    content = response.content
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+    expectations = json.loads(content.strip())
+    if not isinstance(expectations, list):
+        raise ValueError(f"expected a JSON array of expectations, got {type(expectations).__name__}")
+    return expectations
+
+
+@traceable(run_type="chain", name="Extract Expectations")
+async def extract_expectations(
+    standards_text: str,
+    grade_level: str,
+    stage: str,
+    standards: Optional[List[str]] = None
+) -> List[dict]:
+    """
+    Step 2: Extract structured expectations from SOL text.
+
+    Results are cached per (grade, stage, standards fingerprint), so the
+    LLM only runs the first time a grade and stage see a set of standards.
+    standards is the list standards_text was joined from, if known.
+    """
+    cache = get_expectation_cache(expectation_extractor_id())
+    if cache is not None:
+        version = await acurrent_corpus_version()
+        fingerprint = standards_fingerprint(standards if standards is not None else [standards_text])
+        cached = cache.get(version, grade_level, stage, fingerprint)
+        if cached is not None:
+            print(f"  Expectations cache hit ({len(cached)} expectations)")
+            return cached
+
     try:
-        response = await llm.ainvoke([
-            SystemMessage(content="You are an educational standards analyst. Return only valid JSON."),
-            HumanMessage(content=prompt)
-        ])
-        
-        # Extract JSON from response
-        content = response.content
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        return json.loads(content.strip())
+        expectations = await request_expectations(standards_text, grade_level, stage)
     except Exception as e:
         print(f"CRITICAL ERROR in extract_expectations: {str(e)}")
         import traceback
@@ -214,6 +316,11 @@ async def extract_expectations(
         # Fallback: return basic expectation
         return [{"skill_domain": "general", "expectation": standards_text[:100] + "...", "indicators": []}]
 
+    # Only successful extractions are cached; the fallback above is retried next turn
+    if cache is not None:
+        cache.put(version, grade_level, stage, fingerprint, expectations)
+    return expectations
+
 
 @traceable(run_type="chain", name="Analyze Student Evidence")
 async def analyze_student_evidence(
@@ -268,6 +375,18 @@ async def analyze_student_evidence(
         ]
 
 
+def quote_in_text(quote: str, student_text: str) -> bool:
+    """Whether a quoted example actually occurs in the student's writing."""
+    if not quote or not student_text:
+        return False
+    # Normalize: lowercase, collapse whitespace
+    normalized_quote = ' '.join(quote.lower().split())
+    normalized_student = ' '.join(student_text.lower().split())
+    # Check if first 25 chars of quote exist in student text (handles minor variations)
+    check_portion = normalized_quote[:min(len(normalized_quote), 25)]
+    return check_portion in normalized_student
+
+
 async def compute_gaps(
     expectations: List[dict],
     evidence: List[dict],
@@ -276,17 +395,6 @@ async def compute_gaps(
     """Step 4: Compute missing skills (gaps) by comparing expectations to evidence."""
     gaps = []
     
-    # Helper to validate if text actually exists in student writing
-    def validate_evidence(quote: str) -> bool:
-        if not quote or not student_text:
-            return False
-        # Normalize: lowercase, collapse whitespace
-        normalized_quote = ' '.join(quote.lower().split())
-        normalized_student = ' '.join(student_text.lower().split())
-        # Check if first 25 chars of quote exist in student text (handles minor variations)
-        check_portion = normalized_quote[:min(len(normalized_quote), 25)]
-        return check_portion in normalized_student
-    
     # Create lookup by skill domain
     evidence_map = {e.get("skill_domain"): e for e in evidence}
     
@@ -303,7 +411,7 @@ async def compute_gaps(
             
             # VALIDATION: Filter out any errors that don't exist in student text
             if student_text:
-                validated_errors = [e for e in errors if validate_evidence(e)]
+                validated_errors = [e for e in errors if quote_in_text(e, student_text)]
             else:
                 validated_errors = errors
             
@@ -378,6 +486,102 @@ async def rank_gaps(
         ]
 
 
+GAP_PIPELINE_MODES = get_args(GapPipelineMode)
+SEVERITIES = ("low", "medium", "high")
+
+
+def gap_pipeline_mode(stage: str) -> str:
+    """
+    Steps 3-5 mode for a stage: GAP_ANALYSIS_STAGE_MODES overrides
+    GAP_ANALYSIS_MODE. Both are validated when Settings loads.
+    """
+    settings = get_settings()
+    return settings.GAP_ANALYSIS_STAGE_MODES.get(stage.lower(), settings.GAP_ANALYSIS_MODE)
+
+
+async def multistep_gaps(
+    student_text: str,
+    grade_level: str,
+    stage: str,
+    expectations: List[dict]
+) -> List[InstructionalGap]:
+    """Steps 3-5 as separate calls: evidence analysis, gap computation, ranking."""
+    print("  Step 3: Analyzing student evidence...")
+    evidence = await analyze_student_evidence(student_text, grade_level, expectations)
+
+    print("  Step 4: Computing gaps...")
+    raw_gaps = await compute_gaps(expectations, evidence, student_text)
+
+    print("  Step 5: Ranking gaps...")
+    return await rank_gaps(raw_gaps, grade_level, stage)
+
+
+@traceable(run_type="chain", name="Fused Gap Analysis")
+async def fused_gaps(
+    student_text: str,
+    grade_level: str,
+    stage: str,
+    expectations: List[dict]
+) -> List[InstructionalGap]:
+    """
+    Steps 3-5 in one LLM call: evidence, gaps and ranked severity come back
+    in a single structured response. Quotes are validated against the
+    writing like in compute_gaps. Falls back to multistep_gaps if the
+    response cannot be parsed, and when there is no writing yet.
+    """
+    if not student_text or not student_text.strip():
+        # No evidence to analyze: every expectation is a gap without asking the model
+        return await multistep_gaps(student_text, grade_level, stage, expectations)
+
+    print("  Steps 3-5: Fused evidence, gaps and ranking...")
+    llm = get_llm()
+
+    prompt = FUSED_GAP_PROMPT.format(
+        grade_level=grade_level,
+        stage=stage,
+        student_text=student_text[:2000],
+        expectations_json=json.dumps(expectations, indent=2)
+    )
+
+    try:
+        response = await llm.ainvoke([
+            SystemMessage(content="You are an educational writing coach. Return only valid JSON."),
+            HumanMessage(content=prompt)
+        ])
+        content = response.content
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0]
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0]
+        ranked = json.loads(content.strip())
+        if not isinstance(ranked, list):
+            raise ValueError("expected a JSON array of gaps")
+    except Exception as e:
+        # Parse and model/transport errors alike: the multi-step pipeline is the safe path
+        print(f"  Fused gap analysis unusable ({e}); falling back to the multi-step pipeline")
+        return await multistep_gaps(student_text, grade_level, stage, expectations)
+
+    gaps = []
+    for g in ranked:
+        if not isinstance(g, dict):
+            print(f"  Skipping malformed fused gap: {g!r}")
+            continue
+        if g.get("evidence_level", "no") not in ["no", "partially"]:
+            continue
+        errors = g.get("negative_examples") or []
+        if student_text:
+            errors = [e for e in errors if quote_in_text(e, student_text)]
+        severity = g.get("severity")
+        gaps.append(InstructionalGap(
+            skill_domain=g.get("skill_domain", "general"),
+            description=g.get("description") or g.get("missing", ""),
+            sol_reference=g.get("sol_reference"),
+            severity=severity if severity in SEVERITIES else "medium",
+            evidence=", ".join(errors) if errors else g.get("missing", "No specific errors cited")
+        ))
+    return gaps
+
+
 @traceable(run_type="chain", name="Check Sufficiency")
 async def check_sufficiency(
     standards_text: str,
@@ -413,7 +617,8 @@ async def compute_instructional_gaps(
     student_text: str,
     grade_level: str,
     stage: str,
-    retrieved_standards: Optional[List[str]] = None
+    retrieved_standards: Optional[List[str]] = None,
+    mode: Optional[GapPipelineMode] = None
 ) -> Tuple[List[InstructionalGap], List[StandardReference]]:
     """
     Complete 6-step instructional gap pipeline.
@@ -423,6 +628,7 @@ async def compute_instructional_gaps(
         grade_level: Student's grade (K, 1, 2, etc.)
         stage: Current writing stage (prewriting, drafting, etc.)
         retrieved_standards: Optional pre-retrieved standards
+        mode: "multistep" or "fused" for steps 3-5; defaults to gap_pipeline_mode(stage)
     
     Returns:
         Tuple of (instructional_gaps, referenced_standards)
@@ -432,14 +638,19 @@ async def compute_instructional_gaps(
     # Track if we had external standards (to skip validation)
     standards_pre_provided = retrieved_standards is not None and len(retrieved_standards) > 0
     
-    # Step 1: Retrieve SOL standards if not provided
+    # Step 1: Retrieve SOL standards if not provided. The standards taught in
+    # this stage are looked up by code first (SOL_CODE_LOOKUP_ENABLED); vector
+    # search is the fallback when no chunk carries those codes.
+    if not retrieved_standards and get_settings().SOL_CODE_LOOKUP_ENABLED:
+        exact = await lookup_sol_standards(codes_for_stage(grade_level, stage.lower()), STAGE_MATCH_COUNT)
+        retrieved_standards = [row["content"] for row in exact]
     if not retrieved_standards:
-        query = f"{stage} writing skills grade {grade_level}"
-        retrieved_standards = retrieve_sol_standards_sync(
+        query = stage_query(stage, grade_level)
+        retrieved_standards = await retrieve_sol_standards(
             query=query,
             grade_level=grade_level,
             stage=stage,
-            match_count=5
+            match_count=STAGE_MATCH_COUNT
         )
     
     if not retrieved_standards:
@@ -448,8 +659,8 @@ async def compute_instructional_gaps(
     
     # Create StandardReference objects
     standard_refs = [
-        StandardReference(content=s, skill=None, grade_band=None, source=None)
-        for s in retrieved_standards
+        standard_reference(s, meta)
+        for s, meta in zip(retrieved_standards, await describe_standards(retrieved_standards))
     ]
     
     standards_text = "\n\n".join(retrieved_standards)
@@ -461,7 +672,17 @@ async def compute_instructional_gaps(
         sufficiency = await check_sufficiency(standards_text, grade_level, stage)
         print(f"    Sufficient: {sufficiency.get('sufficient')} - {sufficiency.get('reason')}")
         
+        progression = []
         if not sufficiency.get("sufficient", True):
+            # Same skills in this grade's progression entries and the adjacent grades, from local data
+            progression = await retrieve_progression(grade_level, stage, exclude=retrieved_standards)
+        if progression:
+            print(f"  RAG Insufficient. Expanded with {len(progression)} progression standards.")
+            retrieved_standards = retrieved_standards + progression
+            progression_meta = await describe_standards(progression)
+            standard_refs.extend(standard_reference(s, meta) for s, meta in zip(progression, progression_meta))
+            standards_text = "\n\n".join(retrieved_standards)
+        elif not sufficiency.get("sufficient", True):
             print("  RAG Insufficient. Attempting Tavily Context Expansion...")
             
             # Map stages to specific keywords (Context of Agent/Subagent)
@@ -475,7 +696,9 @@ async def compute_instructional_gaps(
             keywords = stage_keywords.get(stage.lower(), "writing skills")
             
             # Fallback to Tavily
-            tavily_results = search_tavily_educational(f"{stage} writing grade {grade_level} {keywords}")
+            tavily_results = await asyncio.to_thread(
+                search_tavily_educational, f"{stage} writing grade {grade_level} {keywords}"
+            )
             
             if tavily_results:
                 print(f"  Context expanded with {len(tavily_results)} web results.")
@@ -500,21 +723,24 @@ async def compute_instructional_gaps(
     else:
         print("  Skipping sufficiency check (using provided/expanded standards).")
 
-    # Step 2: Extract structured expectations
+    # Step 2: Extract structured expectations. Chunks catalogued at ingest
+    # time are looked up; only the rest (e.g. web results) go to the LLM.
     print("  Step 2: Extracting expectations...")
-    expectations = await extract_expectations(standards_text, grade_level, stage)
-    
-    # Step 3: Analyze student evidence
-    print("  Step 3: Analyzing student evidence...")
-    evidence = await analyze_student_evidence(student_text, grade_level, expectations)
-    
-    # Step 4: Compute gaps
-    print("  Step 4: Computing gaps...")
-    raw_gaps = await compute_gaps(expectations, evidence, student_text)
+    expectations, uncatalogued = [], retrieved_standards
+    catalog = await aget_expectation_catalog(expectation_extractor_id())
+    if catalog is not None:
+        expectations, uncatalogued = catalog.split(retrieved_standards, grade_level, stage)
+        print(f"    {len(retrieved_standards) - len(uncatalogued)} of {len(retrieved_standards)} standards catalogued")
+    if uncatalogued:
+        expectations += await extract_expectations(
+            "\n\n".join(uncatalogued), grade_level, stage, standards=uncatalogued
+        )
     
-    # Step 5: Rank gaps
-    print("  Step 5: Ranking gaps...")
-    ranked_gaps = await rank_gaps(raw_gaps, grade_level, stage)
+    # Steps 3-5: Evidence, gaps and ranking, as separate calls or one fused call
+    if (mode or gap_pipeline_mode(stage)) == "fused":
+        ranked_gaps = await fused_gaps(student_text, grade_level, stage, expectations)
+    else:
+        ranked_gaps = await multistep_gaps(student_text, grade_level, stage, expectations)
     
     print(f"  Found {len(ranked_gaps)} instructional gaps")
     for i, gap in enumerate(ranked_gaps):
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Literal
 from langgraph.graph import StateGraph, END
 from app.agents.state import WritingState
@@ -5,10 +6,55 @@ from app.agents.stages.prewriting import prewriting_node
 from app.agents.stages.drafting import drafting_node
 from app.agents.stages.revising import revising_node
 from app.agents.stages.editing import editing_node
-from app.rag.retrieval import retrieve_sol_standards_sync
+from app.core.config import get_settings
+from app.rag.queries import SYNONYM_MATCH_COUNT, stage_query, synonym_query
+from app.rag.retrieval import retrieve_fused, retrieve_progression, retrieve_sol_standards
+
+MAX_RETRIEVAL_ATTEMPTS = 2
 
 # --- Context Expansion Node ---
-def expand_rag_context(state: WritingState) -> dict:
+async def _resolved(value):
+    return value
+
+
+async def _fanout_expansion(stage: str, grade_level: str) -> dict:
+    """
+    Single-step expansion: base, synonym and progression (or, when the
+    corpus has no progression entries for the stage, web) results are merged
+    by rank fusion, so the graph makes one retrieval decision instead of
+    looping once per tier.
+    """
+    from app.agents.tools.web_search import tavily_search_safe
+
+    queries = [stage_query(stage, grade_level), synonym_query(stage, grade_level)]
+    extra_sources = {}
+    # In-memory progression lookup first; the web is only needed when it finds nothing
+    progression = await retrieve_progression(grade_level, stage)
+    if progression:
+        extra_sources["sol_progression"] = _resolved(progression)
+    elif get_settings().RAG_FANOUT_INCLUDE_WEB:
+        extra_sources["web_search"] = asyncio.to_thread(tavily_search_safe, stage, grade_level)
+    print(f"  Fan-out Expansion: {queries} + {list(extra_sources) or 'no web'}")
+
+    fused = await retrieve_fused(
+        queries,
+        grade_level=grade_level,
+        stage=stage,
+        match_count=SYNONYM_MATCH_COUNT,
+        extra_sources=extra_sources
+    )
+    return {
+        "retrieved_standards": [
+            {"content": content, "source": "expanded_db" if source == "sol_db" else source}
+            for content, source in fused
+        ],
+        "rag_status": "expanded",
+        # One fused pass replaces every tier; a further insufficiency goes straight to the cap.
+        "retrieval_attempts": MAX_RETRIEVAL_ATTEMPTS
+    }
+
+
+async def expand_rag_context(state: WritingState) -> dict:
     """
     Expands the search query when retrieved standards are insufficient.
     Strictly maintains grade level but uses synonyms for the stage.
@@ -19,12 +65,15 @@ def expand_rag_context(state: WritingState) -> dict:
     attempts = state.get("retrieval_attempts", 0)
     
     # 1. Check max attempts (limit to 2 retries)
-    if attempts >= 2:
+    if attempts >= MAX_RETRIEVAL_ATTEMPTS:
         print("  Max retries reached. Proceeding with available context.")
         return {
             "rag_status": "sufficient", # Force proceed
             "retrieval_attempts": attempts + 1
         }
+
+    if get_settings().RAG_EXPANSION_MODE == "fanout":
+        return await _fanout_expansion(stage, grade_level)
     
     # Tiered Expansion Strategy
     retrieved_standards = []
@@ -33,33 +82,31 @@ def expand_rag_context(state: WritingState) -> dict:
     # Attempt 0 -> 1: Synonym Expansion (Existing DB)
     if attempts == 0:
         # Generate expanded synonyms for the stage
-        synonyms = {
-            "prewriting": "brainstorming, planning, outlining, organizing ideas",
-            "drafting": "writing paragraphs, sentence structure, elaboration, drafting",
-            "revising": "improving content, organization, clarity, flow, revision",
-            "editing": "grammar, punctuation, capitalization, spelling, editing"
-        }
-        
-        stage_synonyms = synonyms.get(stage, stage)
-        query = f"{stage_synonyms} skills grade {grade_level}"
+        query = synonym_query(stage, grade_level)
         print(f"  Expansion Attempt {attempts+1}: Synonym Query: {query}")
         
-        retrieved_standards = retrieve_sol_standards_sync(
+        retrieved_standards = await retrieve_sol_standards(
             query=query,
             grade_level=grade_level,
             stage=stage,
-            match_count=8 # Increase recall
+            match_count=SYNONYM_MATCH_COUNT # Increase recall
         )
 
-    # Attempt 1 -> 2: Tavily Web Search (Fallback)
+    # Attempt 1 -> 2: Same skills along the grade progression (local),
+    # then Tavily Web Search (Fallback) if the corpus has none
     elif attempts == 1:
-        from app.agents.tools.web_search import tavily_search_safe
-        print(f"  Expansion Attempt {attempts+1}: Tavily Web Search Fallback")
-        
-        # We can use the simple stage name, the utility constructs the complex query
-        web_results = tavily_search_safe(query=stage, grade_level=grade_level)
-        retrieved_standards = web_results
-        source_label = "web_search"
+        retrieved_standards = await retrieve_progression(grade_level, stage)
+        source_label = "sol_progression"
+        print(f"  Expansion Attempt {attempts+1}: {len(retrieved_standards)} progression standards")
+
+        if not retrieved_standards:
+            from app.agents.tools.web_search import tavily_search_safe
+            print(f"  Expansion Attempt {attempts+1}: Tavily Web Search Fallback")
+
+            # We can use the simple stage name, the utility constructs the complex query
+            web_results = await asyncio.to_thread(tavily_search_safe, query=stage, grade_level=grade_level)
+            retrieved_standards = web_results
+            source_label = "web_search"
 
     
     # Pack as StandardReference dicts
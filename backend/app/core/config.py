@@ -1,6 +1,14 @@
+from typing import Literal
+from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 
+EmbeddingBackend = Literal["torch", "onnx", "onnx-int8"]
+SearchMode = Literal["exact", "halfvec", "binary"]
+SearchBackend = Literal["rest", "asyncpg"]
+ExpansionMode = Literal["fanout", "sequential"]
+GapPipelineMode = Literal["multistep", "fused"]
+
 class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_KEY: str
@@ -8,9 +16,84 @@ class Settings(BaseSettings):
     LANGCHAIN_TRACING_V2: str = "false"
     LANGCHAIN_PROJECT: str = "piwrite"
     LANGCHAIN_API_KEY: str | None = None
+
+    # MiniLM embedding backend: "torch", "onnx" or "onnx-int8" (app/rag/onnx_embeddings.py)
+    EMBEDDING_BACKEND: EmbeddingBackend = "torch"
+    EMBEDDING_ONNX_DIR: str = "models/minilm-onnx"
+    EMBEDDING_ONNX_THREADS: int = 0  # 0 = onnxruntime default
+
+    # Unix socket of the shared embedding server (python -m app.rag.embedding_server).
+    # Unset = embed in-process; set but unreachable = fall back to in-process.
+    EMBEDDING_SERVER_SOCKET: str | None = None
+
+    # Threads available for query embedding inference (app/rag/embeddings.py)
+    EMBEDDING_MAX_WORKERS: int = 2
+
+    # Micro-batching of concurrent query embeddings (app/rag/embedding_batcher.py)
+    EMBEDDING_BATCHING_ENABLED: bool = True
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_WAIT_MS: float = 5.0
+
+    # Content-addressed on-disk vector cache shared by ingest and queries (app/rag/embedding_cache.py);
+    # writes under EMBEDDING_CACHE_DIR, which must be writable (it is disabled with a warning otherwise)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: str = "models/embedding-cache"
+
+    # In-process SOL vector index (app/rag/vector_index.py)
+    SOL_INDEX_ENABLED: bool = True
+    SOL_INDEX_REFRESH_SECONDS: int = 60
+    SOL_SNAPSHOT_PATH: str | None = None  # corpus snapshot file to cold-start from (app/rag/corpus_snapshot.py)
+    # "exact", or a quantized candidate scan with exact rescoring: "halfvec" / "binary" in
+    # match_sol_standards (migrations/08), "binary" in the local index
+    SOL_SEARCH_MODE: SearchMode = "exact"
+    SOL_RESCORE_FACTOR: int = 10  # candidates rescored per requested result
+    # Fallback search when the index is not loaded: "rest" (match_sol_standards over PostgREST)
+    # or "asyncpg" (pooled direct connection to SOL_DATABASE_URL, app/rag/pg_search.py)
+    SOL_SEARCH_BACKEND: SearchBackend = "rest"
+    SOL_DATABASE_URL: str | None = None  # direct or session-mode Postgres DSN, not a transaction pooler
+    SOL_PG_POOL_MIN_SIZE: int = 1
+    SOL_PG_POOL_MAX_SIZE: int = 10
+    SOL_HYBRID_SEARCH: bool = True  # fuse BM25 with vector results (app/rag/bm25.py)
+    SOL_RRF_K: int = 60
+    SOL_MMR_ENABLED: bool = True  # diversify results by maximal marginal relevance
+    SOL_MMR_LAMBDA: float = 0.7  # 1.0 = pure relevance, 0.0 = pure diversity
+    SOL_CODE_LOOKUP_ENABLED: bool = True  # gap analysis step 1 looks the stage's SOL codes up before searching
+
+    # Context expansion: "fanout" (base + synonym + progression concurrently, rank-fused)
+    # or "sequential" (one tier per graph loop, web search as the last tier)
+    RAG_EXPANSION_MODE: ExpansionMode = "fanout"
+    RAG_FANOUT_INCLUDE_WEB: bool = False  # fanout also calls Tavily when the corpus has no progression
+
+    # Retrieval result cache (app/rag/retrieval_cache.py)
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 512
+    RETRIEVAL_CACHE_WARM_ON_STARTUP: bool = False  # embeds and searches the grade x stage grid at startup
+
+    # Gap analysis steps 3-5 (app/agents/gap_analysis.py): "multistep" (evidence, gaps and
+    # ranking as separate LLM calls) or "fused" (one structured call); per-stage overrides win
+    GAP_ANALYSIS_MODE: GapPipelineMode = "multistep"
+    GAP_ANALYSIS_STAGE_MODES: dict[str, GapPipelineMode] = {}  # e.g. {"editing": "fused"}
+
+    # Extracted-expectation cache for gap analysis step 2 (app/rag/expectation_cache.py)
+    EXPECTATION_CACHE_ENABLED: bool = True
+    EXPECTATION_CACHE_MAX_ENTRIES: int = 256
+    EXPECTATION_CACHE_DIR: str | None = "models/expectation-cache"  # None = in-memory only
+
+    # Streaming SOL ingest pipeline (app/rag/ingest_pipeline.py)
+    INGEST_PARSE_WORKERS: int = 0  # 0 = one process per CPU
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_UPLOAD_CONCURRENCY: int = 4
+    INGEST_UPLOAD_RETRIES: int = 3
+    INGEST_DEDUP_THRESHOLD: float = 0.85  # near-duplicate chunk similarity (app/rag/dedup.py); 0 = keep all
+    INGEST_EXPECTATION_CATALOG: bool = True  # LLM-extract the expectation catalog before activation (app/rag/expectation_catalog.py)
+    INGEST_CATALOG_CONCURRENCY: int = 4  # concurrent LLM extraction calls
     
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
+    @field_validator("GAP_ANALYSIS_STAGE_MODES")
+    @classmethod
+    def _lowercase_stages(cls, modes: dict) -> dict:
+        return {stage.lower(): mode for stage, mode in modes.items()}
+
 @lru_cache
 def get_settings():
     return Settings()
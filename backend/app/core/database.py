@@ -1,7 +1,16 @@
-from supabase import create_client, Client
+from supabase import create_client, Client, acreate_client, AsyncClient
 from app.core.config import get_settings
 
 settings = get_settings()
 
+_async_client: AsyncClient | None = None
+
 def get_supabase_client() -> Client:
     return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+
+async def get_async_supabase_client() -> AsyncClient:
+    """Returns a shared async client for use inside request handlers and graph nodes."""
+    global _async_client
+    if _async_client is None:
+        _async_client = await acreate_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    return _async_client
@@ -0,0 +1,96 @@
+"""
+Local BM25 inverted index over the SOL chunks.
+
+Keyword-heavy queries ("grammar, punctuation, capitalization, spelling") are
+often below the MiniLM similarity threshold even when a chunk contains every
+term. This index is built from the same rows as the in-process vector index
+and its rankings are fused with vector results in app/rag/retrieval.py.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into",
+    "is", "it", "of", "on", "or", "that", "the", "their", "this", "to", "will",
+    "with", "skills", "grade", "student", "students",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; keeps SOL codes like '3.w.1' intact."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents."""
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_count = len(documents)
+
+        lengths = np.zeros(self.doc_count, dtype=np.float32)
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc_id, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        avg_length = float(lengths.mean()) if self.doc_count else 0.0
+        # Length normalisation is per document and query independent: precompute it.
+        self._norm = self.k1 * (1 - self.b + self.b * lengths / (avg_length or 1.0))
+
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, entries in postings.items():
+            doc_ids = np.fromiter((d for d, _ in entries), dtype=np.int64, count=len(entries))
+            tfs = np.fromiter((tf for _, tf in entries), dtype=np.float32, count=len(entries))
+            df = len(entries)
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            self._postings[term] = (doc_ids, tfs, idf)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query."""
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tfs, idf = posting
+            scores[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[doc_ids])
+        return scores
+
+    def search(self, query: str, top_k: int, rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Returns up to top_k (doc id, score) pairs with a positive score,
+        optionally restricted to the given candidate rows.
+        """
+        scores = self.scores(query)
+        candidates = rows if rows is not None else np.arange(self.doc_count)
+        if candidates.size == 0 or top_k <= 0:
+            return []
+        candidate_scores = scores[candidates]
+        positive = np.flatnonzero(candidate_scores > 0)
+        if positive.size > top_k:
+            positive = positive[np.argpartition(candidate_scores[positive], -top_k)[-top_k:]]
+        order = positive[np.argsort(-candidate_scores[positive])]
+        return [(int(candidates[i]), float(candidate_scores[i])) for i in order]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """
+    Fuses several ranked lists of ids into one: score(id) = sum 1 / (k + rank).
+
+    Returns (id, fused score) pairs, best first.
+    """
+    fused: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            fused[item_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
@@ -0,0 +1,167 @@
+"""
+Single-file binary snapshot of the SOL corpus.
+
+Lets a worker, a test machine or an offline classroom box serve retrieval
+without a live Supabase. Layout (all sections 64-byte aligned):
+
+    magic "SOLSNAP1" | uint32 header length | JSON header
+    embeddings   rows x dim, float32 or float16, L2-normalised
+    string tables, one per column (ids, contents, metadata JSON, chunk hashes):
+        uint64 offsets[rows + 1] followed by the UTF-8 blob
+
+The file is memory-mapped on open: float32 embeddings are used in place and
+strings are decoded only when a row is read.
+"""
+import json
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+MAGIC = b"SOLSNAP1"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+def _padding(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+
+def _string_table(values: Sequence[str]) -> bytes:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets.tobytes() + b"".join(encoded)
+
+
+def write_snapshot(
+    path: str,
+    ids: Sequence[str],
+    contents: Sequence[str],
+    metadata: Sequence[dict],
+    embeddings,
+    version: Optional[str] = None,
+    chunk_hashes: Optional[Sequence[Optional[str]]] = None,
+    dtype: str = "float32",
+) -> int:
+    """Writes the corpus atomically (temp file + rename). Returns the file size."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported snapshot dtype '{dtype}' (expected one of {tuple(DTYPES)})")
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    rows = len(ids)
+    if matrix.size == 0:
+        matrix = matrix.reshape(rows, 0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = np.ascontiguousarray(matrix / norms, dtype=DTYPES[dtype])
+
+    columns = {
+        "ids": [str(i) for i in ids],
+        "contents": list(contents),
+        "metadata": [json.dumps(m or {}, separators=(",", ":")) for m in metadata],
+        "chunk_hashes": [h or "" for h in (chunk_hashes or [""] * rows)],
+    }
+    blobs = {"embeddings": matrix.tobytes()}
+    blobs.update({name: _string_table(values) for name, values in columns.items()})
+
+    header = {
+        "format": FORMAT_VERSION,
+        "version": version,
+        "rows": rows,
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "dtype": dtype,
+        "sections": {},
+    }
+    # Section offsets depend on the header length and vice versa: size the
+    # header for the widest possible offsets, then pad it to that size.
+    widest = dict(header, sections={name: [10 ** 15, 10 ** 15] for name in blobs})
+    header_size = len(json.dumps(widest).encode("utf-8"))
+    offset = len(MAGIC) + 4 + header_size
+    for name, blob in blobs.items():
+        offset += _padding(offset)
+        header["sections"][name] = [offset, len(blob)]
+        offset += len(blob)
+    header_bytes = json.dumps(header).encode("utf-8").ljust(header_size)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", header_size) + header_bytes)
+        for name, blob in blobs.items():
+            f.write(b"\0" * (header["sections"][name][0] - f.tell()))
+            f.write(blob)
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+class _StringColumn(Sequence):
+    """Read-only view of a string table; rows are decoded on access."""
+
+    def __init__(self, buffer, offset: int, rows: int, decode=None):
+        self._offsets = np.frombuffer(buffer, dtype="<u8", count=rows + 1, offset=offset)
+        self._blob_start = offset + (rows + 1) * 8
+        self._buffer = buffer
+        self._rows = rows
+        self._decode = decode
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(self._rows))]
+        if row < 0:
+            row += self._rows
+        start = self._blob_start + int(self._offsets[row])
+        end = self._blob_start + int(self._offsets[row + 1])
+        value = bytes(self._buffer[start:end]).decode("utf-8")
+        return self._decode(value) if self._decode else value
+
+
+class CorpusSnapshot:
+    """A memory-mapped snapshot file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a SOL corpus snapshot")
+        (header_size,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header: Dict = json.loads(bytes(self._mmap[start:start + header_size]))
+        if self.header["format"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.header['format']}")
+
+        self.version: Optional[str] = self.header["version"]
+        self.rows: int = self.header["rows"]
+        self.dim: int = self.header["dim"]
+        sections = self.header["sections"]
+
+        offset, _ = sections["embeddings"]
+        self.embeddings = np.frombuffer(
+            self._mmap, dtype=DTYPES[self.header["dtype"]], count=self.rows * self.dim, offset=offset
+        ).reshape(self.rows, self.dim)
+        self.ids = _StringColumn(self._mmap, sections["ids"][0], self.rows)
+        self.contents = _StringColumn(self._mmap, sections["contents"][0], self.rows)
+        self.metadata = _StringColumn(self._mmap, sections["metadata"][0], self.rows, decode=json.loads)
+        self.chunk_hashes = _StringColumn(self._mmap, sections["chunk_hashes"][0], self.rows)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def rows_as_dicts(self) -> List[dict]:
+        """Materialises every row (for re-importing into Supabase)."""
+        return [
+            {
+                "id": self.ids[i],
+                "content": self.contents[i],
+                "metadata": self.metadata[i],
+                "chunk_hash": self.chunk_hashes[i] or None,
+                "embedding": self.embeddings[i].astype(np.float32).tolist(),
+            }
+            for i in range(self.rows)
+        ]
@@ -0,0 +1,139 @@
+"""
+Corpus version tracking for sol_standards.
+
+Every sol_standards row belongs to a corpus snapshot. Ingest builds a new
+snapshot next to the live one and flips the single-row sol_corpus_state
+pointer to it atomically (migrations/04_sol_corpus_snapshots.sql). Workers
+poll the pointer (at most every
+SOL_INDEX_REFRESH_SECONDS) and key every in-process cache off the value, so a
+re-ingest invalidates them without any cross-process signalling.
+"""
+import threading
+import time
+import uuid
+from typing import Optional
+
+from app.core.config import get_settings
+from app.core.database import get_supabase_client, get_async_supabase_client
+
+ROW_COUNT_PREFIX = "count:"
+
+
+def fetch_corpus_version(client) -> str:
+    """Reads the published corpus version, falling back to a row-count signature."""
+    try:
+        response = client.table("sol_corpus_state").select("version").eq("id", 1).execute()
+        if response.data:
+            return response.data[0]["version"]
+    except Exception as e:
+        print(f"[RAG_VERSION] sol_corpus_state unavailable ({e}); using row count")
+
+    response = client.table("sol_standards").select("id", count="exact").limit(1).execute()
+    return f"{ROW_COUNT_PREFIX}{response.count}"
+
+
+async def afetch_corpus_version(client) -> str:
+    """Async-client variant of fetch_corpus_version."""
+    try:
+        response = await client.table("sol_corpus_state").select("version").eq("id", 1).execute()
+        if response.data:
+            return response.data[0]["version"]
+    except Exception as e:
+        print(f"[RAG_VERSION] sol_corpus_state unavailable ({e}); using row count")
+
+    response = await client.table("sol_standards").select("id", count="exact").limit(1).execute()
+    return f"{ROW_COUNT_PREFIX}{response.count}"
+
+
+def is_snapshot_version(version: Optional[str]) -> bool:
+    """False for the row-count fallback, which does not name a sol_standards snapshot."""
+    return bool(version) and not version.startswith(ROW_COUNT_PREFIX)
+
+
+def create_corpus_version(client) -> str:
+    """Registers a new snapshot in 'building' state; ingest writes its rows next to the live ones."""
+    version = uuid.uuid4().hex
+    client.table("sol_corpus_versions").insert({"version": version, "status": "building"}).execute()
+    return version
+
+
+def activate_corpus_version(client, version: str, expected_count: int) -> Optional[str]:
+    """
+    Validates the snapshot server-side and atomically makes it the active one.
+    Raises if it does not hold exactly expected_count embedded chunks.
+    Returns the version it replaced.
+    """
+    response = client.rpc(
+        "activate_sol_corpus_version",
+        {"new_version": version, "expected_count": expected_count},
+    ).execute()
+    print(f"Activated SOL corpus version {version} (replaced {response.data})")
+    return response.data
+
+
+def discard_corpus_version(client, version: str):
+    """Marks a snapshot that failed to build and removes its rows. The live version is untouched."""
+    client.table("sol_corpus_versions").update({"status": "failed"}).eq("version", version).execute()
+    client.table("sol_standards").delete().eq("corpus_version", version).execute()
+
+
+class _VersionTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version: Optional[str] = None
+        self.checked_at = 0.0
+
+    def is_fresh(self) -> bool:
+        refresh_seconds = get_settings().SOL_INDEX_REFRESH_SECONDS
+        return self.version is not None and time.monotonic() - self.checked_at < refresh_seconds
+
+    def set(self, version: Optional[str]):
+        with self._lock:
+            if version is not None:
+                self.version = version
+            self.checked_at = time.monotonic()
+
+    def get(self) -> Optional[str]:
+        if self.is_fresh():
+            return self.version
+        # The round trip happens outside the lock so a slow database never blocks set()/invalidate()
+        version = None
+        try:
+            version = fetch_corpus_version(get_supabase_client())
+        except Exception as e:
+            # Keep the last known version so caches stay usable during a blip.
+            print(f"[RAG_VERSION] Error checking corpus version: {e}")
+        self.set(version)
+        return self.version
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+            self.checked_at = 0.0
+
+
+_tracker = _VersionTracker()
+
+
+def current_corpus_version() -> Optional[str]:
+    """Returns the corpus version this worker currently believes is live."""
+    return _tracker.get()
+
+
+async def acurrent_corpus_version() -> Optional[str]:
+    """Async variant of current_corpus_version; polls with the async Supabase client."""
+    if _tracker.is_fresh():
+        return _tracker.version
+    version = None
+    try:
+        client = await get_async_supabase_client()
+        version = await afetch_corpus_version(client)
+    except Exception as e:
+        print(f"[RAG_VERSION] Error checking corpus version: {e}")
+    _tracker.set(version)
+    return _tracker.version
+
+
+def invalidate_corpus_version():
+    """Forces the next current_corpus_version() call to re-read the database."""
+    _tracker.invalidate()
@@ -0,0 +1,151 @@
+"""
+Near-duplicate chunk detection for SOL ingest (MinHash + LSH).
+
+The SOL folder repeats a lot of text: Side By Side documents for overlapping
+grade bands, Understanding the Standards files, a "- Copy" file, plus the
+splitter overlap. Each chunk gets a MinHash signature over word shingles;
+LSH banding finds candidate pairs without comparing every chunk to every
+other, and a candidate counts as a duplicate when the signatures agree on at
+least `threshold` of their positions (estimated Jaccard similarity).
+
+Only the first chunk of a near-duplicate group is kept. Its metadata records
+every source file with the grades that file assigned (`sources`) and the
+content hash of each (`source_hashes`, so incremental ingest knows when a
+merged file changed), and its `grades` become the union, so grade-filtered
+retrieval still finds it.
+"""
+import hashlib
+import re
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+from app.rag.sol_metadata import sort_grades
+
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_SIZE = 5
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """32-bit hashes of the word n-grams of a text (the whole text if it is shorter)."""
+    words = _WORD.findall(text.lower())
+    grams = {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams],
+        dtype=np.uint64,
+    )
+
+
+class MinHasher:
+    """Fixed family of num_perm hash permutations (same seed -> comparable signatures)."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingle_hashes(text)
+        # uint64 products wrap around; that is fine for a hash family
+        permuted = ((hashes[:, None] * self.a + self.b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """LSH index over MinHash signatures that maps each new chunk to its canonical chunk."""
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = NUM_PERM, bands: int = BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.rows_per_band = num_perm // bands
+        self._buckets: List[Dict[bytes, List[Hashable]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+        self.seen = 0
+        self.duplicates = 0
+
+    def _bands(self, signature: np.ndarray):
+        for band in range(len(self._buckets)):
+            yield band, signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes()
+
+    def _query(self, signature: np.ndarray) -> Optional[Hashable]:
+        candidates = set()
+        for band, key in self._bands(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = float(np.mean(self._signatures[candidate] == signature))
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def add(self, key: Hashable, text: str) -> Optional[Hashable]:
+        """
+        Returns the canonical key `text` nearly duplicates, or None after
+        indexing it as a new canonical chunk under `key`.
+        """
+        self.seen += 1
+        signature = self.hasher.signature(text)
+        match = self._query(signature)
+        if match is not None:
+            self.duplicates += 1
+            return match
+        self._signatures[key] = signature
+        for band, bucket_key in self._bands(signature):
+            self._buckets[band].setdefault(bucket_key, []).append(key)
+        return None
+
+    def report(self) -> str:
+        kept = self.seen - self.duplicates
+        shrink = self.duplicates / self.seen * 100 if self.seen else 0.0
+        return (f"dedup   {self.duplicates} of {self.seen} chunks were near-duplicates "
+                f"(threshold {self.threshold}); {kept} kept, corpus {shrink:.1f}% smaller")
+
+
+def chunk_sources(meta: dict) -> Dict[str, List[str]]:
+    """Source file -> grades for a chunk; a chunk that absorbed no duplicates has one source."""
+    if meta.get("sources"):
+        return {name: list(grades) for name, grades in meta["sources"].items()}
+    return {meta.get("file_name", ""): list(meta.get("grades") or [])}
+
+
+def chunk_source_hashes(meta: dict) -> Dict[str, str]:
+    """Source file -> content hash for every file a chunk stands for."""
+    if meta.get("source_hashes"):
+        return dict(meta["source_hashes"])
+    return {meta.get("file_name", ""): meta.get("source_hash", "")}
+
+
+def set_sources(meta: dict, sources: Dict[str, List[str]], source_hashes: Optional[Dict[str, str]] = None):
+    """Rewrites a canonical chunk's sources and the grade tags derived from them."""
+    grades = sort_grades(g for source_grades in sources.values() for g in source_grades)
+    meta["grades"] = grades
+    meta.pop("grade", None)
+    if len(grades) == 1:
+        meta["grade"] = grades[0]
+    if len(sources) > 1:
+        meta["sources"] = sources
+        if source_hashes is not None:
+            meta["source_hashes"] = source_hashes
+    else:
+        meta.pop("sources", None)
+        meta.pop("source_hashes", None)
+
+
+def merge_duplicate(canonical: dict, duplicate: dict):
+    """Folds a dropped near-duplicate's sources, grades and standards into the canonical metadata."""
+    sources = chunk_sources(canonical)
+    for name, grades in chunk_sources(duplicate).items():
+        sources[name] = sort_grades(sources.get(name, []) + grades)
+    source_hashes = chunk_source_hashes(canonical)
+    source_hashes.update(chunk_source_hashes(duplicate))
+    set_sources(canonical, sources, source_hashes)
+    standards = list(canonical.get("standards") or [])
+    canonical["standards"] = standards + [s for s in duplicate.get("standards") or [] if s not in standards]
@@ -0,0 +1,118 @@
+"""
+Micro-batching dispatcher for query embeddings.
+
+Concurrent embed calls (e.g. a classroom of students hitting /invoke at once)
+are collected for up to `max_wait_ms` or `max_batch_size` texts and embedded
+in a single batched forward pass. Each caller awaits its own future.
+"""
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Tuple
+
+
+class EmbeddingBatcher:
+    """Groups concurrent embedding requests into batched calls to `embed_batch`."""
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        executor: Optional[Executor] = None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 1,
+    ):
+        self.embed_batch = embed_batch
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self._stats_lock = threading.Lock()
+        self.batch_sizes: Counter = Counter()
+        self.total_requests = 0
+        self.total_batches = 0
+        self.total_errors = 0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # Queues and tasks are bound to one event loop; rebuild if it changed.
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = loop.create_task(self._run())
+
+    async def embed(self, text: str) -> List[float]:
+        """Embeds a single text, sharing a forward pass with concurrent callers."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # While all batch slots are busy, new requests pile up and form a larger next batch.
+            await self._slots.acquire()
+            batch = await self._collect()
+            self._loop.create_task(self._process(batch))
+
+    async def _process(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await self._loop.run_in_executor(self.executor, self.embed_batch, texts)
+        except Exception as e:
+            self._record(len(batch), error=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            self._record(len(batch))
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(list(vector))
+        finally:
+            self._slots.release()
+
+    def _record(self, size: int, error: bool = False):
+        with self._stats_lock:
+            self.batch_sizes[size] += 1
+            self.total_requests += size
+            self.total_batches += 1
+            if error:
+                self.total_errors += 1
+
+    def stats(self) -> dict:
+        """Batch-size distribution and counters since startup."""
+        with self._stats_lock:
+            return {
+                "requests": self.total_requests,
+                "batches": self.total_batches,
+                "errors": self.total_errors,
+                "mean_batch_size": (self.total_requests / self.total_batches) if self.total_batches else 0.0,
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
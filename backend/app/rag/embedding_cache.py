@@ -0,0 +1,176 @@
+"""
+Content-addressed on-disk embedding cache.
+
+Vectors live in an append-only float32 file that is memory-mapped for reads;
+a parallel append-only file holds one 16-byte text digest per row. One pair
+of files per namespace (model name + the embedding backend that produced the
+vectors), so switching models or backends never returns vectors from another
+embedding space. The cache wraps the model that embeds, not its clients: the
+embedding server caches under its own backend, and workers using it cache nothing.
+
+Several processes (API workers, the embedding server, ingest) can share a
+cache directory: appends happen under an exclusive file lock, vectors are
+written before their digests, and readers pick up rows appended by other
+processes on their next miss.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings as LangChainEmbeddings
+
+DIGEST_SIZE = 16
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()[:DIGEST_SIZE]
+
+
+class EmbeddingCache:
+    """Append-only, memory-mapped map from text digest to float32 vector."""
+
+    def __init__(self, directory: str, namespace: str):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]+", "_", namespace))
+        self.vectors_path = base + ".f32"
+        self.index_path = base + ".idx"
+        self.meta_path = base + ".json"
+        self.lock_path = base + ".lock"
+
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._index_bytes = 0
+        self._vectors: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._refresh()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _refresh(self):
+        """Reads digests appended since the last refresh and remaps the vector file."""
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        if self.dim is None or not os.path.exists(self.index_path):
+            return
+        row_bytes = self.dim * 4
+        rows_on_disk = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_bytes)
+            tail = f.read()
+        start_row = self._index_bytes // DIGEST_SIZE
+        # Only whole records whose vector is already on disk
+        usable = min(len(tail) // DIGEST_SIZE, rows_on_disk - start_row)
+        for i in range(max(usable, 0)):
+            self._rows.setdefault(tail[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE], start_row + i)
+        self._index_bytes += max(usable, 0) * DIGEST_SIZE
+        total = self._index_bytes // DIGEST_SIZE
+        if total and (self._vectors is None or self._vectors.shape[0] < total):
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(total, self.dim))
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors (copies) for each text, None for misses."""
+        digests = [text_digest(t) for t in texts]
+        with self._lock:
+            if any(d not in self._rows for d in digests):
+                self._refresh()
+            results = []
+            for digest in digests:
+                row = self._rows.get(digest)
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(np.array(self._vectors[row]))
+            return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Appends vectors for texts that are not cached yet."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or not len(texts):
+            return
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if self.dim is None:
+                    self.dim = int(matrix.shape[1])
+                    with open(self.meta_path, "w") as f:
+                        json.dump({"dim": self.dim}, f)
+                if matrix.shape[1] != self.dim:
+                    raise ValueError(f"embedding cache holds {self.dim}-dim vectors, got {matrix.shape[1]}")
+
+                new_rows, new_digests, seen = [], [], set()
+                for i, text in enumerate(texts):
+                    digest = text_digest(text)
+                    if digest not in self._rows and digest not in seen:
+                        seen.add(digest)
+                        new_rows.append(i)
+                        new_digests.append(digest)
+                if not new_rows:
+                    return
+
+                # Drop a torn write from a crashed process before appending
+                rows = self._index_bytes // DIGEST_SIZE
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(rows * self.dim * 4)
+                    f.write(np.ascontiguousarray(matrix[new_rows]).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self.index_path, "ab") as f:
+                    f.truncate(self._index_bytes)
+                    f.write(b"".join(new_digests))
+                self._refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedEmbeddings(LangChainEmbeddings):
+    """Wraps an embedding model so texts seen before skip inference."""
+
+    def __init__(self, inner, cache: EmbeddingCache):
+        self.inner = inner
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        try:
+            cached = self.cache.get_many(texts)
+        except (OSError, ValueError) as e:
+            print(f"[EMBED] Embedding cache read failed: {e}")
+            cached = [None] * len(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            # Embed each distinct missing text once
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique, self.inner.embed_documents(unique)))
+            try:
+                self.cache.put_many(unique, [computed[t] for t in unique])
+            except (OSError, ValueError) as e:
+                # A cache that cannot be written must never fail the embedding itself
+                print(f"[EMBED] Embedding cache write failed: {e}")
+            for i in missing:
+                cached[i] = computed[texts[i]]
+        return [v.tolist() if isinstance(v, np.ndarray) else list(v) for v in cached]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
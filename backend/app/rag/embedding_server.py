@@ -0,0 +1,198 @@
+"""
+Local embedding server shared by all API workers.
+
+One process loads the MiniLM model and serves embeddings over a Unix socket,
+so scaling uvicorn workers does not multiply model memory and inference does
+not compete with request handling for each worker's GIL. Concurrent requests
+from all workers are micro-batched into shared forward passes.
+
+Run:
+    python -m app.rag.embedding_server [--socket /tmp/piwrite-embeddings.sock]
+
+Workers use it when EMBEDDING_SERVER_SOCKET is set and fall back to
+in-process embedding whenever the server is unreachable or fails a request.
+
+Wire format (both directions): 4-byte big-endian length + payload.
+Request payload is JSON {"texts": [...]}; response payload is either
+JSON {"error": "..."} or, on success, a 4-byte row count, a 4-byte
+dimension and the float32 little-endian matrix.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings as LangChainEmbeddings
+
+HEADER = struct.Struct(">I")
+SHAPE = struct.Struct(">II")
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("embedding server closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def encode_vectors(vectors) -> bytes:
+    matrix = np.asarray(vectors, dtype="<f4")
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(vectors), -1)
+    return SHAPE.pack(*matrix.shape) + matrix.tobytes()
+
+
+def decode_vectors(payload: bytes) -> List[List[float]]:
+    rows, dim = SHAPE.unpack_from(payload)
+    matrix = np.frombuffer(payload, dtype="<f4", offset=SHAPE.size, count=rows * dim)
+    return matrix.reshape(rows, dim).tolist()
+
+
+class EmbeddingServerError(RuntimeError):
+    """The server answered with an error reply; the connection itself is still usable."""
+
+
+class RemoteEmbeddings(LangChainEmbeddings):
+    """
+    Embeddings client for the shared server with transparent local fallback.
+
+    Each thread keeps its own connection. If the server is down, calls are
+    served by `fallback_factory()` (loaded lazily) and the server is retried
+    after `retry_seconds`. A request the server answers with an error is
+    embedded in-process too, without marking the server down.
+    """
+
+    def __init__(self, socket_path: str, fallback_factory, timeout: float = 30.0, retry_seconds: float = 30.0):
+        self.socket_path = socket_path
+        self.fallback_factory = fallback_factory
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self._local = threading.local()
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+        self._down_until = 0.0
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        self._local.conn = None
+
+    def _remote(self, texts: List[str]) -> List[List[float]]:
+        conn = self._connection()
+        body = json.dumps({"texts": texts}).encode("utf-8")
+        conn.sendall(HEADER.pack(len(body)) + body)
+        (size,) = HEADER.unpack(_recv_exact(conn, HEADER.size))
+        payload = _recv_exact(conn, size)
+        if payload[:1] == b"{":
+            raise EmbeddingServerError(json.loads(payload).get("error", "embedding server error"))
+        return decode_vectors(payload)
+
+    def _local_model(self):
+        with self._fallback_lock:
+            if self._fallback is None:
+                print("[EMBED] Embedding server unavailable; loading in-process model")
+                self._fallback = self.fallback_factory()
+            return self._fallback
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        now = time.monotonic()
+        if now >= self._down_until:
+            try:
+                return self._remote(texts)
+            except EmbeddingServerError as e:
+                print(f"[EMBED] Embedding server failed the request ({e}); embedding in-process")
+                return self._local_model().embed_documents(texts)
+            except (OSError, ConnectionError) as e:
+                print(f"[EMBED] Embedding server error ({e}); falling back to in-process model")
+                self._drop_connection()
+                self._down_until = now + self.retry_seconds
+        return self._local_model().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+async def _handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, batcher):
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(HEADER.size)
+            except asyncio.IncompleteReadError:
+                return
+            (size,) = HEADER.unpack(header)
+            request = json.loads(await reader.readexactly(size))
+            try:
+                texts = request["texts"]
+                # Each text joins the shared micro-batch with texts from every other worker.
+                vectors = await asyncio.gather(*(batcher.embed(t) for t in texts))
+                payload = encode_vectors(vectors)
+            except Exception as e:
+                payload = json.dumps({"error": str(e)}).encode("utf-8")
+            writer.write(HEADER.pack(len(payload)) + payload)
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str):
+    from app.core.config import get_settings
+    from app.rag.embedding_batcher import EmbeddingBatcher
+    from app.rag.embeddings import Embeddings
+
+    settings = get_settings()
+    model = Embeddings.get_local_embeddings()
+    model.embed_query("warm up")
+    batcher = EmbeddingBatcher(
+        embed_batch=model.embed_documents,
+        executor=Embeddings.get_executor(),
+        max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms=settings.EMBEDDING_BATCH_WAIT_MS,
+        max_concurrent_batches=settings.EMBEDDING_MAX_WORKERS,
+    )
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(
+        lambda r, w: _handle_client(r, w, batcher), path=socket_path
+    )
+    os.chmod(socket_path, 0o660)
+    print(f"Embedding server listening on {socket_path}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from app.core.config import get_settings
+
+    parser = argparse.ArgumentParser(description="Shared MiniLM embedding server")
+    parser.add_argument("--socket", default=get_settings().EMBEDDING_SERVER_SOCKET or "/tmp/piwrite-embeddings.sock")
+    args = parser.parse_args()
+    asyncio.run(serve(args.socket))
@@ -1,12 +1,140 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, get_args
+
+from app.core.config import EmbeddingBackend, get_settings
+from app.rag.embedding_batcher import EmbeddingBatcher
+from app.rag.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKENDS = get_args(EmbeddingBackend)
+
+
+def load_embedding_backend(backend: str):
+    """Builds the MiniLM embedding model for the given backend name."""
+    if backend == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    if backend in ("onnx", "onnx-int8"):
+        from app.rag.onnx_embeddings import OnnxEmbeddings
+        settings = get_settings()
+        return OnnxEmbeddings(
+            model_dir=settings.EMBEDDING_ONNX_DIR,
+            quantized=backend == "onnx-int8",
+            num_threads=settings.EMBEDDING_ONNX_THREADS,
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected one of {EMBEDDING_BACKENDS})")
+
 
 class Embeddings:
     _instance = None
+    _local_instance = None
+    _cache = None
+    _cache_failed = False
+    _executor = None
+    _batcher = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_local_embeddings(cls):
+        """
+        The in-process model, regardless of EMBEDDING_SERVER_SOCKET, behind
+        the on-disk cache when it is enabled. The cache sits with the model
+        that produces the vectors, so its namespace is always that model's backend.
+        """
+        with cls._lock:
+            if cls._local_instance is None:
+                # lightweight, efficient and free; EMBEDDING_BACKEND picks torch or onnxruntime
+                model = load_embedding_backend(get_settings().EMBEDDING_BACKEND)
+                cache = cls._get_cache_locked()
+                cls._local_instance = CachedEmbeddings(model, cache) if cache is not None else model
+            return cls._local_instance
 
     @classmethod
     def get_embeddings(cls):
+        """
+        Embedding model for this worker: the shared embedding server if
+        EMBEDDING_SERVER_SOCKET is set (with in-process fallback), else the
+        local model. The server caches with its own backend; workers only
+        cache what their local model embeds.
+        """
         if cls._instance is None:
-            # lightweight, efficient and free
-            model_name = "sentence-transformers/all-MiniLM-L6-v2"
-            cls._instance = HuggingFaceEmbeddings(model_name=model_name)
+            socket_path = get_settings().EMBEDDING_SERVER_SOCKET
+            if socket_path:
+                from app.rag.embedding_server import RemoteEmbeddings
+                cls._instance = RemoteEmbeddings(socket_path, fallback_factory=cls.get_local_embeddings)
+            else:
+                cls._instance = cls.get_local_embeddings()
         return cls._instance
+
+    @classmethod
+    def get_cache(cls) -> Optional[EmbeddingCache]:
+        """On-disk vector cache for this process's local model/backend, or None if disabled."""
+        with cls._lock:
+            return cls._get_cache_locked()
+
+    @classmethod
+    def _get_cache_locked(cls) -> Optional[EmbeddingCache]:
+        settings = get_settings()
+        if not settings.EMBEDDING_CACHE_ENABLED or cls._cache_failed:
+            return None
+        if cls._cache is None:
+            try:
+                cls._cache = EmbeddingCache(
+                    settings.EMBEDDING_CACHE_DIR, f"{MODEL_NAME}-{settings.EMBEDDING_BACKEND}"
+                )
+            except (OSError, ValueError) as e:
+                # An unusable cache directory must never fail the embedding itself
+                print(f"[EMBED] Embedding cache disabled ({settings.EMBEDDING_CACHE_DIR}): {e}")
+                cls._cache_failed = True
+        return cls._cache
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        """Bounded pool for CPU-bound inference so it never runs on the event loop."""
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(
+                max_workers=get_settings().EMBEDDING_MAX_WORKERS,
+                thread_name_prefix="embeddings"
+            )
+        return cls._executor
+
+    @classmethod
+    def get_batcher(cls) -> EmbeddingBatcher:
+        """Micro-batcher that merges concurrent query embeddings into one forward pass."""
+        if cls._batcher is None:
+            settings = get_settings()
+            cls._batcher = EmbeddingBatcher(
+                embed_batch=lambda texts: cls.get_embeddings().embed_documents(texts),
+                executor=cls.get_executor(),
+                max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBEDDING_BATCH_WAIT_MS,
+                max_concurrent_batches=settings.EMBEDDING_MAX_WORKERS,
+            )
+        return cls._batcher
+
+    @classmethod
+    async def aembed_query(cls, text: str) -> List[float]:
+        """Embeds a query off the event loop, batched with concurrent callers if enabled."""
+        # Vectors from the embedding server are cached by the server, under its own backend
+        cache = cls.get_cache() if not get_settings().EMBEDDING_SERVER_SOCKET else None
+        if cache is not None:
+            # Common query strings (stage templates) never reach the model; the lookup reads disk
+            try:
+                cached = (await asyncio.to_thread(cache.get_many, [text]))[0]
+            except (OSError, ValueError) as e:
+                print(f"[EMBED] Embedding cache read failed: {e}")
+                cached = None
+            if cached is not None:
+                return cached.tolist()
+        if get_settings().EMBEDDING_BATCHING_ENABLED:
+            return await cls.get_batcher().embed(text)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls.get_executor(), cls.get_embeddings().embed_query, text)
+
+    @classmethod
+    async def aembed_documents(cls, texts: List[str]) -> List[List[float]]:
+        """Embeds a batch of texts off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls.get_executor(), cls.get_embeddings().embed_documents, texts)
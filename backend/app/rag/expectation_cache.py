@@ -0,0 +1,159 @@
+"""
+Cache of structured expectations extracted from retrieved SOL standards.
+
+Gap analysis step 2 asks the LLM to turn the retrieved standards into
+skill expectations. For a grade and stage the retrieved standards are
+almost always the same set, so the answer is too. Entries are keyed by
+grade, stage and a fingerprint of the standards (see
+standards_fingerprint) in two tiers:
+
+- an in-memory LRU tagged with the corpus version, dropped when ingest
+  publishes a new one (like retrieval_cache.py);
+- an on-disk tier of one JSON file per key, shared by every worker and
+  surviving restarts. Its keys also cover the prompt and model, so
+  changing either never serves stale extractions. They do not include the
+  corpus version: the fingerprint already pins the exact standards text,
+  so a re-ingest that leaves a stage's standards unchanged keeps its entry.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, List, Optional
+
+from app.core.config import get_settings
+
+
+def standards_fingerprint(standards: Iterable[str]) -> str:
+    """Order-insensitive digest of a set of standards texts."""
+    digest = hashlib.sha256()
+    for text in sorted(set(standards)):
+        digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+class ExpectationCache:
+    """Thread-safe LRU of extracted expectations with an optional on-disk tier."""
+
+    def __init__(self, max_entries: int, directory: Optional[str] = None, namespace: str = ""):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.namespace = namespace
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError as e:
+                print(f"[EXPECTATIONS] Expectation cache directory unavailable ({e}); memory only")
+                self.directory = None
+
+    def _path(self, key: tuple) -> str:
+        name = hashlib.sha256(json.dumps([self.namespace, *key]).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def _check_version(self, version: Optional[str]):
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def _remember(self, key: tuple, value: List[dict]):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, version: Optional[str], grade_level: str, stage: str, fingerprint: str) -> Optional[List[dict]]:
+        key = (str(grade_level), stage.lower(), fingerprint)
+        with self._lock:
+            self._check_version(version)
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # Copies: callers are free to mutate the expectations they get back
+                return json.loads(json.dumps(value))
+
+        value = self._read(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            if version == self.version:
+                self._remember(key, value)
+        return json.loads(json.dumps(value))
+
+    def put(self, version: Optional[str], grade_level: str, stage: str, fingerprint: str, value: List[dict]):
+        key = (str(grade_level), stage.lower(), fingerprint)
+        value = json.loads(json.dumps(value))
+        with self._lock:
+            self._check_version(version)
+            self._remember(key, value)
+        self._write(key, value)
+
+    def _read(self, key: tuple) -> Optional[List[dict]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key: tuple, value: List[dict]):
+        if not self.directory:
+            return
+        try:
+            # Write-then-rename so concurrent readers in other workers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            # A cache that cannot be written must never fail gap analysis
+            print(f"[EXPECTATIONS] Expectation cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.version = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_expectation_cache: Optional[ExpectationCache] = None
+
+
+def get_expectation_cache(namespace: str) -> Optional[ExpectationCache]:
+    """
+    The shared cache, or None when disabled. namespace identifies what
+    produced the entries (prompt and model); a different one starts over.
+    """
+    global _expectation_cache
+    settings = get_settings()
+    if not settings.EXPECTATION_CACHE_ENABLED:
+        return None
+    if _expectation_cache is None or _expectation_cache.namespace != namespace:
+        _expectation_cache = ExpectationCache(
+            settings.EXPECTATION_CACHE_MAX_ENTRIES,
+            directory=settings.EXPECTATION_CACHE_DIR,
+            namespace=namespace,
+        )
+    return _expectation_cache
@@ -0,0 +1,263 @@
+"""
+Expectation catalog: gap analysis step 2, precomputed at ingest time.
+
+Structured expectations (skill_domain, expectation, indicators) depend only
+on the SOL text, the grade and the stage. For every grade x stage,
+build_expectation_catalog selects the chunks live gap analysis can
+retrieve for it: the stage's standards by code, the stage and synonym
+queries, and the progression entries. It then extracts each chunk's
+expectations once. Entries live in sol_expectation_catalog
+(migrations/09_sol_expectation_catalog.sql) per corpus version. They are
+keyed by a digest of the chunk text and an extractor id (prompt + model),
+so building a new version copies forward every chunk whose text did not
+change and only extracts the new ones.
+
+Ingest builds the catalog for the new version before activating it
+(INGEST_EXPECTATION_CATALOG); `python -m app.rag.expectation_catalog`
+rebuilds it for the live version, e.g. after the extraction prompt
+changes. At request time compute_instructional_gaps takes the expectations
+of catalogued chunks from here and sends only the rest (web results,
+chunks the build did not select) to the LLM.
+"""
+import argparse
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import get_settings
+from app.core.database import get_supabase_client
+from app.rag.corpus_version import acurrent_corpus_version, fetch_corpus_version, is_snapshot_version
+from app.rag.queries import (
+    GRADES, STAGES, STAGE_MATCH_COUNT, SYNONYM_MATCH_COUNT, stage_query, synonym_query
+)
+from app.rag.retrieval import search_index
+from app.rag.sol_metadata import codes_for_stage, standard_ids_for_stage
+from app.rag.vector_index import PAGE_SIZE, SOLVectorIndex, fetch_corpus
+
+UPSERT_BATCH_SIZE = 200
+# Same threshold as the step 1 retrieval in gap analysis
+MATCH_THRESHOLD = 0.5
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ExpectationCatalog:
+    """Catalogued expectations of one corpus version, by (grade, stage, chunk digest)."""
+
+    def __init__(self, rows: Sequence[dict], version: Optional[str] = None, extractor: Optional[str] = None):
+        self.version = version
+        self.extractor = extractor
+        self._entries: Dict[Tuple[str, str, str], List[dict]] = {
+            (r["grade"], r["stage"], r["content_hash"]): r["expectations"] for r in rows
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, grade_level: str, stage: str, content: str) -> Optional[List[dict]]:
+        return self._entries.get((str(grade_level), stage.lower(), content_digest(content)))
+
+    def split(self, standards: Sequence[str], grade_level: str, stage: str) -> Tuple[List[dict], List[str]]:
+        """
+        Expectations of the catalogued standards (in order, without repeats)
+        and the standards that still need extraction.
+        """
+        expectations, uncatalogued, seen = [], [], set()
+        for content in standards:
+            entry = self.get(grade_level, stage, content)
+            if entry is None:
+                uncatalogued.append(content)
+                continue
+            for expectation in entry:
+                key = (expectation.get("skill_domain"), expectation.get("expectation"))
+                if key not in seen:
+                    seen.add(key)
+                    expectations.append(dict(expectation))
+        return expectations, uncatalogued
+
+
+def fetch_catalog(client, version: str, extractor: str) -> List[dict]:
+    """Pages through the catalog rows of one corpus version and extractor."""
+    rows: List[dict] = []
+    start = 0
+    while True:
+        response = client.table("sol_expectation_catalog")\
+            .select("grade, stage, content_hash, expectations")\
+            .eq("corpus_version", version)\
+            .eq("extractor", extractor)\
+            .order("grade,stage,content_hash")\
+            .range(start, start + PAGE_SIZE - 1)\
+            .execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+class _CatalogHolder:
+    """The worker's catalog for the live corpus version, reloaded when the version changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.catalog: Optional[ExpectationCatalog] = None
+        self.loaded_at = 0.0
+
+    def peek(self, version: Optional[str], extractor: str) -> Optional[ExpectationCatalog]:
+        catalog = self.catalog
+        if catalog is None or catalog.version != version or catalog.extractor != extractor:
+            return None
+        # An empty catalog may just not be built yet (it can be built after activation)
+        if not len(catalog) and time.monotonic() - self.loaded_at > get_settings().SOL_INDEX_REFRESH_SECONDS:
+            return None
+        return catalog
+
+    def load(self, version: str, extractor: str) -> ExpectationCatalog:
+        with self._lock:
+            catalog = self.peek(version, extractor)
+            if catalog is not None:
+                return catalog
+            try:
+                rows = fetch_catalog(get_supabase_client(), version, extractor)
+            except Exception as e:
+                print(f"[EXPECTATIONS] Expectation catalog unavailable: {e}")
+                rows = []
+            self.catalog = ExpectationCatalog(rows, version, extractor)
+            self.loaded_at = time.monotonic()
+            print(f"[EXPECTATIONS] Loaded {len(rows)} catalogued expectation entries (version {version})")
+            return self.catalog
+
+
+_holder = _CatalogHolder()
+
+
+async def aget_expectation_catalog(extractor: str) -> Optional[ExpectationCatalog]:
+    """The live version's catalog for this extractor; None without a corpus snapshot version."""
+    version = await acurrent_corpus_version()
+    if not is_snapshot_version(version):
+        return None
+    catalog = _holder.peek(version, extractor)
+    if catalog is not None:
+        return catalog
+    return await asyncio.to_thread(_holder.load, version, extractor)
+
+
+def select_catalog_chunks(index: SOLVectorIndex, embed_documents) -> Dict[Tuple[str, str], List[str]]:
+    """The chunks gap analysis can retrieve for each grade x stage, from a local index of the version."""
+    cells = [(grade_level, stage) for grade_level in GRADES for stage in STAGES]
+    queries = [
+        q for grade_level, stage in cells
+        for q in (stage_query(stage, grade_level), synonym_query(stage, grade_level))
+    ]
+    vectors = embed_documents(queries)
+
+    def contents(rows: List[dict]) -> List[str]:
+        return [r["content"] for r in rows]
+
+    lookup = get_settings().SOL_CODE_LOOKUP_ENABLED
+    selected: Dict[Tuple[str, str], List[str]] = {}
+    for n, (grade_level, stage) in enumerate(cells):
+        exact = contents(index.lookup(codes_for_stage(grade_level, stage), STAGE_MATCH_COUNT)) if lookup else []
+        searched = contents(search_index(
+            index, queries[2 * n], vectors[2 * n], grade_level, STAGE_MATCH_COUNT, MATCH_THRESHOLD))
+        synonyms = contents(search_index(
+            index, queries[2 * n + 1], vectors[2 * n + 1], grade_level, SYNONYM_MATCH_COUNT, MATCH_THRESHOLD))
+        chunks = exact + searched + synonyms
+        # Step 1 keeps either the exact rows or the search rows; progression expansion excludes what it kept
+        skills = standard_ids_for_stage(stage)
+        for retrieved in (exact, searched):
+            chunks += contents(index.progression_rows(skills, grade_level, SYNONYM_MATCH_COUNT, retrieved))
+        selected[(grade_level, stage)] = list(dict.fromkeys(chunks))
+    return selected
+
+
+async def build_expectation_catalog(
+    supabase,
+    version: str,
+    previous_version: Optional[str] = None,
+    concurrency: int = 4
+) -> int:
+    """
+    Builds the catalog of `version` (which may still be building): entries
+    of `previous_version` whose chunk text is unchanged are copied, the
+    others are extracted by the LLM. Passing the same version for both only
+    fills in what is missing. Failed extractions are left out, so
+    those chunks go to the LLM at request time. Catalogs of versions other
+    than these two are deleted.
+
+    Returns the number of entries written.
+    """
+    from app.agents.gap_analysis import expectation_extractor_id, request_expectations
+    from app.rag.embeddings import Embeddings
+
+    extractor = expectation_extractor_id()
+    rows = await asyncio.to_thread(fetch_corpus, supabase, version)
+    index = SOLVectorIndex.from_rows(rows)
+    selected = await asyncio.to_thread(select_catalog_chunks, index, Embeddings.get_embeddings().embed_documents)
+
+    previous = ExpectationCatalog([])
+    if is_snapshot_version(previous_version):
+        previous = ExpectationCatalog(
+            await asyncio.to_thread(fetch_catalog, supabase, previous_version, extractor))
+
+    entries: List[dict] = []
+    gate = asyncio.Semaphore(concurrency)
+    counts = {"copied": 0, "extracted": 0, "failed": 0}
+
+    async def catalog(grade_level: str, stage: str, content: str):
+        expectations = previous.get(grade_level, stage, content)
+        if expectations is not None:
+            counts["copied"] += 1
+        else:
+            async with gate:
+                try:
+                    expectations = await request_expectations(content, grade_level, stage)
+                    counts["extracted"] += 1
+                except Exception as e:
+                    print(f"[EXPECTATIONS] Extraction failed for grade {grade_level} {stage}: {e}")
+                    counts["failed"] += 1
+                    return
+        entries.append({
+            "corpus_version": version,
+            "extractor": extractor,
+            "grade": grade_level,
+            "stage": stage,
+            "content_hash": content_digest(content),
+            "expectations": expectations,
+        })
+
+    await asyncio.gather(*(
+        catalog(grade_level, stage, content)
+        for (grade_level, stage), contents in selected.items()
+        for content in contents
+    ))
+
+    def store():
+        for start in range(0, len(entries), UPSERT_BATCH_SIZE):
+            supabase.table("sol_expectation_catalog").upsert(
+                entries[start:start + UPSERT_BATCH_SIZE],
+                on_conflict="corpus_version,extractor,grade,stage,content_hash"
+            ).execute()
+        keep = [v for v in (version, previous_version) if is_snapshot_version(v)]
+        supabase.table("sol_expectation_catalog").delete().not_.in_("corpus_version", keep).execute()
+
+    await asyncio.to_thread(store)
+    print(f"Expectation catalog for version {version}: {len(entries)} entries "
+          f"({counts['copied']} copied, {counts['extracted']} extracted, {counts['failed']} failed) "
+          f"over {len(selected)} grade x stage cells")
+    return len(entries)
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="Build the expectation catalog of the live SOL corpus version")
+    cli.add_argument("--concurrency", type=int, default=4, help="Concurrent LLM extraction calls")
+    args = cli.parse_args()
+    client = get_supabase_client()
+    live_version = fetch_corpus_version(client)
+    if not is_snapshot_version(live_version):
+        raise SystemExit("The live corpus has no snapshot version; run app/rag/ingest.py first.")
+    asyncio.run(build_expectation_catalog(client, live_version, live_version, args.concurrency))
@@ -1,5 +1,9 @@
+import argparse
 import asyncio
+import copy
+import hashlib
 import os
+from typing import Dict, List, Optional, Set
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,114 +11,367 @@ print("DEBUG: Environment loaded")
 
 from llama_index.core import SimpleDirectoryReader, Settings
 print("DEBUG: LlamaIndex Imported")
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core.node_parser import SentenceSplitter
+from app.core.config import get_settings
 from app.core.database import get_supabase_client
+from app.rag.corpus_version import (
+    activate_corpus_version,
+    create_corpus_version,
+    discard_corpus_version,
+    fetch_corpus_version,
+    is_snapshot_version,
+)
+from app.rag.corpus_snapshot import CorpusSnapshot, write_snapshot
+from app.rag.dedup import NearDuplicateIndex, chunk_source_hashes, merge_duplicate
+from app.rag.embeddings import Embeddings
+from app.rag.expectation_catalog import build_expectation_catalog
+from app.rag.ingest_pipeline import IngestPipeline
+from app.rag.sol_metadata import extract_metadata, grades_from_filename, read_docx_sections
+from app.rag.vector_index import PAGE_SIZE, fetch_corpus, parse_embedding
 
-async def ingest_sols(directory: str = "data/sols"):
+COPY_BATCH_SIZE = 500
+# Bump when parsing or metadata extraction changes so unchanged files are re-parsed
+PARSER_VERSION = "progression-1"
+
+
+def hash_file(path: str) -> str:
+    """Content hash of a source file, salted with PARSER_VERSION."""
+    digest = hashlib.sha256(PARSER_VERSION.encode("utf-8"))
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_chunk(file_name: str, text: str) -> str:
+    """Identity of a chunk: the same text in two files is two chunks."""
+    return hashlib.sha256(f"{file_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+def fetch_existing_chunks(supabase, version: str) -> List[dict]:
+    """(id, chunk_hash, content, metadata) for every chunk of a corpus snapshot."""
+    rows = []
+    start = 0
+    while True:
+        response = supabase.table("sol_standards")\
+            .select("id, chunk_hash, content, metadata")\
+            .eq("corpus_version", version)\
+            .order("id")\
+            .range(start, start + PAGE_SIZE - 1)\
+            .execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def _chunk_record(file_name: str, content: str, meta: dict) -> dict:
+    chunk_hash = hash_chunk(file_name, content)
+    return {"content": content, "metadata": meta, "chunk_hash": chunk_hash}
+
+
+def parse_file(path: str, source_hash: str) -> List[dict]:
     """
-    Ingests SOL documents using LlamaIndex for parsing/splitting/embedding
-    and Supabase REST Client for storage.
+    Loads and splits one source file into chunk records (without embeddings).
+    .docx files are read section by section so each chunk carries its
+    heading path and the grades/strand extracted from the document
+    structure (app/rag/sol_metadata.py). Table rows are one chunk each
+    (split only if a row is longer than a chunk) and keep their column
+    values. Runs in an ingest worker process.
     """
-    print(f"--- Ingesting SOLs from {directory} ---")
-    
-    # 1. Setup LlamaIndex Settings
-    print("Loading embedding model (MiniLM-L6-v2)...")
-    embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    Settings.embed_model = embed_model
+    file_name = os.path.basename(path)
+    file_grades = grades_from_filename(file_name)
+    parser = SentenceSplitter(chunk_size=1024, chunk_overlap=200)
+
+    chunks = {}
+    if file_name.lower().endswith(".docx"):
+        for section in read_docx_sections(path):
+            prefix = " > ".join(section.headings)
+            for text in parser.split_text(section.text):
+                # The heading path goes into the embedded text as retrieval context
+                content = f"{prefix}\n{text}" if prefix else text
+                meta = extract_metadata(file_name, text, section.headings, section.heading_grades, file_grades)
+                meta["source_hash"] = source_hash
+                if section.table_row:
+                    meta["table_row"] = True
+                if section.columns:
+                    meta["columns"] = section.columns
+                record = _chunk_record(file_name, content, meta)
+                chunks[record["chunk_hash"]] = record
+        return list(chunks.values())
+
     Settings.llm = None
-    
-    # 2. Load and Split Documents
+    documents = SimpleDirectoryReader(input_files=[path]).load_data()
+    for node in parser.get_nodes_from_documents(documents):
+        content = node.get_content()
+        meta = extract_metadata(file_name, content, file_grades=file_grades)
+        meta["source_hash"] = source_hash
+        record = _chunk_record(file_name, content, meta)
+        chunks[record["chunk_hash"]] = record
+    return list(chunks.values())
+
+
+def copy_chunks(supabase, source_version: Optional[str], target_version: str, chunks: List[dict]) -> int:
+    """Copies stored chunks (with their embeddings) into the new snapshot server side."""
+    copied = 0
+    for i in range(0, len(chunks), COPY_BATCH_SIZE):
+        response = supabase.rpc("copy_sol_chunks", {
+            "source_version": source_version,
+            "target_version": target_version,
+            "chunks": chunks[i:i + COPY_BATCH_SIZE],
+        }).execute()
+        copied += response.data or 0
+    return copied
+
+
+def retag_chunks(supabase, version: str, chunks: List[dict]) -> int:
+    """Rewrites the metadata of chunks already stored in the snapshot being built."""
+    retagged = 0
+    for i in range(0, len(chunks), COPY_BATCH_SIZE):
+        response = supabase.rpc("retag_sol_chunks", {
+            "target_version": version,
+            "chunks": chunks[i:i + COPY_BATCH_SIZE],
+        }).execute()
+        retagged += response.data or 0
+    return retagged
+
+
+def insert_chunks(supabase, version: str, batch: List[dict]):
+    rows = [{**c, "corpus_version": version} for c in batch]
+    # Upsert so a retried batch cannot duplicate rows
+    supabase.table("sol_standards").upsert(rows, on_conflict="corpus_version,chunk_hash").execute()
+
+
+async def ingest_sols(directory: str = "data/sols", full: bool = False) -> Optional[str]:
+    """
+    Ingests SOL documents as a new corpus snapshot: LlamaIndex for
+    parsing/splitting, the shared Embeddings backend for vectors, Supabase
+    REST for storage.
+
+    Unchanged files (same content hash) are not even parsed and their chunks
+    are copied into the new snapshot server side. Changed files stream
+    through IngestPipeline: parsed in worker processes, embedded in fixed-size
+    batches (only chunks whose hash is new) and uploaded concurrently with
+    retries. The live snapshot keeps serving until the new one is complete
+    and validated, then the active pointer flips atomically.
+    `full=True` ignores what is stored and re-embeds every chunk.
+
+    Near-duplicate chunks (INGEST_DEDUP_THRESHOLD, app/rag/dedup.py) are
+    dropped as they are parsed; the chunk kept for a group records every
+    source file and grade. Files merged into the same chunks are re-parsed
+    together, so a change to one of them rebuilds the whole group. A new
+    chunk is only compared with chunks parsed or carried over in this run.
+
+    With INGEST_EXPECTATION_CATALOG the gap analysis expectations of the new
+    version are catalogued before it is activated (app/rag/expectation_catalog.py).
+
+    Returns the activated version, or None if nothing changed or the build failed.
+    """
+    print(f"--- Ingesting SOLs from {directory} ({'full' if full else 'incremental'}) ---")
+
     if not os.path.exists(directory):
         print(f"Directory {directory} does not exist.")
-        return
+        return None
 
-    print("Reading and parsing files (.docx, .txt, etc.)...")
-    reader = SimpleDirectoryReader(input_dir=directory, recursive=False)
-    documents = reader.load_data()
-    print(f"Loaded {len(documents)} document pages.")
-    
-    parser = SentenceSplitter(chunk_size=1024, chunk_overlap=200)
-    nodes = parser.get_nodes_from_documents(documents)
-    print(f"Created {len(nodes)} text chunks.")
-    
-    # 3. Generate Embeddings (batch)
-    print("Generating embeddings...")
-    # LlamaIndex nodes have a 'get_embedding()' method if the model is attached, 
-    # but it's often cleaner to batch embed the texts directly if possible.
-    # We will iterate and embed.
-    
-    texts = [node.get_content() for node in nodes]
-    # embed_documents is available on the internal model, usually.
-    # HuggingFaceEmbedding has .get_text_embedding_batch
-    
-    embeddings = embed_model.get_text_embedding_batch(texts)
-    
-    # 4. Upload to Supabase
+    settings = get_settings()
     supabase = get_supabase_client()
-    
-    # TRUNCATE existing data to avoid duplicates with bad metadata
-    print("Clearing existing SOL standards...")
-    supabase.table("sol_standards").delete().neq("id", "00000000-0000-0000-0000-000000000000").execute()
-
-    records = []
-    
-    for node, vector in zip(nodes, embeddings):
-        # Extract metadata from filename
-        # Example: "3-Grade 3_Writing.docx"
-        filename = node.metadata.get("file_name", "")
-        
-        meta = node.metadata.copy()
-        
-        # Simple heuristic tagging
-        # Grade Parsing
-        if "Grade 3" in filename or "3-" in filename or "3_" in filename:
-            meta["grade"] = "3"
-        elif "Grade 5" in filename or "5-" in filename or "5_" in filename:
-            meta["grade"] = "5"
-        elif "Grade 4" in filename or "4-" in filename or "4_" in filename:
-            meta["grade"] = "4"
-        elif "Grade 6" in filename or "6-" in filename or "6_" in filename:
-            meta["grade"] = "6"
-        elif "Grade 2" in filename or "2-" in filename or "2_" in filename:
-            meta["grade"] = "2"
-        elif "Grade 1" in filename or "1-" in filename or "1_" in filename:
-            meta["grade"] = "1"
-        elif "K-" in filename or "K_" in filename or "0-K" in filename:
-            meta["grade"] = "K"
-            
-        # Add stage tags if filename contains them
-        lower_name = filename.lower()
-        if "prewriting" in lower_name:
-            meta["stage"] = "prewriting"
-        elif "drafting" in lower_name:
-            meta["stage"] = "drafting"
-        elif "revising" in lower_name:
-            meta["stage"] = "revising"
-        elif "editing" in lower_name:
-            meta["stage"] = "editing"
-        elif "publishing" in lower_name:
-            meta["stage"] = "publishing"
-            
-        # If "Understanding the Standards" is in name, maybe it applies to ALL stages?
-        # But for now, we leave stage empty if not found, and rely on stage filter being disabled/optional in retrieval.py.
-        
-        records.append({
-            "content": node.get_content(),
-            "metadata": meta,
-            "embedding": vector
-        })
-        
-    print(f"Uploading {len(records)} records to Supabase...")
-    
-    batch_size = 50
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i+batch_size]
+
+    # 1. Diff source files against the active snapshot
+    active_version = fetch_corpus_version(supabase)
+    if not is_snapshot_version(active_version):
+        active_version = None
+    existing = [] if full or active_version is None else fetch_existing_chunks(supabase, active_version)
+    stored_sources: Dict[str, Set[str]] = {}
+    # Files whose near-duplicates were merged into the same stored chunks
+    linked_files: Dict[str, Set[str]] = {}
+    for row in existing:
+        source_hashes = chunk_source_hashes(row.get("metadata") or {})
+        for name, source_hash in source_hashes.items():
+            stored_sources.setdefault(name or "", set()).add(source_hash or "")
+            linked_files.setdefault(name or "", set()).update(source_hashes)
+    stored_hashes = {r["chunk_hash"] for r in existing if r.get("chunk_hash")}
+
+    files = sorted(
+        f for f in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, f)) and not f.startswith(("~$", "."))
+    )
+    file_hashes = {f: hash_file(os.path.join(directory, f)) for f in files}
+    removed = set(stored_sources) - set(files)
+    changed = {f for f in files if stored_sources.get(f) != {file_hashes[f]}}
+    stale = changed | removed
+    pending = list(stale)
+    while pending:
+        for name in linked_files.get(pending.pop(), ()):
+            if name not in stale:
+                stale.add(name)
+                pending.append(name)
+
+    dedup = NearDuplicateIndex(settings.INGEST_DEDUP_THRESHOLD) if settings.INGEST_DEDUP_THRESHOLD > 0 else None
+    # Metadata of every canonical chunk in this run, and the merged tags of those that absorbed duplicates
+    canonical_meta: Dict[str, dict] = {}
+    merged_meta: Dict[str, dict] = {}
+
+    keep_hashes: Set[str] = set()
+    # Chunks carried over from the live snapshot; metadata None keeps the stored tags
+    unchanged: List[dict] = []
+    for r in existing:
+        meta = r.get("metadata") or {}
+        if not r.get("chunk_hash") or meta.get("file_name") in stale:
+            continue
+        keep_hashes.add(r["chunk_hash"])
+        unchanged.append({"chunk_hash": r["chunk_hash"], "metadata": None})
+        if dedup is not None:
+            dedup.add(r["chunk_hash"], r.get("content") or "")
+            canonical_meta[r["chunk_hash"]] = meta
+    changed_jobs = [(os.path.join(directory, f), file_hashes[f]) for f in files if f in stale]
+
+    print(f"{len(files)} files | {len(changed)} new/changed | "
+          f"{len(changed_jobs) - len(changed)} re-parsed with merged files | {len(removed)} removed | "
+          f"{len(existing)} live chunks")
+    if not changed_jobs and not removed and not full:
+        print("Corpus is up to date; nothing to do.")
+        return None
+
+    # 2. Build the new snapshot next to the live one
+    version = create_corpus_version(supabase)
+    print(f"Building SOL corpus version {version}...")
+
+    # Chunks of changed files that are already stored: copy the embedding, take the new tags
+    retagged: List[dict] = []
+
+    def deduplicate(chunks: List[dict]) -> List[dict]:
+        if dedup is None:
+            return chunks
+        kept = []
+        for c in chunks:
+            canonical = dedup.add(c["chunk_hash"], c["content"])
+            if canonical is None:
+                canonical_meta[c["chunk_hash"]] = c["metadata"]
+                kept.append(c)
+            else:
+                # The canonical chunk may already be uploading; its final tags are written by retag_chunks
+                if canonical not in merged_meta:
+                    merged_meta[canonical] = copy.deepcopy(canonical_meta[canonical])
+                merge_duplicate(merged_meta[canonical], c["metadata"])
+        return kept
+
+    def route(chunks: List[dict]) -> List[dict]:
+        chunks = deduplicate(chunks)
+        keep_hashes.update(c["chunk_hash"] for c in chunks)
+        retagged.extend(
+            {"chunk_hash": c["chunk_hash"], "metadata": c["metadata"]}
+            for c in chunks if c["chunk_hash"] in stored_hashes
+        )
+        return [c for c in chunks if c["chunk_hash"] not in stored_hashes]
+
+    # Same backend as the query side (EMBEDDING_BACKEND) so vectors stay comparable
+    embed_model = Embeddings.get_embeddings()
+    pipeline = IngestPipeline(
+        parse_fn=parse_file,
+        embed_fn=embed_model.embed_documents,
+        upload_fn=lambda batch: insert_chunks(supabase, version, batch),
+        route=route,
+        parse_workers=settings.INGEST_PARSE_WORKERS,
+        embed_batch_size=settings.INGEST_EMBED_BATCH_SIZE,
+        upload_concurrency=settings.INGEST_UPLOAD_CONCURRENCY,
+        upload_retries=settings.INGEST_UPLOAD_RETRIES,
+    )
+    try:
+        copied = await asyncio.to_thread(copy_chunks, supabase, active_version, version, unchanged)
+        await pipeline.run(changed_jobs)
+        copied += await asyncio.to_thread(copy_chunks, supabase, active_version, version, retagged)
+        print(f"Copied {copied} stored chunks (no re-embedding)")
+        print(pipeline.report())
+        if dedup is not None:
+            merged = [{"chunk_hash": h, "metadata": meta} for h, meta in merged_meta.items()]
+            retagged_count = await asyncio.to_thread(retag_chunks, supabase, version, merged)
+            print(dedup.report())
+            print(f"Retagged {retagged_count} chunks with merged sources")
+
+        if settings.INGEST_EXPECTATION_CATALOG:
+            try:
+                await build_expectation_catalog(
+                    supabase, version, active_version, settings.INGEST_CATALOG_CONCURRENCY)
+            except Exception as e:
+                # Uncatalogued chunks are extracted at request time; never block the corpus on it
+                print(f"Error building the expectation catalog of version {version}: {e}")
+
+        # 3. Raises unless the snapshot holds exactly the expected chunks; flips the
+        # pointer in the same transaction, so every worker reloads on its next poll.
+        activate_corpus_version(supabase, version, len(keep_hashes))
+    except Exception as e:
+        print(f"Error building SOL corpus version {version}: {e}. Live version {active_version} is unchanged.")
+        print(pipeline.report())
         try:
-            supabase.table("sol_standards").insert(batch).execute()
-            print(f"Inserted batch {i // batch_size + 1}")
-        except Exception as e:
-            print(f"Error inserting batch {i // batch_size + 1}: {e}")
+            discard_corpus_version(supabase, version)
+        except Exception as cleanup_error:
+            print(f"Error discarding version {version}: {cleanup_error}")
+        return None
+    return version
+
+
+def export_snapshot(path: str, dtype: str = "float32") -> Optional[str]:
+    """Writes the active corpus version to a memory-mappable snapshot file."""
+    supabase = get_supabase_client()
+    version = fetch_corpus_version(supabase)
+    rows = fetch_corpus(supabase, version, with_hashes=True)
+    if not rows:
+        print("No SOL chunks to export.")
+        return None
+    size = write_snapshot(
+        path,
+        ids=[r["id"] for r in rows],
+        contents=[r.get("content") or "" for r in rows],
+        metadata=[r.get("metadata") or {} for r in rows],
+        embeddings=[parse_embedding(r["embedding"]) for r in rows],
+        version=version,
+        chunk_hashes=[r.get("chunk_hash") for r in rows],
+        dtype=dtype,
+    )
+    print(f"Exported {len(rows)} chunks (version {version}, {dtype}) to {path} [{size / 1e6:.1f} MB]")
+    return version
+
+
+def import_snapshot(path: str) -> Optional[str]:
+    """Loads a snapshot file into a new corpus version and activates it."""
+    snapshot = CorpusSnapshot(path)
+    supabase = get_supabase_client()
+    version = create_corpus_version(supabase)
+    print(f"Importing {len(snapshot)} chunks from {path} (exported as {snapshot.version}) into version {version}...")
+    chunk_hashes = set()
+    try:
+        batch = []
+        for row in snapshot.rows_as_dicts():
+            row.pop("id")
+            # Rows exported before chunk hashes existed get one so the upsert key is set
+            row["chunk_hash"] = row["chunk_hash"] or hash_chunk(row["metadata"].get("file_name", ""), row["content"])
+            chunk_hashes.add(row["chunk_hash"])
+            batch.append(row)
+            if len(batch) == COPY_BATCH_SIZE:
+                insert_chunks(supabase, version, batch)
+                batch = []
+        if batch:
+            insert_chunks(supabase, version, batch)
+        activate_corpus_version(supabase, version, len(chunk_hashes))
+    except Exception as e:
+        print(f"Error importing {path}: {e}")
+        discard_corpus_version(supabase, version)
+        return None
+    return version
+
 
 if __name__ == "__main__":
-    asyncio.run(ingest_sols())
+    cli = argparse.ArgumentParser(description="Ingest SOL documents into sol_standards")
+    cli.add_argument("directory", nargs="?", default="data/sols")
+    cli.add_argument("--full", action="store_true", help="Re-embed everything instead of diffing against the live snapshot")
+    cli.add_argument("--export", metavar="PATH", help="Write the live corpus to a snapshot file instead of ingesting")
+    cli.add_argument("--import", dest="import_path", metavar="PATH", help="Load a snapshot file as the new live corpus")
+    cli.add_argument("--dtype", choices=["float32", "float16"], default="float32", help="Embedding precision for --export")
+    args = cli.parse_args()
+    if args.export:
+        export_snapshot(args.export, args.dtype)
+    elif args.import_path:
+        import_snapshot(args.import_path)
+    else:
+        asyncio.run(ingest_sols(args.directory, full=args.full))
@@ -0,0 +1,182 @@
+"""
+Streaming parse -> embed -> upload pipeline for SOL ingestion.
+
+Documents are parsed in a process pool and their chunks are embedded in
+fixed-size batches as soon as they arrive, while earlier batches are being
+uploaded with bounded concurrency. Stages are connected by bounded queues, so
+only a few batches (and their embeddings) are in memory at any time no matter
+how many documents the corpus has. Each stage records its own throughput.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+
+@dataclass
+class StageStats:
+    """Items processed by one stage and the time it spent on them."""
+
+    name: str
+    items: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0
+    retries: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def record(self, items: int, seconds: float):
+        now = time.perf_counter()
+        if self.started_at is None:
+            self.started_at = now - seconds
+        self.finished_at = now
+        self.items += items
+        self.batches += 1
+        self.busy_seconds += seconds
+
+    def summary(self) -> str:
+        span = (self.finished_at - self.started_at) if self.started_at is not None else 0.0
+        rate = self.items / span if span > 0 else 0.0
+        line = (f"{self.name:<7} {self.items:>6} items in {self.batches:>4} batches | "
+                f"{rate:8.1f} items/s over {span:6.1f}s | busy {self.busy_seconds:6.1f}s")
+        if self.retries:
+            line += f" | {self.retries} retries"
+        return line
+
+
+class IngestPipeline:
+    """
+    Runs parse_fn over jobs in worker processes, embeds selected chunks in
+    batches of embed_batch_size and uploads each embedded batch.
+
+    parse_fn(*job) -> List[chunk dict] must be a picklable module-level
+    function. route(chunks) is called in the event loop with each file's
+    chunks and returns the ones that need embedding (it can stash the rest).
+    embed_fn(texts) and upload_fn(batch) are blocking and run in threads;
+    a failed upload is retried with exponential backoff and, once retries
+    are exhausted, aborts the whole run.
+    """
+
+    def __init__(
+        self,
+        parse_fn: Callable[..., List[dict]],
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        upload_fn: Callable[[List[dict]], None],
+        route: Callable[[List[dict]], List[dict]] = lambda chunks: chunks,
+        parse_workers: Optional[int] = None,
+        embed_batch_size: int = 64,
+        upload_concurrency: int = 4,
+        upload_retries: int = 3,
+        retry_backoff: float = 1.0,
+        queue_size: int = 4,
+    ):
+        self.parse_fn = parse_fn
+        self.embed_fn = embed_fn
+        self.upload_fn = upload_fn
+        self.route = route
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.upload_concurrency = max(1, upload_concurrency)
+        self.upload_retries = max(0, upload_retries)
+        self.retry_backoff = retry_backoff
+        self.queue_size = max(1, queue_size)
+        self.stats: Dict[str, StageStats] = {
+            name: StageStats(name) for name in ("parse", "embed", "upload")
+        }
+
+    async def _parse(self, jobs: Iterable[Sequence], embed_queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        stats = self.stats["parse"]
+        buffer: List[dict] = []
+        pending = iter(jobs)
+
+        # spawn, not fork: the parent may already hold the embedding model and its thread pools
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=context) as pool:
+            # Keep a small window of files in flight so parsed-but-unembedded text stays bounded
+            window = self.parse_workers * 2
+            in_flight = {}
+
+            def submit(count: int):
+                for _ in range(count):
+                    job = next(pending, None)
+                    if job is None:
+                        return
+                    in_flight[loop.run_in_executor(pool, self.parse_fn, *job)] = time.perf_counter()
+
+            submit(window)
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    submitted = in_flight.pop(future)
+                    chunks = future.result()
+                    stats.record(len(chunks), time.perf_counter() - submitted)
+                    buffer.extend(self.route(chunks))
+                    while len(buffer) >= self.embed_batch_size:
+                        await embed_queue.put(buffer[:self.embed_batch_size])
+                        buffer = buffer[self.embed_batch_size:]
+                submit(len(done))
+
+        if buffer:
+            await embed_queue.put(buffer)
+        await embed_queue.put(None)
+
+    async def _embed(self, embed_queue: asyncio.Queue, upload_queue: asyncio.Queue):
+        stats = self.stats["embed"]
+        while True:
+            batch = await embed_queue.get()
+            if batch is None:
+                break
+            started = time.perf_counter()
+            vectors = await asyncio.to_thread(self.embed_fn, [c["content"] for c in batch])
+            stats.record(len(batch), time.perf_counter() - started)
+            for chunk, vector in zip(batch, vectors):
+                chunk["embedding"] = vector
+            await upload_queue.put(batch)
+        for _ in range(self.upload_concurrency):
+            await upload_queue.put(None)
+
+    async def _upload(self, upload_queue: asyncio.Queue):
+        stats = self.stats["upload"]
+        while True:
+            batch = await upload_queue.get()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            for attempt in range(self.upload_retries + 1):
+                try:
+                    await asyncio.to_thread(self.upload_fn, batch)
+                    break
+                except Exception as e:
+                    if attempt == self.upload_retries:
+                        raise
+                    stats.retries += 1
+                    delay = self.retry_backoff * 2 ** attempt
+                    print(f"[INGEST] Upload of {len(batch)} chunks failed ({e}); retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+            stats.record(len(batch), time.perf_counter() - started)
+
+    async def run(self, jobs: Iterable[Sequence]) -> Dict[str, StageStats]:
+        """Streams every job through the pipeline. Raises if any stage fails."""
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        upload_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        tasks = [
+            asyncio.create_task(self._parse(jobs, embed_queue)),
+            asyncio.create_task(self._embed(embed_queue, upload_queue)),
+            *(asyncio.create_task(self._upload(upload_queue)) for _ in range(self.upload_concurrency)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed stage would leave the others blocked on their queues
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return self.stats
+
+    def report(self) -> str:
+        return "\n".join(stats.summary() for stats in self.stats.values())
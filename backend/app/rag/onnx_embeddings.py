@@ -0,0 +1,150 @@
+"""
+ONNX Runtime backend for the MiniLM sentence embedding model.
+
+Exports sentence-transformers/all-MiniLM-L6-v2 to ONNX once, offline
+(optionally with dynamic int8 weight quantization), and serves embeddings
+on CPU without loading PyTorch in the API workers. Workers never export:
+a missing model is a startup error. Pooling and normalisation match the
+sentence-transformers pipeline, so vectors stay compatible with the 384-dim
+sol_standards.embedding column.
+
+Export:
+    python -m app.rag.onnx_embeddings --output models/minilm-onnx --quantize
+"""
+import argparse
+import os
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings as LangChainEmbeddings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# sentence-transformers truncates all-MiniLM-L6-v2 inputs at 256 tokens
+MAX_SEQ_LENGTH = 256
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+
+
+def export_onnx_model(output_dir: str, quantize: bool = True, model_name: str = MODEL_NAME) -> str:
+    """
+    Exports the transformer to ONNX (plus tokenizer files) into output_dir.
+
+    Needs torch/transformers, so run it once at build time rather than in workers.
+    Returns the path of the model that should be served.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "sequence"},
+        "token_type_ids": {0: "batch", 1: "sequence"},
+        "last_hidden_state": {0: "batch", 1: "sequence"},
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(output_dir)
+    print(f"Exported {model_name} to {fp32_path}")
+
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = os.path.join(output_dir, INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"Quantized (dynamic int8) model written to {int8_path}")
+    return int8_path
+
+
+class OnnxEmbeddings(LangChainEmbeddings):
+    """LangChain-compatible embeddings served by onnxruntime on CPU."""
+
+    def __init__(
+        self,
+        model_dir: str,
+        quantized: bool = False,
+        batch_size: int = 32,
+        num_threads: int = 0,
+        model_name: str = MODEL_NAME,
+    ):
+        model_path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(model_path):
+            # Exporting here would load torch in every worker and race on model_dir
+            raise FileNotFoundError(
+                f"ONNX model not found at {model_path}. Export it once before starting workers: "
+                f"python -m app.rag.onnx_embeddings --output {model_dir}{' --quantize' if quantized else ''}"
+            )
+
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.model_name = model_name
+        self.quantized = quantized
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            return_tensors="np",
+        )
+        feeds = {}
+        for name in self._input_names:
+            if name in encoded:
+                feeds[name] = encoded[name].astype(np.int64)
+            else:
+                feeds[name] = np.zeros_like(encoded["input_ids"], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalise (sentence-transformers Pooling + Normalize)
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [
+            self._embed_batch(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        return np.vstack(batches).astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export MiniLM to ONNX for the onnx embedding backend.")
+    parser.add_argument("--output", default="models/minilm-onnx")
+    parser.add_argument("--quantize", action="store_true", help="Also write a dynamic int8 model")
+    args = parser.parse_args()
+    export_onnx_model(args.output, quantize=args.quantize)
@@ -0,0 +1,138 @@
+"""
+Direct Postgres data path for match_sol_standards.
+
+The default RPC path goes supabase-py -> PostgREST -> match_sol_standards:
+an HTTP round trip per query, with the 384-float query embedding rendered
+as JSON text and parsed back into a vector server-side. With
+SOL_SEARCH_BACKEND = "asyncpg" and SOL_DATABASE_URL set, the async search
+path instead talks to Postgres over a pooled asyncpg connection:
+
+- the pool is created once per process, on first use;
+- each connection prepares the match_sol_standards call once (asyncpg's
+  per-connection statement cache) and only binds parameters afterwards;
+- the vector parameter travels in pgvector's binary format (4 header
+  bytes + big-endian float32s) rather than as text.
+
+SOL_DATABASE_URL must be a direct or session-mode connection: transaction
+poolers (Supabase's port 6543) do not keep prepared statements across
+transactions.
+"""
+import asyncio
+import json
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import get_settings
+
+MATCH_SQL = (
+    "select id::text as id, content, metadata, similarity "
+    "from match_sol_standards($1, $2, $3, $4)"
+)
+# Quantized modes (migrations/08); exact mode keeps the 4-argument call so databases without it work
+MATCH_SQL_QUANTIZED = (
+    "select id::text as id, content, metadata, similarity "
+    "from match_sol_standards($1, $2, $3, $4, $5, $6)"
+)
+
+
+def encode_vector(vector) -> bytes:
+    """pgvector binary format: dim (uint16), unused (uint16), float32 values, big-endian."""
+    values = np.asarray(vector, dtype=">f4")
+    return len(values).to_bytes(2, "big") + b"\x00\x00" + values.tobytes()
+
+
+def decode_vector(data: bytes) -> List[float]:
+    dim = int.from_bytes(data[:2], "big")
+    return np.frombuffer(data, dtype=">f4", count=dim, offset=4).astype(np.float32).tolist()
+
+
+async def _init_connection(conn):
+    # pgvector may live outside public (Supabase installs it in "extensions")
+    schema = await conn.fetchval(
+        "select n.nspname from pg_type t join pg_namespace n on n.oid = t.typnamespace "
+        "where t.typname = 'vector'"
+    )
+    if schema is None:
+        raise RuntimeError("pgvector is not installed in SOL_DATABASE_URL")
+    await conn.set_type_codec(
+        "vector", schema=schema, encoder=encode_vector, decoder=decode_vector, format="binary"
+    )
+    await conn.set_type_codec(
+        "jsonb", schema="pg_catalog", encoder=json.dumps, decoder=json.loads, format="text"
+    )
+
+
+class PgSearch:
+    """A lazily created asyncpg pool bound to the event loop that first used it."""
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool = None
+        self._lock = asyncio.Lock()
+
+    async def pool(self):
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    import asyncpg
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        init=_init_connection,
+                    )
+                    print(f"[RAG_PG] Connected asyncpg pool ({self.min_size}-{self.max_size} connections)")
+        return self._pool
+
+    async def match(
+        self,
+        query_embedding: List[float],
+        match_threshold: float,
+        match_count: int,
+        filter_metadata: dict,
+        search_mode: str = "exact",
+        rescore_factor: int = 10,
+    ) -> List[dict]:
+        """Rows shaped like the RPC response: id (text), content, metadata (dict), similarity."""
+        pool = await self.pool()
+        if search_mode == "exact":
+            rows = await pool.fetch(MATCH_SQL, query_embedding, match_threshold, match_count, filter_metadata)
+        else:
+            rows = await pool.fetch(
+                MATCH_SQL_QUANTIZED, query_embedding, match_threshold, match_count,
+                filter_metadata, search_mode, rescore_factor
+            )
+        return [dict(row) for row in rows]
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+_pg_search: Optional[PgSearch] = None
+
+
+def get_pg_search() -> Optional[PgSearch]:
+    """The shared direct search path, or None when retrieval should use the RPC."""
+    global _pg_search
+    settings = get_settings()
+    if settings.SOL_SEARCH_BACKEND != "asyncpg" or not settings.SOL_DATABASE_URL:
+        return None
+    if _pg_search is None:
+        _pg_search = PgSearch(
+            settings.SOL_DATABASE_URL,
+            min_size=settings.SOL_PG_POOL_MIN_SIZE,
+            max_size=settings.SOL_PG_POOL_MAX_SIZE,
+        )
+    return _pg_search
+
+
+async def close_pg_search():
+    global _pg_search
+    if _pg_search is not None:
+        await _pg_search.close()
+        _pg_search = None
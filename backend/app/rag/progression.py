@@ -0,0 +1,78 @@
+"""
+Vertical progression graph: the same standard across grades.
+
+Ingest tags side-by-side rows (3.W.1, 4.W.1, ...) and progression chart rows
+(a skill with its A/G/*/- level in every grade) with a grade-independent
+`standard_id` such as 'W.1' (app/rag/sol_metadata.py). The graph maps
+(standard id or strand, grade) to corpus rows, so when a grade's standards
+are thin the same skill can be pulled from that grade's progression entries
+and then the neighbouring grades, from memory and in a fixed order. Rows
+are kept in stable_key order, like the database fallback in
+retrieval.retrieve_progression, so both return the same rows.
+"""
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from app.rag.sol_metadata import ALL_GRADES, chunk_grades
+from app.rag.standards_index import stable_key
+
+
+def neighbour_grades(grade: str, radius: int = 1) -> List[str]:
+    """The grade itself, then the grades around it, nearest (and lower) first: '3' -> ['3', '2', '4']."""
+    if grade not in ALL_GRADES:
+        return []
+    position = ALL_GRADES.index(grade)
+    grades = [grade]
+    for step in range(1, radius + 1):
+        for neighbour in (position - step, position + step):
+            if 0 <= neighbour < len(ALL_GRADES):
+                grades.append(ALL_GRADES[neighbour])
+    return grades
+
+
+def progression_skills(meta: dict) -> Tuple[str, ...]:
+    """
+    The standard id and strand a row is filed under ('W.1', 'W'). Rows
+    without a standard_id are not part of any progression, even when they
+    carry a strand.
+    """
+    standard_id = meta.get("standard_id")
+    if not standard_id:
+        return ()
+    return standard_id, standard_id.split(".")[0]
+
+
+class ProgressionGraph:
+    """(standard id or strand, grade) -> rows, in stable_key order."""
+
+    def __init__(self, contents: Sequence[str], metadata: Sequence[dict]):
+        self._rows: Dict[Tuple[str, str], List[int]] = {}
+        order = sorted(range(len(metadata)), key=lambda row: stable_key(contents[row], metadata[row]))
+        for row in order:
+            meta = metadata[row]
+            for skill in progression_skills(meta):
+                for grade in chunk_grades(meta):
+                    self._rows.setdefault((skill, grade), []).append(row)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def rows(self, skill: str, grade: str) -> List[int]:
+        """Rows of a standard ('W.1') or a whole strand ('LU') in one grade."""
+        return list(self._rows.get((skill, str(grade)), []))
+
+    def expand(self, skills: Iterable[str], grade: str, radius: int = 1) -> List[int]:
+        """
+        Rows for the skills in `grade`, then in the grades around it out to
+        `radius`, without duplicates. The order only depends on the corpus
+        contents, not on row ids or load order.
+        """
+        skills = list(skills)
+        seen = set()
+        rows = []
+        for neighbour in neighbour_grades(str(grade), radius):
+            for skill in skills:
+                for row in self._rows.get((skill, neighbour), []):
+                    if row not in seen:
+                        seen.add(row)
+                        rows.append(row)
+        return rows
@@ -0,0 +1,32 @@
+"""
+Retrieval query templates shared by gap analysis, context expansion and cache warming.
+
+Keeping them in one place means the retrieval space is a small, known
+grade x stage grid that can be precomputed (see warm_retrieval_cache).
+"""
+
+# Grades offered in profiles.grade_level and the stages with a gap-analysis node
+GRADES = ["K", "1", "2", "3", "4", "5", "6"]
+STAGES = ["prewriting", "drafting", "revising", "editing"]
+
+# Synonym expansion used when the plain stage query is insufficient
+STAGE_SYNONYMS = {
+    "prewriting": "brainstorming, planning, outlining, organizing ideas",
+    "drafting": "writing paragraphs, sentence structure, elaboration, drafting",
+    "revising": "improving content, organization, clarity, flow, revision",
+    "editing": "grammar, punctuation, capitalization, spelling, editing"
+}
+
+STAGE_MATCH_COUNT = 5
+SYNONYM_MATCH_COUNT = 8  # Increase recall on expansion
+
+
+def stage_query(stage: str, grade_level: str) -> str:
+    """Step 1 query of the gap analysis pipeline."""
+    return f"{stage} writing skills grade {grade_level}"
+
+
+def synonym_query(stage: str, grade_level: str) -> str:
+    """Synonym-expanded query used by expand_rag_context."""
+    stage_synonyms = STAGE_SYNONYMS.get(stage, stage)
+    return f"{stage_synonyms} skills grade {grade_level}"
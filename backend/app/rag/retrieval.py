@@ -1,9 +1,165 @@
 """
 RAG Retrieval module for querying SOL standards from Supabase.
+
+Queries are answered from the worker's in-process vector index when it is
+available (see app/rag/vector_index.py); the match_sol_standards RPC is the
+fallback. With SOL_HYBRID_SEARCH the local index fuses vector and BM25
+rankings by reciprocal rank, and with SOL_MMR_ENABLED the final k chunks are
+picked by maximal marginal relevance so overlapping chunks are not returned
+together. Results are memoized per corpus version (see
+retrieval_cache.py).
+
+retrieve_sol_standards is the non-blocking path used by the agents: query
+embedding runs on a bounded executor and the RPC fallback uses the async
+Supabase client, or a pooled asyncpg connection with SOL_SEARCH_BACKEND =
+"asyncpg" (see pg_search.py). retrieve_sol_standards_sync remains for
+scripts and the cache warm-up: it also searches the local index first, and
+its fallback is always the blocking PostgREST RPC.
+
+lookup_sol_standards fetches standards by SOL code ('3.W.2', or '3.LU' for a
+strand) with no embedding or vector search, from the local code index or a
+jsonb containment query (SOL_CODE_LOOKUP_ENABLED gates its use in gap
+analysis). retrieve_progression pulls the same stage skills
+from the grade's progression entries and the neighbouring grades the same
+way; it is the first context expansion tier, ahead of web search.
 """
-from typing import List, Optional
-from app.core.database import get_supabase_client
+import asyncio
+from typing import Awaitable, Dict, Iterable, List, Optional, Tuple
+from app.core.config import get_settings
+from app.core.database import get_supabase_client, get_async_supabase_client
+from app.rag.bm25 import reciprocal_rank_fusion
+from app.rag.corpus_version import acurrent_corpus_version, current_corpus_version, is_snapshot_version
 from app.rag.embeddings import Embeddings
+from app.rag.queries import (
+    GRADES, STAGES, STAGE_MATCH_COUNT, SYNONYM_MATCH_COUNT, stage_query, synonym_query
+)
+from app.rag.retrieval_cache import retrieval_cache, retrieval_cache_key
+from app.rag.pg_search import get_pg_search
+from app.rag.progression import neighbour_grades, progression_skills
+from app.rag.sol_metadata import split_code, standard_ids_for_stage
+from app.rag.standards_index import round_robin, stable_key, states_code
+from app.rag.vector_index import SOLVectorIndex, aget_vector_index, get_vector_index
+
+
+def _build_filter(grade_level: Optional[str], stage: Optional[str]) -> dict:
+    filter_metadata = {}
+    if grade_level:
+        # jsonb containment: chunks whose extracted grade list includes this grade
+        filter_metadata["grades"] = [grade_level]
+    # if stage:
+    #     filter_metadata["stage"] = stage
+    return filter_metadata
+
+
+def _match_params(
+    query_embedding: List[float],
+    grade_level: Optional[str],
+    stage: Optional[str],
+    match_count: int,
+    match_threshold: float
+) -> dict:
+    params = {
+        "query_embedding": query_embedding,
+        "match_threshold": match_threshold,
+        "match_count": match_count,
+        "filter_metadata": _build_filter(grade_level, stage)
+    }
+    settings = get_settings()
+    # Only sent when quantized, so databases without migration 08 keep working in exact mode
+    if settings.SOL_SEARCH_MODE != "exact":
+        params["search_mode"] = settings.SOL_SEARCH_MODE
+        params["rescore_factor"] = settings.SOL_RESCORE_FACTOR
+    return params
+
+
+def search_index(
+    index: SOLVectorIndex,
+    query: str,
+    query_embedding: List[float],
+    grade_level: Optional[str],
+    match_count: int,
+    match_threshold: float
+) -> List[dict]:
+    settings = get_settings()
+    mmr_lambda = settings.SOL_MMR_LAMBDA if settings.SOL_MMR_ENABLED else None
+    if settings.SOL_HYBRID_SEARCH:
+        return index.hybrid_search(
+            query,
+            query_embedding,
+            grade_level=grade_level,
+            match_count=match_count,
+            match_threshold=match_threshold,
+            rrf_k=settings.SOL_RRF_K,
+            mmr_lambda=mmr_lambda
+        )
+    return index.search(
+        query_embedding,
+        grade_level=grade_level,
+        match_count=match_count,
+        match_threshold=match_threshold,
+        mmr_lambda=mmr_lambda
+    )
+
+
+def _search_standards(
+    query: str,
+    query_embedding: List[float],
+    grade_level: Optional[str],
+    stage: Optional[str],
+    match_count: int,
+    match_threshold: float
+) -> List[dict]:
+    """Runs the similarity search locally if the index is loaded, otherwise via the RPC."""
+    index = get_vector_index()
+    if index is not None and len(index) > 0:
+        return search_index(index, query, query_embedding, grade_level, match_count, match_threshold)
+
+    # Query Supabase using the match_sol_standards RPC function
+    supabase = get_supabase_client()
+    response = supabase.rpc(
+        "match_sol_standards",
+        _match_params(query_embedding, grade_level, stage, match_count, match_threshold)
+    ).execute()
+    return response.data or []
+
+
+async def _asearch_standards(
+    query: str,
+    query_embedding: List[float],
+    grade_level: Optional[str],
+    stage: Optional[str],
+    match_count: int,
+    match_threshold: float
+) -> List[dict]:
+    """Async variant of _search_standards; never blocks the event loop on I/O."""
+    index = await aget_vector_index()
+    if index is not None and len(index) > 0:
+        return search_index(index, query, query_embedding, grade_level, match_count, match_threshold)
+
+    params = _match_params(query_embedding, grade_level, stage, match_count, match_threshold)
+    pg_search = get_pg_search()
+    if pg_search is not None:
+        try:
+            return await pg_search.match(**params)
+        except Exception as e:
+            print(f"[RAG_PG] Direct search failed ({e}); falling back to the RPC")
+
+    supabase = await get_async_supabase_client()
+    response = await supabase.rpc("match_sol_standards", params).execute()
+    return response.data or []
+
+
+def _log_results(tag: str, query: str, grade_level: Optional[str], stage: Optional[str], rows: List[dict]):
+    if not rows:
+        print(f"\n[{tag}] Query: '{query}' - No results found.")
+        return
+
+    print(f"\n[{tag}] Query: '{query}' | Grade: {grade_level} | Stage: {stage}")
+    print(f"[{tag}] Retrieved {len(rows)} standards:")
+    for i, item in enumerate(rows):
+        meta = item.get("metadata", {})
+        content_preview = item["content"][:100] + "..." if len(item["content"]) > 100 else item["content"]
+        print(f"  {i+1}. [Sim: {item.get('similarity', 'N/A'):.4f}] {content_preview} (Meta: {meta})")
 
 
 async def retrieve_sol_standards(
@@ -15,60 +171,83 @@ async def retrieve_sol_standards(
 ) -> List[str]:
     """
     Retrieves relevant SOL standards based on semantic similarity.
-    
+
     Args:
         query: The search query (student text or context)
         grade_level: Optional grade level filter (K, 1, 2, etc.)
         stage: Optional writing stage filter (prewriting, drafting, etc.)
         match_count: Number of results to return
         match_threshold: Minimum similarity threshold (0-1)
-    
+
     Returns:
         List of relevant SOL standard content strings
     """
-    # Generate embedding for the query
-    embed_model = Embeddings.get_embeddings()
-    query_embedding = embed_model.embed_query(query)
-    
-    # Build filter metadata
-    filter_metadata = {}
-    if grade_level:
-        filter_metadata["grade"] = grade_level
-    # if stage:
-    #     filter_metadata["stage"] = stage
-    
-    # Query Supabase using the match_sol_standards RPC function
-    supabase = get_supabase_client()
-    
+    version = await acurrent_corpus_version()
+    cache_key = retrieval_cache_key(query, grade_level, match_count, match_threshold)
+    cached = retrieval_cache.get(version, cache_key)
+    if cached is not None:
+        print(f"\n[RAG] Cache hit: '{query}' | Grade: {grade_level} ({len(cached)} standards)")
+        return cached
+
     try:
-        response = supabase.rpc(
-            "match_sol_standards",
-            {
-                "query_embedding": query_embedding,
-                "match_threshold": match_threshold,
-                "match_count": match_count,
-                "filter_metadata": filter_metadata if filter_metadata else {}
-            }
-        ).execute()
-        
-        if response.data:
-            print(f"\n[RAG] Query: '{query}' | Grade: {grade_level} | Stage: {stage}")
-            print(f"[RAG] Retrieved {len(response.data)} standards:")
-            for i, item in enumerate(response.data):
-                meta = item.get("metadata", {})
-                content_preview = item["content"][:100] + "..." if len(item["content"]) > 100 else item["content"]
-                print(f"  {i+1}. [Sim: {item.get('similarity', 'N/A'):.4f}] {content_preview} (Meta: {meta})")
-            
-            return [item["content"] for item in response.data]
-        
-        print(f"\n[RAG] Query: '{query}' - No results found.")
-        return []
-    
+        # Generate embedding for the query (off the event loop)
+        query_embedding = await Embeddings.aembed_query(query)
+        rows = await _asearch_standards(query, query_embedding, grade_level, stage, match_count, match_threshold)
+        _log_results("RAG", query, grade_level, stage, rows)
+        contents = [item["content"] for item in rows]
+        retrieval_cache.put(version, cache_key, contents)
+        return contents
+
     except Exception as e:
         print(f"Error retrieving SOL standards: {e}")
         return []
 
 
+async def retrieve_fused(
+    queries: List[str],
+    grade_level: Optional[str] = None,
+    stage: Optional[str] = None,
+    match_count: int = 5,
+    match_threshold: float = 0.5,
+    extra_sources: Optional[Dict[str, Awaitable[List[str]]]] = None
+) -> List[Tuple[str, str]]:
+    """
+    Issues several retrievals concurrently and merges them by reciprocal-rank fusion.
+
+    Args:
+        queries: SOL queries to run against the corpus (e.g. base + synonym-expanded)
+        extra_sources: Optional named awaitables returning ranked content lists
+            (e.g. {"web_search": <Tavily call>}) fused alongside the corpus results
+
+    Returns:
+        Up to match_count (content, source) pairs, best first. Corpus hits have
+        source "sol_db"; extra results carry their source name.
+    """
+    extra_sources = extra_sources or {}
+    names = ["sol_db"] * len(queries) + list(extra_sources.keys())
+    tasks = [
+        retrieve_sol_standards(q, grade_level=grade_level, stage=stage,
+                               match_count=match_count, match_threshold=match_threshold)
+        for q in queries
+    ] + list(extra_sources.values())
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    rankings = []
+    source_of: Dict[str, str] = {}
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            print(f"[RAG_FUSED] {name} retrieval failed: {result}")
+            continue
+        rankings.append(result)
+        for content in result:
+            source_of.setdefault(content, name)
+
+    fused = reciprocal_rank_fusion(rankings, k=get_settings().SOL_RRF_K)[:match_count]
+    print(f"[RAG_FUSED] Fused {sum(len(r) for r in rankings)} results from "
+          f"{len(rankings)} sources into {len(fused)} standards")
+    return [(content, source_of[content]) for content, _ in fused]
+
+
 def retrieve_sol_standards_sync(
     query: str,
     grade_level: Optional[str] = None,
@@ -79,44 +258,173 @@ def retrieve_sol_standards_sync(
     """
     Synchronous version of retrieve_sol_standards for use in sync contexts.
     """
+    version = current_corpus_version()
+    cache_key = retrieval_cache_key(query, grade_level, match_count, match_threshold)
+    cached = retrieval_cache.get(version, cache_key)
+    if cached is not None:
+        print(f"\n[RAG_SYNC] Cache hit: '{query}' | Grade: {grade_level} ({len(cached)} standards)")
+        return cached
+
     # Generate embedding for the query
     embed_model = Embeddings.get_embeddings()
     query_embedding = embed_model.embed_query(query)
-    
-    # Build filter metadata
-    filter_metadata = {}
-    if grade_level:
-        filter_metadata["grade"] = grade_level
-    # if stage:
-    #     filter_metadata["stage"] = stage
-    
-    # Query Supabase
-    supabase = get_supabase_client()
-    
+
     try:
-        response = supabase.rpc(
-            "match_sol_standards",
-            {
-                "query_embedding": query_embedding,
-                "match_threshold": match_threshold,
-                "match_count": match_count,
-                "filter_metadata": filter_metadata if filter_metadata else {}
-            }
-        ).execute()
-        
-        if response.data:
-            print(f"\n[RAG_SYNC] Query: '{query}' | Grade: {grade_level} | Stage: {stage}")
-            print(f"[RAG_SYNC] Retrieved {len(response.data)} standards:")
-            for i, item in enumerate(response.data):
-                meta = item.get("metadata", {})
-                content_preview = item["content"][:100] + "..." if len(item["content"]) > 100 else item["content"]
-                print(f"  {i+1}. [Sim: {item.get('similarity', 'N/A'):.4f}] {content_preview} (Meta: {meta})")
-            
-            return [item["content"] for item in response.data]
-        
-        print(f"\n[RAG_SYNC] Query: '{query}' - No results found.")
-        return []
-    
+        rows = _search_standards(query, query_embedding, grade_level, stage, match_count, match_threshold)
+        _log_results("RAG_SYNC", query, grade_level, stage, rows)
+        contents = [item["content"] for item in rows]
+        retrieval_cache.put(version, cache_key, contents)
+        return contents
+
     except Exception as e:
         print(f"Error retrieving SOL standards: {e}")
         return []
+
+
+def warm_retrieval_cache(
+    grades: Iterable[str] = GRADES,
+    stages: Iterable[str] = STAGES,
+    match_threshold: float = 0.5
+) -> int:
+    """
+    Precomputes the grade x stage retrieval grid used by gap analysis and
+    context expansion, embedding every template query in one batch.
+
+    Returns the number of cached entries written.
+    """
+    specs = []
+    for grade_level in grades:
+        for stage in stages:
+            specs.append((stage_query(stage, grade_level), grade_level, STAGE_MATCH_COUNT))
+            specs.append((synonym_query(stage, grade_level), grade_level, SYNONYM_MATCH_COUNT))
+
+    version = current_corpus_version()
+    embed_model = Embeddings.get_embeddings()
+    vectors = embed_model.embed_documents([query for query, _, _ in specs])
+
+    for (query, grade_level, match_count), vector in zip(specs, vectors):
+        rows = _search_standards(query, vector, grade_level, None, match_count, match_threshold)
+        retrieval_cache.put(
+            version,
+            retrieval_cache_key(query, grade_level, match_count, match_threshold),
+            [item["content"] for item in rows]
+        )
+
+    print(f"[RAG] Warmed retrieval cache with {len(specs)} queries (version {version})")
+    return len(specs)
+
+
+def _code_filter(code: str) -> dict:
+    """jsonb containment filter for one SOL code in its grade (a strand code matches the strand in that grade)."""
+    grade, strand, number = split_code(code)
+    if number is None:
+        return {"grades": [grade], "strand": strand}
+    return {"standards": [code], "grades": [grade]}
+
+
+async def lookup_sol_standards(codes: List[str], match_count: Optional[int] = None) -> List[dict]:
+    """
+    Exact-match retrieval by SOL code, taking one row from each code in turn
+    so match_count is spread over all of them.
+
+    Returns rows shaped like search results (id, content, metadata,
+    similarity 1.0), without duplicates, at most match_count of them.
+    """
+    if not codes:
+        return []
+    try:
+        index = await aget_vector_index()
+        if index is not None and len(index) > 0:
+            return index.lookup(codes, match_count)
+        per_code = await _afetch_each([_code_filter(code) for code in codes])
+        by_id, rankings = {}, []
+        for code, rows in zip(codes, per_code):
+            if split_code(code)[2] is not None:
+                # Containment also matches rows that only cite the code
+                rows = [r for r in rows if states_code(r.get("metadata") or {}, code)]
+            by_id.update((r["id"], r) for r in rows)
+            rankings.append([r["id"] for r in rows])
+        return [by_id[row_id] for row_id in round_robin(rankings, match_count)]
+
+    except Exception as e:
+        print(f"Error looking up SOL standards {codes}: {e}")
+        return []
+
+
+async def _afetch_each(filters: List[dict]) -> List[List[dict]]:
+    """Rows of the live corpus matching each metadata containment filter, in stable_key order."""
+    version = await acurrent_corpus_version()
+    supabase = await get_async_supabase_client()
+
+    async def fetch(metadata_filter: dict) -> List[dict]:
+        query = supabase.table("sol_standards")\
+            .select("id, content, metadata")\
+            .contains("metadata", metadata_filter)
+        if is_snapshot_version(version):
+            query = query.eq("corpus_version", version)
+        response = await query.execute()
+        rows = [{**row, "similarity": 1.0} for row in response.data or []]
+        return sorted(rows, key=lambda r: stable_key(r["content"], r.get("metadata") or {}))
+
+    return list(await asyncio.gather(*(fetch(f) for f in filters)))
+
+
+async def _afetch_contains(filters: List[dict]) -> List[dict]:
+    """_afetch_each flattened in filter order, without duplicates."""
+    results, seen = [], set()
+    for rows in await _afetch_each(filters):
+        for row in rows:
+            if row["id"] in seen:
+                continue
+            seen.add(row["id"])
+            results.append(row)
+    return results
+
+
+async def retrieve_progression(
+    grade_level: str,
+    stage: str,
+    match_count: int = SYNONYM_MATCH_COUNT,
+    exclude: Iterable[str] = ()
+) -> List[str]:
+    """
+    Standards for the stage's skills along their vertical progression: the
+    grade's own progression entries first, then the grades just below and
+    above. Deterministic for a corpus version; no embedding, no network
+    beyond the database fallback.
+
+    Args:
+        exclude: Contents already in context (not returned again)
+    """
+    skills = standard_ids_for_stage(stage.lower())
+    exclude = list(exclude)
+    try:
+        index = await aget_vector_index()
+        if index is not None and len(index) > 0:
+            rows = index.progression_rows(skills, grade_level, match_count, exclude)
+        else:
+            filters = []
+            for grade in neighbour_grades(str(grade_level)):
+                for skill in skills:
+                    key = "standard_id" if "." in skill else "strand"
+                    filters.append({key: skill, "grades": [grade]})
+            excluded = set(exclude)
+            # Same rows as ProgressionGraph: a strand filter also matches rows without a standard_id
+            rows = [
+                r for r in await _afetch_contains(filters)
+                if progression_skills(r.get("metadata") or {}) and r["content"] not in excluded
+            ][:match_count]
+        print(f"[RAG_PROGRESSION] {stage} grade {grade_level}: {len(rows)} standards from {skills}")
+        return [row["content"] for row in rows]
+
+    except Exception as e:
+        print(f"Error retrieving SOL progression for {stage} grade {grade_level}: {e}")
+        return []
+
+
+async def describe_standards(contents: List[str]) -> List[Optional[dict]]:
+    """Metadata of each retrieved chunk text, None for text not in the local index (e.g. web results)."""
+    index = await aget_vector_index()
+    if index is None:
+        return [None] * len(contents)
+    return [index.metadata_for(content) for content in contents]
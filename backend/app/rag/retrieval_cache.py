@@ -0,0 +1,77 @@
+"""
+Memoized retrieval results keyed by corpus version.
+
+Retrieval queries come from a fixed grade x stage template grid, so the same
+handful of (query, grade) pairs repeat on almost every request. Entries are
+tagged with the corpus version they were computed against; when ingest
+publishes a new version the whole cache is dropped.
+"""
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+from app.core.config import get_settings
+
+
+class RetrievalCache:
+    """Thread-safe LRU of retrieval results for a single corpus version."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: Optional[str]):
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get(self, version: Optional[str], key: Hashable) -> Optional[List[str]]:
+        with self._lock:
+            self._check_version(version)
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # Callers extend the list with web results; never hand out the cached object.
+            return list(value)
+
+    def put(self, version: Optional[str], key: Hashable, value: List[str]):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = list(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.version = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+retrieval_cache = RetrievalCache(max_entries=get_settings().RETRIEVAL_CACHE_MAX_ENTRIES)
+
+
+def retrieval_cache_key(
+    query: str,
+    grade_level: Optional[str],
+    match_count: int,
+    match_threshold: float
+) -> tuple:
+    # stage is not part of the key: it only affects logging, not the search itself
+    return (query, grade_level or "", match_count, round(match_threshold, 4))
@@ -0,0 +1,546 @@
+"""
+Structured metadata for SOL source documents.
+
+Replaces filename substring checks ("3-" in filename) with:
+- a .docx reader that keeps the heading structure (Heading 1/2/3 sections)
+  and turns every standard table row into its own section with its column
+  values (side-by-side grade cells, progression chart levels),
+- grade extraction from SOL codes (3.W.2, K.RV.1), grade headings
+  ("Grade Three", "Kindergarten") and file-level grade bands
+  ("Grades 4-6", "9-12 Side By Side", progression charts = K-12),
+- strand (W, LU, RL, ...) and writing-stage tags derived from the standard.
+
+Every chunk gets an explicit `grades` list; chunks whose grade cannot be
+determined (front matter, appendices) get an empty list and are only
+returned by unfiltered searches.
+"""
+import re
+import zipfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+from xml.etree import ElementTree
+
+ALL_GRADES = ["K"] + [str(g) for g in range(1, 13)]
+
+STRANDS = {
+    "FFR": "Foundations for Reading",
+    "DSR": "Developing Skilled Readers and Building Reading Stamina",
+    "RV": "Reading and Vocabulary",
+    "RL": "Reading Literary Text",
+    "RI": "Reading Informational Text",
+    "FFW": "Foundations for Writing",
+    "W": "Writing",
+    "LU": "Language Usage",
+    "C": "Communication and Multimodal Literacies",
+    "R": "Research",
+}
+STRAND_BY_NAME = {name.lower(): code for code, name in STRANDS.items()}
+
+# Writing-process stages each writing standard is taught in.
+# Key: (strand, standard number or None for the whole strand)
+STAGES_BY_STANDARD: Dict[tuple, List[str]] = {
+    ("W", 1): ["prewriting", "drafting"],  # Modes and Purposes for Writing
+    ("W", 2): ["drafting", "revising"],  # Organization and Composition
+    ("W", 3): ["editing"],  # Usage and Mechanics
+    ("LU", None): ["revising", "editing"],
+    ("FFW", None): ["editing", "publishing"],  # Handwriting, Spelling
+    ("R", None): ["prewriting"],
+}
+
+# Progression charts: file-name prefix -> strand, and the chart's standard
+# columns ("Modes and Purposes for Writing Standards") -> standard number
+PROGRESSION_CHART_STRANDS = [
+    ("communication", "C"),
+    ("foundations for reading", "FFR"),
+    ("foundations for writing", "FFW"),
+    ("language usage", "LU"),
+    ("reading informational", "RI"),
+    ("reading literary", "RL"),
+    ("reading and vocabulary", "RV"),
+    ("research", "R"),
+    ("writing", "W"),
+]
+STANDARD_NAMES: Dict[tuple, str] = {
+    ("C", 1): "communication, listening, and collaboration",
+    ("C", 2): "speaking and presentation of ideas",
+    ("C", 3): "integrating multimodal literacies",
+    ("C", 4): "examining media messages",
+    ("FFR", 1): "print concepts",
+    ("FFR", 2): "phonological and phonemic awareness",
+    ("FFR", 3): "phonics and word analysis",
+    ("FFW", 1): "handwriting",
+    ("FFW", 2): "spelling",
+    ("LU", 1): "grammar",
+    ("LU", 2): "mechanics",
+    ("RI", 1): "key ideas and confirming details",
+    ("RI", 2): "craft and style",
+    ("RI", 3): "integration of concepts",
+    ("RL", 1): "key ideas and details",
+    ("RL", 2): "craft and style",
+    ("RL", 3): "integration of concepts",
+    ("RV", 1): "reading and vocabulary",
+    ("R", 1): "research",
+    ("W", 1): "modes and purposes for writing",
+    ("W", 2): "organization and composition",
+    ("W", 3): "usage and mechanics",
+}
+# Spelling slips in the chart headers
+_NAME_FIXES = {"amalysis": "analysis"}
+
+# Gap-analysis skill domains (app/agents/gap_analysis.py) and the standards that teach them
+SKILL_STANDARDS: Dict[str, List[tuple]] = {
+    "ideas": [("W", 1), ("R", 1)],
+    "voice": [("W", 1)],
+    "organization": [("W", 2)],
+    "focus": [("W", 2)],
+    "elaboration": [("W", 2)],
+    "word_choice": [("W", 2), ("RV", 1)],
+    "sentence_fluency": [("W", 2), ("LU", 1)],
+    "conventions": [("W", 3), ("LU", 1), ("LU", 2), ("FFW", 2)],
+}
+
+NUMBER_WORDS = {
+    "kindergarten": "K", "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+    "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10", "eleven": "11", "twelve": "12",
+}
+_GRADE_TOKEN = r"(K|1[0-2]|[1-9]|" + "|".join(w for w in NUMBER_WORDS if w != "kindergarten") + r")"
+
+# 3.W.2, K.RV.1, 10.LU, 3.FFR.3
+SOL_CODE = re.compile(r"\b(K|1[0-2]|[1-9])\.(FFR|DSR|RV|RL|RI|FFW|W|LU|C|R)(?:\.(\d+))?\b")
+# Strand-only codes used by side-by-side documents: "FFR.1-Print Concepts", "RV.1"
+STRAND_CODE = re.compile(r"(?<![\w.])(FFR|DSR|RV|RL|RI|FFW|W|LU|C|R)\.(\d+)\b")
+# "Grades 4-6", "Grades Three-Five", "Grade One-Grade Three", "Grade Seven – Grade Nine"
+GRADE_RANGE = re.compile(
+    r"\bgrades?\s+" + _GRADE_TOKEN + r"\s*(?:-|–|to|through)\s*(?:grade\s+)?" + _GRADE_TOKEN + r"\b", re.I
+)
+GRADE_SINGLE = re.compile(r"\bgrade\s+" + _GRADE_TOKEN + r"\b", re.I)
+KINDERGARTEN = re.compile(r"\bkindergarten\b", re.I)
+# Leading file-name bands: "K-2 Side By Side", "9-12 - Side By Side", "0-K_...", "3_Understanding"
+FILE_BAND = re.compile(r"^(K|0|1[0-2]|[1-9])\s*-\s*(K|1[0-2]|[1-9])(?![\d])")
+FILE_SINGLE = re.compile(r"^(K|1[0-2]|[1-9])_")
+
+# Plain paragraphs this short that name a grade (and are not sentences) are treated as grade titles
+TITLE_MAX_LENGTH = 120
+TOC_LEADER = re.compile(r"\.{4,}|…")
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+HEADING_STYLE = re.compile(r"^(?:Heading|Title)(\d*)$", re.I)
+
+
+def _grade(token: str) -> Optional[str]:
+    token = token.strip().lower()
+    if token in ("k", "0"):
+        return "K"
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    if token.isdigit() and 1 <= int(token) <= 12:
+        return token
+    return None
+
+
+def grade_range(start: str, end: str) -> List[str]:
+    """Inclusive K-12 range between two grade labels."""
+    lo, hi = ALL_GRADES.index(start), ALL_GRADES.index(end)
+    return ALL_GRADES[min(lo, hi):max(lo, hi) + 1]
+
+
+def sort_grades(grades) -> List[str]:
+    return sorted(set(grades), key=ALL_GRADES.index)
+
+
+def chunk_grades(meta: dict) -> List[str]:
+    """Grades a chunk applies to: the extracted `grades` list, or the legacy single `grade` tag."""
+    grades = meta.get("grades")
+    if grades is None:
+        grades = [meta["grade"]] if meta.get("grade") else []
+    return [str(g) for g in grades]
+
+
+def grade_band(grades: Sequence[str]) -> Optional[str]:
+    """'3', 'K-2' for a contiguous run, else a comma list. None for no grades."""
+    grades = sort_grades(g for g in grades if g in ALL_GRADES)
+    if not grades:
+        return None
+    if len(grades) == 1:
+        return grades[0]
+    if grade_range(grades[0], grades[-1]) == grades:
+        return f"{grades[0]}-{grades[-1]}"
+    return ",".join(grades)
+
+
+def grades_from_filename(file_name: str) -> List[str]:
+    """Grade band a source file covers, from its name. Empty if the name does not say."""
+    name = file_name.rsplit(".", 1)[0]
+    if "progression chart" in name.lower():
+        return list(ALL_GRADES)
+    found = grades_from_heading(name)
+    if found:
+        return found
+    match = FILE_BAND.match(name)
+    if match:
+        start, end = _grade(match.group(1)), _grade(match.group(2))
+        return grade_range(start, end)
+    match = FILE_SINGLE.match(name)
+    if match:
+        return [_grade(match.group(1))]
+    return []
+
+
+def grades_from_heading(text: str) -> List[str]:
+    """Grades named by a heading or title: 'Grade 3', 'Grades Three-Five', 'Kindergarten'."""
+    grades: List[str] = []
+    for match in GRADE_RANGE.finditer(text):
+        start, end = _grade(match.group(1)), _grade(match.group(2))
+        if start and end:
+            grades.extend(grade_range(start, end))
+    if not grades:
+        for match in GRADE_SINGLE.finditer(text):
+            grade = _grade(match.group(1))
+            if grade:
+                grades.append(grade)
+    if KINDERGARTEN.search(text) or re.search(r"\bgrade\s+K\b", text, re.I):
+        grades.append("K")
+    return sort_grades(grades)
+
+
+def standards_in_text(text: str) -> List[str]:
+    """Grade-qualified SOL codes in order of appearance, e.g. ['3.W.2', '3.LU']."""
+    seen = {}
+    for grade, strand, number in SOL_CODE.findall(text):
+        code = f"{grade}.{strand}" + (f".{number}" if number else "")
+        seen.setdefault(code, None)
+    return list(seen)
+
+
+def progression_standard(file_name: str, headings: Sequence[str]) -> tuple:
+    """
+    (strand, number) of a progression chart row, from the chart's file name
+    and its standard column header. (None, None) outside progression charts.
+    """
+    name = file_name.lower()
+    if "progression chart" not in name:
+        return None, None
+    strand = next((code for prefix, code in PROGRESSION_CHART_STRANDS if name.startswith(prefix)), None)
+    if not strand:
+        return None, None
+    for heading in reversed(list(headings)):
+        title = heading.strip().lower()
+        for typo, fixed in _NAME_FIXES.items():
+            title = title.replace(typo, fixed)
+        title = re.sub(r"\s+standards$", "", title)
+        for (code, number), standard_name in STANDARD_NAMES.items():
+            if code == strand and standard_name == title:
+                return strand, number
+    return strand, None
+
+
+def stages_for(strand: Optional[str], number: Optional[int]) -> List[str]:
+    if not strand:
+        return []
+    return STAGES_BY_STANDARD.get((strand, number)) or STAGES_BY_STANDARD.get((strand, None), [])
+
+
+def split_code(code: str) -> tuple:
+    """'3.W.2' -> ('3', 'W', 2); '3.LU' -> ('3', 'LU', None)."""
+    parts = code.split(".")
+    return parts[0], parts[1] if len(parts) > 1 else None, int(parts[2]) if len(parts) > 2 else None
+
+
+def skill_for(strand: Optional[str], number: Optional[int]) -> Optional[str]:
+    """First gap-analysis skill domain a standard teaches, if any."""
+    for skill, standards in SKILL_STANDARDS.items():
+        if (strand, number) in standards or (number is None and any(s == strand for s, _ in standards)):
+            return skill
+    return None
+
+
+def codes_for_skill(grade: str, skill: str) -> List[str]:
+    """Grade-qualified codes of the standards behind a skill domain: ('3', 'organization') -> ['3.W.2']."""
+    return [f"{grade}.{strand}.{number}" for strand, number in SKILL_STANDARDS.get(skill, [])]
+
+
+def standard_ids_for_stage(stage: str) -> List[str]:
+    """
+    Grade-independent ids of the standards taught in a writing stage. Strands
+    taught as a whole come back as the strand: 'editing' -> ['W.3', 'LU', 'FFW'].
+    """
+    return [
+        strand + (f".{number}" if number is not None else "")
+        for (strand, number), stages in STAGES_BY_STANDARD.items()
+        if stage in stages
+    ]
+
+
+def codes_for_stage(grade: str, stage: str) -> List[str]:
+    """Grade-qualified codes of the standards taught in a writing stage: ('3', 'editing') -> ['3.W.3', '3.LU', '3.FFW']."""
+    return [f"{grade}.{standard_id}" for standard_id in standard_ids_for_stage(stage)]
+
+
+@dataclass
+class DocSection:
+    """
+    Body text under one heading, with the path of headings above it. Table
+    rows are sections of their own (table_row=True) and keep their column
+    values in `columns`.
+    """
+
+    headings: List[str]
+    text: str
+    heading_grades: List[str] = field(default_factory=list)
+    table_row: bool = False
+    columns: Dict[str, object] = field(default_factory=dict)
+
+
+def _paragraph_text(element) -> str:
+    return "".join(t.text or "" for t in element.iter(W_NS + "t")).replace("\xa0", " ").strip()
+
+
+def _table_cells(table) -> List[List[List[str]]]:
+    """Rows -> cells -> non-empty paragraph texts; empty rows are dropped."""
+    rows = []
+    for row in table.iter(W_NS + "tr"):
+        cells = [
+            [text for text in (_paragraph_text(p) for p in cell.iter(W_NS + "p")) if text]
+            for cell in row.findall(W_NS + "tc")
+        ]
+        if any(cells):
+            rows.append(cells)
+    return rows
+
+
+def _column_grade(header: str) -> Optional[str]:
+    """'Grade Three', 'Grade 3', 'Kindergarten' -> single grade label, else None."""
+    grades = grades_from_heading(header)
+    return grades[0] if len(grades) == 1 else None
+
+
+def table_row_sections(table, headings: List[str], context: List[str]) -> List[DocSection]:
+    """
+    One section per standard row of a table, for the three layouts the SOL
+    documents use:
+
+    - side-by-side: a header of grade columns and one row of indicators per
+      standard. Every grade cell is its own row section, labelled with the
+      grade-qualified code when the heading names the standard ('FFR.1-Print
+      Concepts' under 'Grade Three' -> 3.FFR.1).
+    - progression chart: a skill column followed by one column per grade
+      holding A (appears), G (grows), * (subsumed) or -. The row's grades are
+      the ones where the skill is taught (A or G).
+    - single column (Understanding the Standards): the first row states the
+      standard and becomes the heading of the rows below it.
+
+    Any other table with a header row becomes 'Header: value' lines per row.
+    """
+    rows = _table_cells(table)
+    if not rows:
+        return []
+    header = [" ".join(cell) for cell in rows[0]]
+    column_grades = [_column_grade(h) for h in header]
+
+    if len(rows) > 1 and len(header) > 1 and all(column_grades):
+        code = next((STRAND_CODE.search(h) for h in reversed(headings) if STRAND_CODE.search(h)), None)
+        sections = []
+        for row in rows[1:]:
+            for name, grade, cell in zip(header, column_grades, row):
+                if not cell:
+                    continue
+                label = f"{grade}.{code.group(1)}.{code.group(2)} ({name})" if code else name
+                sections.append(DocSection(
+                    list(headings), "\n".join([label] + cell), [grade], True, {"grade": name},
+                ))
+        return sections
+
+    if len(rows) > 1 and len(header) > 2 and column_grades[0] is None and all(column_grades[1:]):
+        sections = []
+        for row in rows[1:]:
+            skill = " ".join(row[0]) if row else ""
+            if not skill:
+                continue
+            levels = {grade: " ".join(cell) for grade, cell in zip(column_grades[1:], row[1:])}
+            taught = [g for g, level in levels.items() if level in ("A", "G")]
+            lines = [skill]
+            if taught:
+                lines.append("Taught in grades: " + ", ".join(taught))
+            sections.append(DocSection(
+                list(headings) + [header[0]], "\n".join(lines), taught or list(context), True,
+                {"skill": skill, "levels": levels},
+            ))
+        return sections
+
+    if len(header) == 1:
+        title = header[0]
+        sections = []
+        # The standard is often also the heading right above its table
+        if not headings or headings[-1] != title:
+            sections.append(DocSection(list(headings), "\n".join(rows[0][0]), list(context), True))
+            headings = list(headings) + [title]
+        for row in rows[1:]:
+            text = "\n".join(p for cell in row for p in cell)
+            sections.append(DocSection(list(headings), text, list(context), True))
+        return sections
+
+    if len(rows) == 1:
+        return [DocSection(list(headings), " | ".join(header), list(context), True)]
+    sections = []
+    for row in rows[1:]:
+        values = [" ".join(cell) for cell in row]
+        columns = {h: v for h, v in zip(header, values) if h and v}
+        text = "\n".join(f"{h}: {v}" for h, v in columns.items()) or " | ".join(values)
+        # A first column like 'Grades 2-3' scopes the row
+        row_grades = grades_from_heading(values[0]) if values else []
+        sections.append(DocSection(list(headings), text, row_grades or list(context), True, columns))
+    return sections
+
+
+def _is_title(text: str) -> bool:
+    """
+    Short, not a sentence and not a table-of-contents line:
+    'See Kindergarten through grade five ...' is a cross-reference and
+    '2024 Grade 3 ......32' only points at the grade title.
+    """
+    return (
+        len(text) <= TITLE_MAX_LENGTH
+        and not text.rstrip().endswith(".")
+        and not TOC_LEADER.search(text)
+    )
+
+
+def _heading_level(paragraph) -> Optional[int]:
+    style = paragraph.find(f"{W_NS}pPr/{W_NS}pStyle")
+    if style is None:
+        return None
+    match = HEADING_STYLE.match(style.get(W_NS + "val", ""))
+    if not match:
+        return None
+    return int(match.group(1) or 0)
+
+
+def read_docx_sections(path: str) -> List[DocSection]:
+    """
+    Splits a .docx into sections at Heading/Title paragraphs, keeping the
+    heading path, with one section per table row (table_row_sections) in
+    document order.
+
+    Sections also carry the grade context they appear in. It is set by a
+    heading or short title paragraph that names grades ("... 2024 Grade 3"),
+    or by a paragraph that starts with a grade-qualified SOL code, and lasts
+    until the next such signal or a top-level heading naming no grade. The
+    combined SOL document puts several grade titles in plain paragraphs at
+    the same level as strand headings, so nesting alone is not enough.
+    """
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    body = root.find(W_NS + "body")
+
+    sections: List[DocSection] = []
+    stack: List[tuple] = []  # (level, heading text)
+    buffer: List[str] = []
+    context: List[str] = []
+
+    def flush():
+        text = "\n".join(buffer).strip()
+        buffer.clear()
+        if text:
+            sections.append(DocSection([h for _, h in stack], text, list(context)))
+
+    def set_context(grades: List[str]):
+        nonlocal context
+        if grades != context:
+            flush()
+            context = grades
+
+    for element in body:
+        if element.tag == W_NS + "p":
+            text = _paragraph_text(element)
+            if not text:
+                continue
+            level = _heading_level(element)
+            if level is None:
+                named = grades_from_heading(text) if _is_title(text) else []
+                leading = SOL_CODE.match(text)
+                if named:
+                    set_context(named)
+                elif leading:
+                    set_context([leading.group(1)])
+                buffer.append(text)
+                continue
+            flush()
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, text))
+            named = grades_from_heading(text) if _is_title(text) else []
+            leading = SOL_CODE.match(text)
+            if named:
+                set_context(named)
+            elif leading:
+                set_context([leading.group(1)])
+            elif level <= 1:
+                set_context([])
+        elif element.tag == W_NS + "tbl":
+            flush()
+            sections.extend(table_row_sections(element, [h for _, h in stack], context))
+    flush()
+    return sections
+
+
+def extract_metadata(
+    file_name: str,
+    text: str,
+    headings: Sequence[str] = (),
+    heading_grades: Sequence[str] = (),
+    file_grades: Optional[Sequence[str]] = None,
+) -> dict:
+    """
+    Metadata for one chunk. Grades come from the most specific source
+    available: the section's grade context (narrowed by SOL codes in the
+    chunk), else SOL codes alone, else the file's grade band.
+    """
+    context = "\n".join(list(headings) + [text])
+    standards = standards_in_text(context)
+
+    code_grades = sort_grades(code.split(".")[0] for code in standards)
+    if heading_grades:
+        # Codes narrow the grade context but never widen it: "see 2.FFR.3"
+        # inside a grade 3 section is a cross-reference, not grade 2 content.
+        grades = [g for g in code_grades if g in heading_grades] or sort_grades(heading_grades)
+    elif code_grades:
+        grades = code_grades
+    else:
+        grades = list(file_grades if file_grades is not None else grades_from_filename(file_name))
+
+    # Strand: from the first SOL code, a strand-only code, or a heading naming the strand
+    strand, number = None, None
+    if standards:
+        parts = standards[0].split(".")
+        strand = parts[1]
+        number = int(parts[2]) if len(parts) > 2 else None
+    else:
+        code = STRAND_CODE.search(context)
+        if code:
+            strand, number = code.group(1), int(code.group(2))
+        else:
+            strand, number = progression_standard(file_name, headings)
+            for heading in reversed(list(headings)):
+                if strand:
+                    break
+                strand = STRAND_BY_NAME.get(heading.strip().lower())
+
+    meta = {
+        "file_name": file_name,
+        "grades": grades,
+        "standards": standards,
+    }
+    if len(grades) == 1:
+        meta["grade"] = grades[0]
+    if headings:
+        meta["section"] = " > ".join(headings)
+    if strand:
+        meta["strand"] = strand
+        meta["strand_name"] = STRANDS[strand]
+        if number is not None:
+            # Grade-independent standard id: links 3.W.1, 4.W.1 and the Writing chart's W.1 rows
+            meta["standard_id"] = f"{strand}.{number}"
+    stages = stages_for(strand, number)
+    if stages:
+        meta["stages"] = stages
+    return meta
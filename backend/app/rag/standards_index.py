@@ -0,0 +1,87 @@
+"""
+Exact-match index of SOL codes over the in-memory corpus.
+
+Ingest tags every chunk with the grade-qualified codes it mentions
+(metadata.standards, e.g. ['3.W.2']; the first is the standard it states),
+its strand and its grades (app/rag/sol_metadata.py). This index maps those
+tags back to rows so a known standard, or every standard of a strand in a
+grade, is a dict lookup rather than a vector search. Only rows stating a
+code in its own grade are indexed under it, and rows are kept in a stable
+order, so lookups do not change with row ids between corpus versions. It
+also maps chunk text back to its row, which is how retrieved strings
+recover their metadata (source file, grades).
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.rag.sol_metadata import chunk_grades, split_code
+
+
+def stable_key(content: str, meta: dict) -> tuple:
+    """Corpus-independent row order: source file, section, then text (row ids are random UUIDs)."""
+    return (meta.get("file_name") or "", meta.get("section") or "", content)
+
+
+def states_code(meta: dict, code: str) -> bool:
+    """A row states a code when it is the row's first code and the row belongs to the code's grade."""
+    standards = meta.get("standards") or []
+    return bool(standards) and standards[0] == code and split_code(code)[0] in chunk_grades(meta)
+
+
+def round_robin(rankings: Sequence[Sequence], limit: Optional[int] = None) -> list:
+    """Takes one item from each ranking in turn, without duplicates, at most `limit` of them."""
+    results, seen = [], set()
+    for depth in range(max((len(r) for r in rankings), default=0)):
+        for ranking in rankings:
+            if depth >= len(ranking) or ranking[depth] in seen:
+                continue
+            seen.add(ranking[depth])
+            results.append(ranking[depth])
+            if limit is not None and len(results) >= limit:
+                return results
+    return results
+
+
+class SOLCodeIndex:
+    """code -> rows, (grade, strand) -> rows and content -> row, in stable_key order."""
+
+    def __init__(self, contents: Sequence[str], metadata: Sequence[dict]):
+        self._by_code: Dict[str, List[int]] = {}
+        self._by_strand: Dict[Tuple[str, str], List[int]] = {}
+        self._by_content: Dict[str, int] = {}
+        order = sorted(range(len(metadata)), key=lambda row: stable_key(contents[row], metadata[row]))
+        for row in order:
+            meta = metadata[row]
+            standards = meta.get("standards") or []
+            # Later codes in a row are cross-references, so only the first one indexes it
+            if standards and states_code(meta, standards[0]):
+                self._by_code.setdefault(standards[0], []).append(row)
+            strand = meta.get("strand")
+            if strand:
+                for grade in chunk_grades(meta):
+                    self._by_strand.setdefault((grade, strand), []).append(row)
+        for row, content in enumerate(contents):
+            self._by_content.setdefault(content, row)
+
+    def __len__(self) -> int:
+        return len(self._by_code)
+
+    def codes(self) -> List[str]:
+        return list(self._by_code)
+
+    def rows_for_code(self, code: str) -> List[int]:
+        """
+        Rows of the code's grade stating a standard ('3.W.2'). A strand code
+        ('3.LU') returns every row of that strand in that grade.
+        """
+        grade, strand, number = split_code(code)
+        if number is None:
+            return self.rows_for_strand(grade, strand)
+        return list(self._by_code.get(code, []))
+
+    def rows_for_strand(self, grade: str, strand: Optional[str]) -> List[int]:
+        if not strand:
+            return []
+        return list(self._by_strand.get((str(grade), strand), []))
+
+    def row_for_content(self, content: str) -> Optional[int]:
+        return self._by_content.get(content)
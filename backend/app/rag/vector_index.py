@@ -0,0 +1,486 @@
+"""
+In-process vector index over the sol_standards corpus.
+
+Supabase stays the source of truth. Each worker pulls the corpus once into a
+contiguous float32 matrix (rows L2-normalised, so cosine similarity is a single
+matrix-vector product) and answers match_sol_standards-style queries locally.
+Grade filtering uses per-grade row partitions computed at load time, and the
+index is rebuilt from the active snapshot whenever the corpus version changes.
+A BM25 index over the same rows backs hybrid (lexical + vector) search, and
+an SOL code index (app/rag/standards_index.py) answers exact lookups by code
+and a progression graph (app/rag/progression.py) links a standard across grades.
+With SOL_SNAPSHOT_PATH set, a worker cold-starts by memory-mapping a corpus
+snapshot file instead of paging the table through PostgREST.
+
+With SOL_SEARCH_MODE=binary the grade partitions hold 48-byte sign-bit codes
+instead of float32 copies of their rows: candidates are found by Hamming
+distance and re-ranked by exact cosine similarity on the float rows.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, get_args
+
+import numpy as np
+
+from app.core.config import SearchMode, get_settings
+from app.core.database import get_supabase_client
+from app.rag.bm25 import BM25Index, reciprocal_rank_fusion
+from app.rag.corpus_snapshot import CorpusSnapshot
+from app.rag.corpus_version import acurrent_corpus_version, current_corpus_version, is_snapshot_version
+from app.rag.progression import ProgressionGraph
+from app.rag.sol_metadata import chunk_grades
+from app.rag.standards_index import SOLCodeIndex, round_robin
+
+# PostgREST caps a single select at 1000 rows by default
+PAGE_SIZE = 1000
+
+# Search modes shared with match_sol_standards (migrations/08_sol_standards_quantized_search.sql).
+# The local index only quantizes for "binary"; "halfvec" scans exactly here.
+SEARCH_MODES = get_args(SearchMode)
+
+# Set bits per byte value, for Hamming distances over packed sign bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def parse_embedding(value) -> List[float]:
+    """pgvector columns come back from PostgREST as '[0.1,0.2,...]' strings."""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def binary_codes(matrix: np.ndarray) -> np.ndarray:
+    """Sign-bit codes of the rows (pgvector binary_quantize), packed 8 dims per byte."""
+    return np.packbits(matrix > 0, axis=-1)
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    return _POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=1, dtype=np.int32)
+
+
+def maximal_marginal_relevance(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7,
+) -> List[int]:
+    """
+    Greedy MMR selection over a candidate pool.
+
+    relevance[i] scores candidate i against the query and vectors[i] is its
+    normalised embedding. Each step picks the candidate maximising
+    lambda * relevance - (1 - lambda) * max similarity to anything already
+    picked. Returns positions into the pool, in selection order.
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    first = int(np.argmax(relevance))
+    selected = [first]
+    redundancy = vectors @ vectors[first]
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        nxt = int(np.argmax(scores))
+        selected.append(nxt)
+        redundancy = np.maximum(redundancy, vectors @ vectors[nxt])
+    return selected
+
+
+class SOLVectorIndex:
+    """Immutable snapshot of sol_standards held in memory."""
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        contents: Sequence[str],
+        metadata: Sequence[dict],
+        embeddings: np.ndarray,
+        normalized: bool = False,
+        search_mode: str = "exact",
+        rescore_factor: int = 10,
+    ):
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {search_mode!r}; expected one of {SEARCH_MODES}")
+        self.ids = ids
+        self.contents = contents
+        self.metadata = metadata
+        self.version: Optional[str] = None
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        # Already-normalised float32 input (a mapped snapshot) is used without a copy
+        self.matrix = np.ascontiguousarray(matrix if normalized else _normalize_rows(matrix))
+        self.binary = search_mode == "binary"
+        self.rescore_factor = max(1, rescore_factor)
+        # What the coarse scan reads: the float rows, or their sign-bit codes
+        self._scan_data = binary_codes(self.matrix) if self.binary else self.matrix
+
+        # Precompute grade partitions: grade -> (row ids, contiguous slice of the scan data).
+        # A chunk covering a grade band sits in every partition of the band.
+        grade_rows: Dict[str, List[int]] = {}
+        for row, meta in enumerate(metadata):
+            for grade in chunk_grades(meta):
+                grade_rows.setdefault(grade, []).append(row)
+        self._partitions: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for grade, row_list in grade_rows.items():
+            rows = np.asarray(row_list, dtype=np.int64)
+            self._partitions[grade] = (rows, np.ascontiguousarray(self._scan_data[rows]))
+
+        self._bm25: Optional[BM25Index] = None
+        self._lazy_lock = threading.Lock()
+        self._codes: Optional[SOLCodeIndex] = None
+        self._progression: Optional[ProgressionGraph] = None
+
+    @property
+    def bm25(self) -> BM25Index:
+        """Built on first hybrid search, so plain vector search cold-starts without tokenising the corpus."""
+        if self._bm25 is None:
+            with self._lazy_lock:
+                if self._bm25 is None:
+                    self._bm25 = BM25Index(self.contents)
+        return self._bm25
+
+    @property
+    def codes(self) -> SOLCodeIndex:
+        """Built on first exact lookup, like bm25."""
+        if self._codes is None:
+            with self._lazy_lock:
+                if self._codes is None:
+                    self._codes = SOLCodeIndex(self.contents, self.metadata)
+        return self._codes
+
+    @property
+    def progression(self) -> ProgressionGraph:
+        if self._progression is None:
+            with self._lazy_lock:
+                if self._progression is None:
+                    self._progression = ProgressionGraph(self.contents, self.metadata)
+        return self._progression
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def _candidates(self, grade_level: Optional[str]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """Returns (row ids or None for all rows, scan data: float rows or sign-bit codes)."""
+        if not grade_level:
+            return None, self._scan_data
+        partition = self._partitions.get(str(grade_level))
+        if partition is None:
+            return np.empty(0, dtype=np.int64), self._scan_data[:0]
+        return partition
+
+    def _scan(
+        self, grade_level: Optional[str], query: np.ndarray, k: int, threshold: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Global row ids of the k most similar rows above threshold, best
+        first, with their exact cosine similarities. In binary mode the
+        k * rescore_factor nearest codes by Hamming distance are rescored.
+        """
+        rows, data = self._candidates(grade_level)
+        if data.shape[0] == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if not self.binary:
+            similarities = data @ query
+            local = self._top_k(similarities, k, threshold)
+            return (rows[local] if rows is not None else local), similarities[local]
+
+        distances = hamming_distances(data, binary_codes(query))
+        pool_size = min(k * self.rescore_factor, len(distances))
+        local = np.argpartition(distances, pool_size - 1)[:pool_size]
+        candidates = rows[local] if rows is not None else local
+        similarities = self.matrix[candidates] @ query
+        best = self._top_k(similarities, k, threshold)
+        return candidates[best], similarities[best]
+
+    @staticmethod
+    def _normalize_query(query_embedding) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else query
+
+    @staticmethod
+    def _top_k(similarities: np.ndarray, k: int, threshold: float) -> np.ndarray:
+        """Local positions of the k best similarities above threshold, best first."""
+        passing = np.flatnonzero(similarities > threshold)
+        if passing.size > k:
+            top = np.argpartition(similarities[passing], -k)[-k:]
+            passing = passing[top]
+        return passing[np.argsort(-similarities[passing])]
+
+    def _row(self, row: int, similarity: float) -> dict:
+        return {
+            "id": self.ids[row],
+            "content": self.contents[row],
+            "metadata": self.metadata[row],
+            "similarity": similarity,
+        }
+
+    def search(
+        self,
+        query_embedding,
+        grade_level: Optional[str] = None,
+        match_count: int = 5,
+        match_threshold: float = 0.5,
+        mmr_lambda: Optional[float] = None,
+    ) -> List[dict]:
+        """
+        Top-k cosine search with the same semantics as the match_sol_standards RPC.
+
+        With mmr_lambda set, a larger pool is fetched and k non-redundant rows
+        are picked from it by maximal marginal relevance.
+
+        Returns rows shaped like the RPC response: id, content, metadata, similarity.
+        """
+        if match_count <= 0:
+            return []
+        query = self._normalize_query(query_embedding)
+        if mmr_lambda is None:
+            picked, similarities = self._scan(grade_level, query, match_count, match_threshold)
+        else:
+            pool, pool_similarities = self._scan(grade_level, query, max(match_count * 4, 20), match_threshold)
+            chosen = maximal_marginal_relevance(pool_similarities, self.matrix[pool], match_count, mmr_lambda)
+            picked, similarities = pool[chosen], pool_similarities[chosen]
+
+        return [self._row(int(row), float(sim)) for row, sim in zip(picked, similarities)]
+
+    def hybrid_search(
+        self,
+        query: str,
+        query_embedding,
+        grade_level: Optional[str] = None,
+        match_count: int = 5,
+        match_threshold: float = 0.5,
+        rrf_k: int = 60,
+        mmr_lambda: Optional[float] = None,
+    ) -> List[dict]:
+        """
+        Vector + BM25 search fused by reciprocal rank.
+
+        Vector candidates still respect match_threshold; lexical candidates do
+        not, which is what rescues keyword queries that embed poorly. With
+        mmr_lambda set, the fused pool is diversified by MMR using the fused
+        score as relevance.
+        """
+        rows, data = self._candidates(grade_level)
+        if data.shape[0] == 0 or match_count <= 0:
+            return []
+
+        candidate_k = max(match_count * 4, 20)
+        query_vector = self._normalize_query(query_embedding)
+        vector_ranking, _ = self._scan(grade_level, query_vector, candidate_k, match_threshold)
+        lexical_ranking = [row for row, _ in self.bm25.search(query, candidate_k, rows=rows)]
+
+        fused = reciprocal_rank_fusion(
+            [[int(r) for r in vector_ranking], lexical_ranking], k=rrf_k
+        )
+        if mmr_lambda is None or len(fused) <= match_count:
+            fused = fused[:match_count]
+        else:
+            fused = fused[:candidate_k]
+            relevance = np.array([score for _, score in fused], dtype=np.float32)
+            relevance /= relevance.max()
+            pool_vectors = self.matrix[[row for row, _ in fused]]
+            chosen = maximal_marginal_relevance(relevance, pool_vectors, match_count, mmr_lambda)
+            fused = [fused[i] for i in chosen]
+
+        results = []
+        for row, score in fused:
+            result = self._row(row, float(self.matrix[row] @ query_vector))
+            result["rrf_score"] = score
+            results.append(result)
+        return results
+
+    def lookup(self, codes: Sequence[str], match_count: Optional[int] = None) -> List[dict]:
+        """
+        Rows for SOL codes ('3.W.2', or '3.LU' for a whole strand), taken
+        from each code in turn so match_count covers every code, without
+        duplicates. Shaped like search() results with similarity 1.0.
+        """
+        rows = round_robin([self.codes.rows_for_code(code) for code in codes], match_count)
+        return [self._row(row, 1.0) for row in rows]
+
+    def progression_rows(
+        self,
+        skills: Sequence[str],
+        grade_level: str,
+        match_count: int,
+        exclude: Sequence[str] = (),
+        radius: int = 1,
+    ) -> List[dict]:
+        """Same-skill rows from the grade and its neighbours (ProgressionGraph.expand), minus `exclude` texts."""
+        excluded = set(exclude)
+        results = []
+        for row in self.progression.expand(skills, grade_level, radius):
+            if self.contents[row] in excluded:
+                continue
+            results.append(self._row(row, 1.0))
+            if len(results) >= match_count:
+                break
+        return results
+
+    def metadata_for(self, content: str) -> Optional[dict]:
+        """Metadata of the chunk with exactly this text, if it is in the corpus."""
+        row = self.codes.row_for_content(content)
+        return self.metadata[row] if row is not None else None
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Bytes held by the float rows and by the structure the coarse scan reads (partitions included)."""
+        partitions = sum(data.nbytes for _, data in self._partitions.values())
+        scan = partitions + (self._scan_data.nbytes if self.binary else 0)
+        return {"vectors": self.matrix.nbytes, "scan": scan}
+
+    @classmethod
+    def from_rows(cls, rows: List[dict], **options) -> "SOLVectorIndex":
+        rows = [r for r in rows if r.get("embedding") is not None]
+        if rows:
+            embeddings = np.array([parse_embedding(r["embedding"]) for r in rows], dtype=np.float32)
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        return cls(
+            ids=[str(r["id"]) for r in rows],
+            contents=[r["content"] for r in rows],
+            metadata=[r.get("metadata") or {} for r in rows],
+            embeddings=embeddings,
+            **options,
+        )
+
+    @classmethod
+    def from_snapshot(cls, path: str, **options) -> "SOLVectorIndex":
+        """
+        Memory-maps a snapshot written by app/rag/corpus_snapshot.py; strings
+        decode lazily. In binary mode only the rows being rescored are paged in.
+        """
+        snapshot = CorpusSnapshot(path)
+        index = cls(
+            ids=snapshot.ids,
+            contents=snapshot.contents,
+            metadata=snapshot.metadata,
+            embeddings=snapshot.embeddings,
+            normalized=True,
+            **options,
+        )
+        index.version = snapshot.version
+        return index
+
+
+def fetch_corpus(client, version: Optional[str] = None, with_hashes: bool = False) -> List[dict]:
+    """Pages through sol_standards and returns every row of the given corpus snapshot."""
+    columns = "id, content, metadata, embedding" + (", chunk_hash" if with_hashes else "")
+    rows: List[dict] = []
+    start = 0
+    while True:
+        query = client.table("sol_standards").select(columns)
+        if is_snapshot_version(version):
+            query = query.eq("corpus_version", version)
+        response = query\
+            .order("id")\
+            .range(start, start + PAGE_SIZE - 1)\
+            .execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def _index_options() -> dict:
+    settings = get_settings()
+    return {"search_mode": settings.SOL_SEARCH_MODE, "rescore_factor": settings.SOL_RESCORE_FACTOR}
+
+
+def _load_snapshot(path: str) -> Optional[SOLVectorIndex]:
+    if not os.path.exists(path):
+        return None
+    try:
+        started = time.perf_counter()
+        index = SOLVectorIndex.from_snapshot(path, **_index_options())
+        print(f"[RAG_INDEX] Mapped {len(index)} SOL chunks (version {index.version}) from {path} "
+              f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+        return index
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[RAG_INDEX] Ignoring unreadable corpus snapshot {path}: {e}")
+        return None
+
+
+class _IndexHolder:
+    """Per-worker singleton that loads the index lazily and reloads it when the corpus version changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.index: Optional[SOLVectorIndex] = None
+        self.retry_at = 0.0
+
+    def get(self) -> Optional[SOLVectorIndex]:
+        settings = get_settings()
+        if not settings.SOL_INDEX_ENABLED:
+            return None
+
+        version = current_corpus_version()
+        with self._lock:
+            if self.index is None and settings.SOL_SNAPSHOT_PATH:
+                self.index = _load_snapshot(settings.SOL_SNAPSHOT_PATH)
+            # No reachable database (version None): serve the snapshot as is
+            if self.index is not None and (self.index.version == version or version is None):
+                return self.index
+            if time.monotonic() < self.retry_at:
+                return self.index
+            try:
+                started = time.perf_counter()
+                rows = fetch_corpus(get_supabase_client(), version)
+                index = SOLVectorIndex.from_rows(rows, **_index_options())
+                index.version = version
+                self.index = index
+                print(f"[RAG_INDEX] Loaded {len(index)} SOL chunks (version {version}) "
+                      f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+            except Exception as e:
+                # Keep serving the previous snapshot (if any); callers fall back to the RPC otherwise.
+                print(f"[RAG_INDEX] Error refreshing SOL index: {e}")
+                self.retry_at = time.monotonic() + settings.SOL_INDEX_REFRESH_SECONDS
+            return self.index
+
+    def peek(self, version: Optional[str]) -> Optional[SOLVectorIndex]:
+        """Returns the loaded index without I/O if it matches the given corpus version."""
+        if self.index is not None and self.index.version == version:
+            return self.index
+        return None
+
+    def invalidate(self):
+        with self._lock:
+            self.index = None
+            self.retry_at = 0.0
+
+
+_holder = _IndexHolder()
+
+
+def get_vector_index() -> Optional[SOLVectorIndex]:
+    """Returns the worker's SOL index, loading or refreshing it if needed. None if disabled/unavailable."""
+    return _holder.get()
+
+
+async def aget_vector_index() -> Optional[SOLVectorIndex]:
+    """Async variant of get_vector_index; (re)loading the corpus happens off the event loop."""
+    if not get_settings().SOL_INDEX_ENABLED:
+        return None
+    index = _holder.peek(await acurrent_corpus_version())
+    if index is not None:
+        return index
+    return await asyncio.to_thread(_holder.get)
+
+
+def invalidate_vector_index():
+    """Drops the in-memory index so the next query reloads it from Supabase."""
+    _holder.invalidate()
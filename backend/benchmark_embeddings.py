@@ -0,0 +1,99 @@
+"""
+Parity and throughput check for the embedding backends.
+
+Compares the onnx / onnx-int8 backends against the torch (sentence-transformers)
+reference on SOL-style text: per-text cosine agreement of the vectors, whether
+nearest neighbours are preserved, and texts/sec at a few batch sizes.
+
+Usage:
+    python benchmark_embeddings.py [--backends torch onnx onnx-int8] [--runs 3]
+"""
+import argparse
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.rag.embeddings import EMBEDDING_BACKENDS, load_embedding_backend
+from app.rag.queries import GRADES, STAGES, stage_query, synonym_query
+
+SAMPLE_STANDARDS = [
+    "3.W.1 The student will write in a variety of forms to include narrative, descriptive, opinion, and expository.",
+    "Use transition words and phrases to signal event order and connect ideas within and between paragraphs.",
+    "Edit writing for capitalization, punctuation, spelling, and Standard English.",
+    "Use a combination of drawing, dictating, and writing to compose narrative stories in sequential order.",
+    "Revise writing for clarity of content using specific vocabulary and information.",
+    "Organize writing to include a beginning, middle, and end for narrative and expository writing.",
+    "Brainstorm and plan ideas using graphic organizers before drafting.",
+    "Write simple and compound sentences; use complete sentences with subject-verb agreement.",
+]
+
+
+def sample_texts():
+    texts = list(SAMPLE_STANDARDS)
+    for grade in GRADES:
+        for stage in STAGES:
+            texts.append(stage_query(stage, grade))
+            texts.append(synonym_query(stage, grade))
+    return texts
+
+
+def throughput(model, texts, batch_size, runs):
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    model.embed_documents(batches[0])  # warm-up
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        for batch in batches:
+            model.embed_documents(batch)
+        best = min(best, time.perf_counter() - started)
+    return len(texts) / best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = sample_texts()
+    print(f"Embedding {len(texts)} texts with backends: {', '.join(args.backends)}")
+
+    vectors = {}
+    models = {}
+    for backend in args.backends:
+        started = time.perf_counter()
+        models[backend] = load_embedding_backend(backend)
+        print(f"  {backend}: loaded in {time.perf_counter() - started:.1f}s")
+        vectors[backend] = np.asarray(models[backend].embed_documents(texts), dtype=np.float32)
+
+    reference = "torch" if "torch" in vectors else args.backends[0]
+    ref = vectors[reference]
+    ref_neighbours = np.argsort(-(ref @ ref.T), axis=1)[:, 1:6]
+
+    print(f"\n--- Parity vs {reference} ---")
+    for backend, vecs in vectors.items():
+        if backend == reference:
+            continue
+        assert vecs.shape == ref.shape, f"{backend} produced {vecs.shape}, expected {ref.shape}"
+        cosines = np.sum(vecs * ref, axis=1) / (
+            np.linalg.norm(vecs, axis=1) * np.linalg.norm(ref, axis=1)
+        )
+        neighbours = np.argsort(-(vecs @ vecs.T), axis=1)[:, 1:6]
+        overlap = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(neighbours, ref_neighbours)])
+        print(f"  {backend:10s} cosine mean={cosines.mean():.5f} min={cosines.min():.5f} "
+              f"top-5 neighbour overlap={overlap:.3f}")
+
+    print("\n--- Throughput (texts/sec, best of runs) ---")
+    for batch_size in (1, 8, 32):
+        row = "  ".join(
+            f"{backend}={throughput(models[backend], texts, batch_size, args.runs):8.1f}"
+            for backend in args.backends
+        )
+        print(f"  batch={batch_size:<3d} {row}")
+
+
+if __name__ == "__main__":
+    main()
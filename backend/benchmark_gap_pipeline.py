@@ -0,0 +1,131 @@
+"""
+Latency and agreement of the fused gap analysis mode against the multi-step pipeline.
+
+For each sample (grade, stage, student writing) the expectations are
+extracted once (step 2, as the catalog would serve them). Steps 3-5 then
+run --runs times in each mode: "multistep" (evidence + ranking calls) and
+"fused" (one call). Reported per mode: p50/p95 latency and LLM calls per
+turn. Agreement with multistep:
+
+- domains   Jaccard overlap of the gap skill domains
+- top-1     same highest-priority skill domain
+- severity  same severity for skill domains both modes flagged
+
+The model runs at temperature 0.7, so multistep is also compared with a
+second multistep run ("multistep again") as the baseline agreement.
+
+Usage (needs GROQ_API_KEY):
+    python benchmark_gap_pipeline.py --runs 5
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.agents.gap_analysis import extract_expectations, fused_gaps, multistep_gaps
+from app.core.llm import get_llm
+
+SAMPLE_STANDARDS = {
+    "drafting": [
+        "3.W.1 The student will write in a variety of forms to include narrative, descriptive, opinion, and expository.",
+        "Organize writing to include a beginning, middle, and end for narrative and expository writing.",
+        "Use transition words and phrases to signal event order and connect ideas within and between paragraphs.",
+    ],
+    "revising": [
+        "Revise writing for clarity of content using specific vocabulary and information.",
+        "Elaborate on ideas with details, examples and descriptive words.",
+    ],
+    "editing": [
+        "Edit writing for capitalization, punctuation, spelling, and Standard English.",
+        "Write simple and compound sentences; use complete sentences with subject-verb agreement.",
+    ],
+}
+
+SAMPLES = [
+    ("3", "drafting", "My dog is named Max. He is big and brown. We go to the park. Max runs fast. "
+                      "Then we go home and he sleeps. I love Max."),
+    ("3", "revising", "Last summer we went to the beach. It was fun. We swam and played. "
+                      "Of course my brother found a crab. Later that day we ate pizza on a picnic blanket."),
+    ("3", "editing", "on saturday me and my freind went to the store we buyed candy and chips. "
+                     "it was realy fun and we walkt home"),
+    ("4", "drafting", "The bright yellow bus stopped at the big factory. Everyone got out. "
+                      "We saw machines that made cereal. The tour guide was hard working and explained everything."),
+]
+
+
+class CallCounter(BaseCallbackHandler):
+    """Counts chat model calls made through the shared LLM instance."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def on_chat_model_start(self, *args, **kwargs):
+        self.calls += 1
+
+
+def agreement(reference, gaps):
+    domains = {g.skill_domain.lower() for g in gaps}
+    ref_domains = {g.skill_domain.lower() for g in reference}
+    union = domains | ref_domains
+    jaccard = len(domains & ref_domains) / len(union) if union else 1.0
+    top1 = float(bool(gaps) and bool(reference) and gaps[0].skill_domain.lower() == reference[0].skill_domain.lower())
+    ref_severity = {g.skill_domain.lower(): g.severity for g in reference}
+    shared = [g for g in gaps if g.skill_domain.lower() in ref_severity]
+    severity = np.mean([g.severity == ref_severity[g.skill_domain.lower()] for g in shared]) if shared else float("nan")
+    return jaccard, top1, severity
+
+
+async def timed(counter, pipeline, *args):
+    calls = counter.calls
+    started = time.perf_counter()
+    gaps = await pipeline(*args)
+    return gaps, (time.perf_counter() - started) * 1000, counter.calls - calls
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions of each sample per mode")
+    args = parser.parse_args()
+
+    counter = CallCounter()
+    get_llm().callbacks = [counter]
+    latency = {"multistep": [], "fused": []}
+    calls = {"multistep": [], "fused": []}
+    scores = {"fused": [], "multistep again": []}
+
+    for grade_level, stage, text in SAMPLES:
+        standards = SAMPLE_STANDARDS[stage]
+        expectations = await extract_expectations("\n\n".join(standards), grade_level, stage, standards=standards)
+        print(f"Grade {grade_level} {stage}: {len(expectations)} expectations")
+        for _ in range(args.runs):
+            reference, ms, n = await timed(counter, multistep_gaps, text, grade_level, stage, expectations)
+            latency["multistep"].append(ms)
+            calls["multistep"].append(n)
+            again, _, _ = await timed(counter, multistep_gaps, text, grade_level, stage, expectations)
+            scores["multistep again"].append(agreement(reference, again))
+
+            gaps, ms, n = await timed(counter, fused_gaps, text, grade_level, stage, expectations)
+            latency["fused"].append(ms)
+            calls["fused"].append(n)
+            scores["fused"].append(agreement(reference, gaps))
+
+    print(f"\n{len(SAMPLES)} samples x {args.runs} runs, steps 3-5 only")
+    print(f"{'mode':<16} {'p50':>9} {'p95':>9} {'LLM calls':>10}")
+    for mode in ("multistep", "fused"):
+        print(f"{mode:<16} {np.percentile(latency[mode], 50):>7.0f}ms {np.percentile(latency[mode], 95):>7.0f}ms "
+              f"{np.mean(calls[mode]):>10.2f}")
+
+    print(f"\nAgreement with multistep\n{'':<16} {'domains':>8} {'top-1':>8} {'severity':>9}")
+    for name, rows in scores.items():
+        jaccard, top1, severity = np.nanmean(np.array(rows, dtype=float), axis=0)
+        print(f"{name:<16} {jaccard:>8.2f} {top1:>8.2f} {severity:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
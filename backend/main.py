@@ -28,6 +28,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def warm_rag_caches():
+    """Precompute the grade x stage retrieval grid in the background."""
+    from app.core.config import get_settings
+    if not get_settings().RETRIEVAL_CACHE_WARM_ON_STARTUP:
+        return
+
+    import asyncio
+    from app.rag.retrieval import warm_retrieval_cache
+
+    async def _warm():
+        try:
+            await asyncio.to_thread(warm_retrieval_cache)
+        except Exception as e:
+            print(f"Retrieval cache warm-up failed: {e}")
+
+    app.state.rag_warmup = asyncio.create_task(_warm())
+
+@app.on_event("shutdown")
+async def close_database_pools():
+    from app.rag.pg_search import close_pg_search
+    await close_pg_search()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to PiWrite API"}
@@ -35,3 +58,13 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics/embeddings")
+def embedding_metrics():
+    """Batch-size distribution of the query embedding micro-batcher and embedding cache hit rate."""
+    from app.rag.embeddings import Embeddings
+    stats = Embeddings.get_batcher().stats()
+    cache = Embeddings.get_cache()
+    if cache is not None:
+        stats["cache"] = cache.stats()
+    return stats
@@ -0,0 +1,10 @@
+import os
+
+from dotenv import load_dotenv
+
+# Settings() requires these; unit tests never reach the services behind them.
+# Real values from the environment or backend/.env (e.g. for
+# test_prewriting_hallucination.py) take precedence over the placeholders.
+load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
+for name in ("SUPABASE_URL", "SUPABASE_KEY", "GROQ_API_KEY"):
+    os.environ.setdefault(name, "http://localhost" if name == "SUPABASE_URL" else "test")
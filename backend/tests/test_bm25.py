@@ -0,0 +1,77 @@
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+from app.rag.vector_index import SOLVectorIndex
+
+DOCUMENTS = [
+    "Edit writing for capitalization and punctuation.",
+    "Use punctuation punctuation punctuation correctly.",
+    "Organize ideas in a logical sequence with an introduction and a conclusion "
+    "that restates the main idea and supports it with reasons and examples.",
+    "Organize ideas in a logical sequence.",
+]
+
+
+def test_tokenize_keeps_sol_codes_and_drops_stopwords():
+    assert tokenize("The student will meet 3.W.1 and LU.2") == ["meet", "3.w.1", "lu.2"]
+
+
+def test_term_frequency_raises_the_score():
+    index = BM25Index(DOCUMENTS)
+    ranked = [doc for doc, _ in index.search("punctuation", 5)]
+    assert ranked == [1, 0]
+
+
+def test_shorter_documents_win_on_the_same_terms():
+    index = BM25Index(DOCUMENTS)
+    scores = index.scores("organize logical sequence")
+    assert scores[3] > scores[2] > 0
+    assert scores[0] == scores[1] == 0
+
+
+def test_unknown_terms_score_nothing():
+    index = BM25Index(DOCUMENTS)
+    assert not index.scores("zebra").any()
+    assert index.search("zebra", 5) == []
+    assert [doc for doc, _ in index.search("zebra capitalization", 5)] == [0]
+
+
+def test_search_is_limited_to_candidate_rows():
+    index = BM25Index(DOCUMENTS)
+    assert [doc for doc, _ in index.search("punctuation", 5, rows=np.array([0, 2]))] == [0]
+    assert len(index.search("organize punctuation", 2)) == 2
+
+
+def test_rrf_rewards_items_ranked_by_several_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [item for item, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == 1 / 61 + 1 / 62
+
+
+def test_rrf_ties_keep_first_seen_order():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "a"], ["x"]], k=60)
+    assert [item for item, _ in fused] == ["a", "b", "x"]
+    assert fused[0][1] == fused[1][1]
+
+
+def test_hybrid_search_respects_the_grade_filter():
+    contents = [
+        "Grade three punctuation: use commas in a series.",
+        "Grade five punctuation: use commas after introductory phrases.",
+        "Grade three spelling patterns.",
+    ]
+    metadata = [{"grades": ["3"]}, {"grades": ["5"]}, {"grades": ["3", "4"]}]
+    embeddings = np.array([[1.0, 0.0, 0.0], [0.9, 0.1, 0.0], [0.0, 1.0, 0.0]], dtype=np.float32)
+    index = SOLVectorIndex(ids=["g3", "g5", "g34"], contents=contents, metadata=metadata, embeddings=embeddings)
+
+    rows = index.hybrid_search("punctuation commas", [1.0, 0.0, 0.0], grade_level="5", match_threshold=0.0)
+    assert [r["id"] for r in rows] == ["g5"]
+    rows = index.hybrid_search("spelling", [1.0, 0.0, 0.0], grade_level="4", match_threshold=0.99)
+    # BM25 rescues the keyword match the vector threshold drops
+    assert [r["id"] for r in rows] == ["g34"]
+    assert index.hybrid_search("punctuation", [1.0, 0.0, 0.0], grade_level="K") == []
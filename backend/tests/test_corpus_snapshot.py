@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.corpus_snapshot import CorpusSnapshot, write_snapshot
+from app.rag.vector_index import SOLVectorIndex
+
+
+def _corpus():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(6, 8)).astype(np.float32)
+    metadata = [{"file_name": "g3.docx", "grades": ["3"]} if i % 2 else {"grades": ["4", "5"]} for i in range(6)]
+    contents = [f"chunk {i} – ünïcode" for i in range(6)]
+    return [str(i) for i in range(6)], contents, metadata, embeddings
+
+
+def test_snapshot_round_trip_matches_in_memory_index():
+    ids, contents, metadata, embeddings = _corpus()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sol.snap")
+        write_snapshot(path, ids, contents, metadata, embeddings, version="v1", chunk_hashes=["h"] * 6)
+
+        snapshot = CorpusSnapshot(path)
+        assert snapshot.version == "v1" and len(snapshot) == 6
+        assert snapshot.contents[5] == contents[5]
+        assert snapshot.metadata[:2] == metadata[:2]
+
+        mapped = SOLVectorIndex.from_snapshot(path)
+        loaded = SOLVectorIndex(ids, contents, metadata, embeddings)
+        query = embeddings[3].tolist()
+        for grade in (None, "3", "5"):
+            expected = [r["id"] for r in loaded.search(query, grade, 3, -1.0)]
+            assert [r["id"] for r in mapped.search(query, grade, 3, -1.0)] == expected
+
+
+def test_float16_snapshot_keeps_ranking():
+    ids, contents, metadata, embeddings = _corpus()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sol16.snap")
+        write_snapshot(path, ids, contents, metadata, embeddings, dtype="float16")
+        mapped = SOLVectorIndex.from_snapshot(path)
+        assert mapped.version is None
+        assert mapped.search(embeddings[2].tolist(), match_count=1, match_threshold=-1.0)[0]["id"] == "2"
+
+
+def test_binary_search_rescores_to_exact_ranking():
+    ids, contents, metadata, embeddings = _corpus()
+    exact = SOLVectorIndex(ids, contents, metadata, embeddings)
+    binary = SOLVectorIndex(ids, contents, metadata, embeddings, search_mode="binary", rescore_factor=10)
+    assert binary.memory_bytes()["scan"] < exact.memory_bytes()["scan"]
+    query = embeddings[1].tolist()
+    for grade in (None, "3"):
+        # rescore_factor * k covers the whole corpus, so rescoring must reproduce the exact results
+        assert binary.search(query, grade, 3, -1.0) == exact.search(query, grade, 3, -1.0)
@@ -0,0 +1,40 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.dedup import NearDuplicateIndex, chunk_source_hashes, merge_duplicate
+
+TEXT = (
+    "3.W.2 Organization and Composition. The student will write in a variety of forms, "
+    "including narrative, expository and opinion, and will organize ideas in a logical "
+    "sequence with an introduction, a body and a conclusion that fits the purpose."
+)
+
+
+def test_near_duplicates_map_to_first_chunk():
+    index = NearDuplicateIndex()
+    assert index.add("a", TEXT) is None
+    assert index.add("b", "Writing > " + TEXT + " Revise for clarity.") == "a"
+    assert index.add("c", "K.FFR.1 The student will demonstrate an understanding of print concepts.") is None
+    assert (index.seen, index.duplicates) == (3, 1)
+
+
+def test_merge_records_sources_and_grade_union():
+    canonical = {"file_name": "3-5 - Side By Side  - 2024.docx", "source_hash": "h1",
+                 "grades": ["3"], "grade": "3", "standards": ["3.W.2"]}
+    duplicate = {"file_name": "3_Understanding the Standards.docx", "source_hash": "h2",
+                 "grades": ["3", "4"], "standards": ["3.W.2", "4.W.2"]}
+    merge_duplicate(canonical, duplicate)
+
+    assert canonical["grades"] == ["3", "4"]
+    assert "grade" not in canonical
+    assert canonical["standards"] == ["3.W.2", "4.W.2"]
+    assert canonical["sources"] == {
+        "3-5 - Side By Side  - 2024.docx": ["3"],
+        "3_Understanding the Standards.docx": ["3", "4"],
+    }
+    assert chunk_source_hashes(canonical) == {
+        "3-5 - Side By Side  - 2024.docx": "h1",
+        "3_Understanding the Standards.docx": "h2",
+    }
@@ -0,0 +1,49 @@
+import asyncio
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.rag.embedding_batcher import EmbeddingBatcher
+
+
+def test_concurrent_requests_share_a_batch():
+    calls = []
+
+    def embed_batch(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    async def run():
+        batcher = EmbeddingBatcher(embed_batch, max_batch_size=8, max_wait_ms=20)
+        texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+        vectors = await asyncio.gather(*(batcher.embed(t) for t in texts))
+        return batcher, vectors
+
+    batcher, vectors = asyncio.run(run())
+
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert calls == [["a", "bb", "ccc", "dddd", "eeeee"]]
+    assert batcher.stats()["batch_size_histogram"] == {5: 1}
+
+
+def test_batches_are_capped_and_errors_reach_every_caller():
+    def embed_batch(texts):
+        if "boom" in texts:
+            raise RuntimeError("model failure")
+        return [[0.0] for _ in texts]
+
+    async def run():
+        batcher = EmbeddingBatcher(embed_batch, max_batch_size=2, max_wait_ms=20)
+        ok = await asyncio.gather(*(batcher.embed(t) for t in ["a", "b", "c"]))
+        failed = await asyncio.gather(batcher.embed("boom"), batcher.embed("x"), return_exceptions=True)
+        return batcher, ok, failed
+
+    batcher, ok, failed = asyncio.run(run())
+
+    assert ok == [[0.0], [0.0], [0.0]]
+    assert all(isinstance(f, RuntimeError) for f in failed)
+    stats = batcher.stats()
+    assert stats["batch_size_histogram"] == {1: 1, 2: 2}
+    assert stats["errors"] == 1
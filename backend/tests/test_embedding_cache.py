@@ -0,0 +1,76 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.rag import embeddings as embeddings_module
+from app.rag.embedding_cache import CachedEmbeddings, EmbeddingCache
+from app.rag.embeddings import Embeddings
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+
+def test_cached_texts_skip_inference(tmp_path):
+    model = CountingModel()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(str(tmp_path), "minilm-torch"))
+
+    first = embeddings.embed_documents(["alpha", "beta", "alpha"])
+    second = embeddings.embed_documents(["beta", "gamma"])
+
+    assert model.calls == [["alpha", "beta"], ["gamma"]]
+    assert first[0] == first[2] == [5.0, 1.0, 0.0]
+    assert second[0] == first[1]
+
+
+def test_cache_is_shared_through_disk(tmp_path):
+    writer = EmbeddingCache(str(tmp_path), "minilm-torch")
+    reader = EmbeddingCache(str(tmp_path), "minilm-torch")
+    other_backend = EmbeddingCache(str(tmp_path), "minilm-onnx")
+
+    assert reader.get_many(["text"]) == [None]
+    writer.put_many(["text"], [[0.5, 0.25]])
+
+    np.testing.assert_array_equal(reader.get_many(["text"])[0], [0.5, 0.25])
+    assert EmbeddingCache(str(tmp_path), "minilm-torch").get_many(["text"])[0] is not None
+    assert other_backend.get_many(["text"]) == [None]
+
+
+def test_unusable_cache_directory_disables_the_cache(monkeypatch, tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    settings = SimpleNamespace(
+        EMBEDDING_BACKEND="torch", EMBEDDING_CACHE_ENABLED=True, EMBEDDING_CACHE_DIR=str(blocker / "cache"),
+    )
+    model = CountingModel()
+    monkeypatch.setattr(embeddings_module, "get_settings", lambda: settings)
+    monkeypatch.setattr(embeddings_module, "load_embedding_backend", lambda backend: model)
+    for attr in ("_local_instance", "_cache"):
+        monkeypatch.setattr(Embeddings, attr, None)
+    monkeypatch.setattr(Embeddings, "_cache_failed", False)
+
+    assert Embeddings.get_local_embeddings().embed_documents(["alpha"]) == [[5.0, 1.0, 0.0]]
+    assert Embeddings.get_cache() is None
+    assert model.calls == [["alpha"]]
+
+
+def test_unreadable_cache_falls_back_to_the_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "minilm-torch")
+    model = CountingModel()
+
+    def broken(texts):
+        raise OSError("stale file handle")
+
+    cache.get_many = broken
+    assert CachedEmbeddings(model, cache).embed_documents(["alpha"]) == [[5.0, 1.0, 0.0]]
+    assert model.calls == [["alpha"]]
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.rag.embedding_batcher import EmbeddingBatcher
+from app.rag import embeddings as embeddings_module
+from app.rag.embedding_server import (
+    EmbeddingServerError, RemoteEmbeddings, _handle_client, decode_vectors, encode_vectors,
+)
+from app.rag.embeddings import Embeddings
+
+
+def toy_embed(texts):
+    if "boom" in texts:
+        raise RuntimeError("model failure")
+    return [[float(len(t)), 0.5, -1.0] for t in texts]
+
+
+class ToyModel:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[-1.0] for _ in texts]
+
+
+@pytest.fixture
+def server_socket():
+    """An embedding server on a temporary Unix socket, run on its own event loop thread."""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "embed.sock")
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    async def serve(stop: asyncio.Event):
+        batcher = EmbeddingBatcher(toy_embed, max_batch_size=8, max_wait_ms=5)
+        server = await asyncio.start_unix_server(lambda r, w: _handle_client(r, w, batcher), path=path)
+        started.set()
+        async with server:
+            await stop.wait()
+        for task in asyncio.all_tasks() - {asyncio.current_task()}:
+            task.cancel()
+
+    stop = asyncio.Event()
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(stop),), daemon=True)
+    thread.start()
+    started.wait(5)
+    yield path
+    loop.call_soon_threadsafe(stop.set)
+    thread.join(5)
+    loop.close()
+    shutil.rmtree(directory)
+
+
+def test_vector_payload_round_trip():
+    vectors = [[0.25, -1.5], [3.0, 0.0]]
+    assert decode_vectors(encode_vectors(vectors)) == vectors
+
+
+def test_client_round_trip_over_unix_socket(server_socket):
+    fallback = ToyModel()
+    client = RemoteEmbeddings(server_socket, fallback_factory=lambda: fallback, timeout=5)
+
+    assert client.embed_documents(["a", "bbb"]) == [[1.0, 0.5, -1.0], [3.0, 0.5, -1.0]]
+    # The connection is kept and reused for the next request
+    assert client.embed_query("cc") == [2.0, 0.5, -1.0]
+    assert fallback.calls == []
+    client._drop_connection()
+
+
+def test_error_reply_is_embedded_in_process(server_socket):
+    fallback = ToyModel()
+    client = RemoteEmbeddings(server_socket, fallback_factory=lambda: fallback, timeout=5)
+
+    with pytest.raises(EmbeddingServerError, match="model failure"):
+        client._remote(["boom"])
+    assert client.embed_documents(["boom"]) == [[-1.0]]
+    assert fallback.calls == [["boom"]]
+    # The server is not marked down and the same connection serves the next request
+    assert client._down_until == 0.0
+    assert client.embed_query("dddd") == [4.0, 0.5, -1.0]
+    assert fallback.calls == [["boom"]]
+    client._drop_connection()
+
+
+def test_falls_back_in_process_while_the_server_is_down(monkeypatch):
+    fallback = ToyModel()
+    missing = os.path.join(tempfile.mkdtemp(), "missing.sock")
+    client = RemoteEmbeddings(missing, fallback_factory=lambda: fallback, retry_seconds=30)
+
+    assert client.embed_documents(["a", "b"]) == [[-1.0], [-1.0]]
+    assert fallback.calls == [["a", "b"]]
+
+    # No reconnect attempt until retry_seconds have passed
+    attempts = []
+    monkeypatch.setattr(client, "_remote", lambda texts: attempts.append(texts) or [[0.0]])
+    assert client.embed_query("c") == [-1.0]
+    assert attempts == []
+    client._down_until = 0.0
+    assert client.embed_query("d") == [0.0]
+    assert attempts == [["d"]]
+
+
+def test_worker_caches_only_what_its_local_model_embeds(monkeypatch, tmp_path, server_socket):
+    fallback = ToyModel()
+    settings = SimpleNamespace(
+        EMBEDDING_SERVER_SOCKET=server_socket, EMBEDDING_BACKEND="onnx",
+        EMBEDDING_CACHE_ENABLED=True, EMBEDDING_CACHE_DIR=str(tmp_path),
+    )
+    monkeypatch.setattr(embeddings_module, "get_settings", lambda: settings)
+    monkeypatch.setattr(embeddings_module, "load_embedding_backend", lambda backend: fallback)
+    for attr in ("_instance", "_local_instance", "_cache"):
+        monkeypatch.setattr(Embeddings, attr, None)
+
+    model = Embeddings.get_embeddings()
+    assert isinstance(model, RemoteEmbeddings)
+    assert model.embed_documents(["a"]) == [[1.0, 0.5, -1.0]]
+    # Server vectors never land in the worker's onnx namespace
+    assert Embeddings.get_cache().get_many(["a"]) == [None]
+
+    assert Embeddings.get_local_embeddings().embed_documents(["b"]) == [[-1.0]]
+    assert Embeddings.get_cache().get_many(["b"])[0] == [-1.0]
@@ -0,0 +1,37 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.expectation_cache import ExpectationCache, standards_fingerprint
+
+STANDARDS = ["3.W.1 The student will engage in writing as a process.", "3.W.2 Organization and composition."]
+EXPECTATIONS = [{"skill_domain": "organization", "expectation": "Sequence ideas", "indicators": ["uses transitions"]}]
+
+
+def test_fingerprint_ignores_order_and_repeats():
+    assert standards_fingerprint(STANDARDS) == standards_fingerprint(STANDARDS[::-1] + STANDARDS[:1])
+    assert standards_fingerprint(STANDARDS) != standards_fingerprint(STANDARDS[:1])
+
+
+def test_entries_are_copies_and_dropped_on_new_corpus_version():
+    cache = ExpectationCache(max_entries=4)
+    fingerprint = standards_fingerprint(STANDARDS)
+    cache.put("v1", "3", "Drafting", fingerprint, EXPECTATIONS)
+
+    hit = cache.get("v1", "3", "drafting", fingerprint)
+    assert hit == EXPECTATIONS
+    hit[0]["skill_domain"] = "changed"
+    assert cache.get("v1", "3", "drafting", fingerprint) == EXPECTATIONS
+    assert cache.get("v1", "4", "drafting", fingerprint) is None
+    assert cache.get("v2", "3", "drafting", fingerprint) is None
+
+
+def test_disk_tier_is_shared_and_namespaced(tmp_path):
+    fingerprint = standards_fingerprint(STANDARDS)
+    ExpectationCache(4, str(tmp_path), namespace="prompt-a").put("v1", "3", "drafting", fingerprint, EXPECTATIONS)
+
+    other_worker = ExpectationCache(4, str(tmp_path), namespace="prompt-a")
+    assert other_worker.get("v2", "3", "drafting", fingerprint) == EXPECTATIONS
+    assert other_worker.stats()["disk_hits"] == 1
+    assert ExpectationCache(4, str(tmp_path), namespace="prompt-b").get("v1", "3", "drafting", fingerprint) is None
@@ -0,0 +1,28 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.expectation_catalog import ExpectationCatalog, content_digest
+
+W1 = "3.W.1 The student will engage in writing as a process."
+W2 = "3.W.2 The student will write in a variety of forms."
+WEB = "Third graders brainstorm with graphic organizers."
+
+
+def _entry(content, expectations, grade="3", stage="prewriting"):
+    return {"grade": grade, "stage": stage, "content_hash": content_digest(content), "expectations": expectations}
+
+
+def test_split_uses_catalog_and_leaves_the_rest_for_the_llm():
+    plan = {"skill_domain": "ideas", "expectation": "Plan before writing", "indicators": ["uses a web"]}
+    forms = {"skill_domain": "organization", "expectation": "Write in several forms", "indicators": []}
+    catalog = ExpectationCatalog([_entry(W1, [plan]), _entry(W2, [plan, forms]), _entry(W2, [forms], grade="4")])
+
+    expectations, uncatalogued = catalog.split([W1, WEB, W2], "3", "Prewriting")
+    assert expectations == [plan, forms]
+    assert uncatalogued == [WEB]
+
+    expectations[0]["skill_domain"] = "changed"
+    assert catalog.get("3", "prewriting", W1) == [plan]
+    assert catalog.split([W1], "4", "prewriting") == ([], [W1])
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.agents import master
+from app.agents.tools import web_search
+from app.core.config import get_settings
+from app.rag import retrieval
+
+RANKINGS = {
+    "base": ["a", "b", "c"],
+    "synonym": ["c", "b"],
+}
+
+
+def _fake_retrieval(monkeypatch, started=None):
+    """Corpus retrieval from RANKINGS; with `started`, each call waits until every query is in flight."""
+    async def retrieve(query, grade_level=None, stage=None, match_count=5, match_threshold=0.5):
+        if started is not None:
+            started.append(query)
+            while len(started) < len(RANKINGS):
+                await asyncio.sleep(0)
+        return list(RANKINGS[query])
+
+    monkeypatch.setattr(retrieval, "retrieve_sol_standards", retrieve)
+
+
+def test_queries_run_concurrently(monkeypatch):
+    _fake_retrieval(monkeypatch, started=[])
+    # A sequential implementation would never let the first query finish
+    fused = asyncio.run(asyncio.wait_for(retrieval.retrieve_fused(["base", "synonym"], match_count=3), timeout=2))
+    assert len(fused) == 3
+
+
+def test_rank_fusion_order_and_sources(monkeypatch):
+    _fake_retrieval(monkeypatch)
+    monkeypatch.setattr(get_settings(), "SOL_RRF_K", 60)
+
+    async def web():
+        return ["e", "a"]
+
+    async def broken():
+        raise ConnectionError("search down")
+
+    fused = asyncio.run(retrieval.retrieve_fused(
+        ["base", "synonym"], match_count=4, extra_sources={"web_search": web(), "other": broken()}))
+    # a: 1/61 + 1/62, c: 1/63 + 1/61, b: 2/62, e: 1/61; the failing source is skipped
+    assert fused == [("a", "sol_db"), ("c", "sol_db"), ("b", "sol_db"), ("e", "web_search")]
+
+
+def _expansion_stubs(monkeypatch, progression):
+    calls = {"fused": [], "progression": 0, "web": 0, "single": 0}
+
+    async def fused(queries, grade_level=None, stage=None, match_count=5, match_threshold=0.5, extra_sources=None):
+        extra = {name: await source for name, source in (extra_sources or {}).items()}
+        calls["fused"].append((queries, sorted(extra)))
+        return [("a", "sol_db")] + [(item, name) for name, items in extra.items() for item in items]
+
+    async def retrieve_progression(grade_level, stage):
+        calls["progression"] += 1
+        return list(progression)
+
+    async def retrieve(*args, **kwargs):
+        calls["single"] += 1
+        return []
+
+    def tavily(query, grade_level):
+        calls["web"] += 1
+        return ["web tip"]
+
+    monkeypatch.setattr(master, "retrieve_fused", fused)
+    monkeypatch.setattr(master, "retrieve_progression", retrieve_progression)
+    monkeypatch.setattr(master, "retrieve_sol_standards", retrieve)
+    monkeypatch.setattr(web_search, "tavily_search_safe", tavily)
+    return calls
+
+
+def _expand_until_done(state):
+    """Runs expand_context the way the graph does: again whenever the stage still finds too little."""
+    expansions = []
+    while True:
+        update = asyncio.run(master.expand_rag_context(state))
+        expansions.append(update)
+        state = {**state, **update}
+        if update["rag_status"] == "sufficient":
+            return expansions
+        state["rag_status"] = "insufficient"
+
+
+def test_fanout_makes_a_single_retrieval_decision(monkeypatch):
+    monkeypatch.setattr(get_settings(), "RAG_EXPANSION_MODE", "fanout")
+    monkeypatch.setattr(get_settings(), "RAG_FANOUT_INCLUDE_WEB", False)
+    calls = _expansion_stubs(monkeypatch, progression=["2.W.1 grade 2 skill"])
+
+    state = {"current_stage": "Prewriting", "grade_level": "3", "retrieval_attempts": 0, "rag_status": "insufficient"}
+    expansions = _expand_until_done(state)
+
+    # One fused retrieval; the next insufficiency goes straight to the attempt cap
+    assert len(expansions) == 2
+    assert len(calls["fused"]) == 1 and calls["single"] == 0
+    queries, extra = calls["fused"][0]
+    assert len(queries) == 2 and extra == ["sol_progression"]
+    assert expansions[0]["retrieval_attempts"] == master.MAX_RETRIEVAL_ATTEMPTS
+    assert {"content": "2.W.1 grade 2 skill", "source": "sol_progression"} in expansions[0]["retrieved_standards"]
+
+
+def test_fanout_web_search_is_opt_in(monkeypatch):
+    monkeypatch.setattr(get_settings(), "RAG_EXPANSION_MODE", "fanout")
+    state = {"current_stage": "Editing", "grade_level": "5", "retrieval_attempts": 0}
+
+    monkeypatch.setattr(get_settings(), "RAG_FANOUT_INCLUDE_WEB", False)
+    calls = _expansion_stubs(monkeypatch, progression=[])
+    asyncio.run(master.expand_rag_context(state))
+    assert calls["web"] == 0 and calls["fused"][0][1] == []
+
+    monkeypatch.setattr(get_settings(), "RAG_FANOUT_INCLUDE_WEB", True)
+    calls = _expansion_stubs(monkeypatch, progression=[])
+    update = asyncio.run(master.expand_rag_context(state))
+    assert calls["web"] == 1 and calls["fused"][0][1] == ["web_search"]
+    assert {"content": "web tip", "source": "web_search"} in update["retrieved_standards"]
+
+
+def test_sequential_mode_retrieves_once_per_loop(monkeypatch):
+    monkeypatch.setattr(get_settings(), "RAG_EXPANSION_MODE", "sequential")
+    calls = _expansion_stubs(monkeypatch, progression=[])
+
+    state = {"current_stage": "Prewriting", "grade_level": "3", "retrieval_attempts": 0, "rag_status": "insufficient"}
+    expansions = _expand_until_done(state)
+
+    assert len(expansions) == 3
+    assert calls["fused"] == [] and calls["single"] == 1 and calls["progression"] == 1 and calls["web"] == 1
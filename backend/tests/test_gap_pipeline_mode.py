@@ -0,0 +1,90 @@
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.agents import gap_analysis
+from app.agents.gap_analysis import fused_gaps, gap_pipeline_mode, quote_in_text
+from app.core.config import Settings, get_settings
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    monkeypatch.setenv("GAP_ANALYSIS_STAGE_MODES", '{"editing": "fused"}')
+    get_settings.cache_clear()
+    yield get_settings()
+    get_settings.cache_clear()
+
+
+def test_stage_override_selects_fused_mode(settings):
+    assert gap_pipeline_mode("Editing") == "fused"
+    assert gap_pipeline_mode("drafting") == settings.GAP_ANALYSIS_MODE == "multistep"
+
+
+def test_unknown_mode_is_rejected_when_settings_load(monkeypatch):
+    monkeypatch.setenv("GAP_ANALYSIS_MODE", "single")
+    with pytest.raises(ValidationError):
+        Settings()
+    monkeypatch.setenv("GAP_ANALYSIS_MODE", "fused")
+    monkeypatch.setenv("GAP_ANALYSIS_STAGE_MODES", '{"Editing": "one-shot"}')
+    with pytest.raises(ValidationError):
+        Settings()
+
+
+class StubLLM:
+    def __init__(self, reply):
+        self.reply = reply
+
+    async def ainvoke(self, messages):
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return SimpleNamespace(content=self.reply)
+
+
+def _fused(monkeypatch, reply, text="we walkt home"):
+    async def multistep(*args):
+        return "multistep"
+
+    monkeypatch.setattr(gap_analysis, "get_llm", lambda: StubLLM(reply))
+    monkeypatch.setattr(gap_analysis, "multistep_gaps", multistep)
+    return asyncio.run(fused_gaps(text, "3", "editing", []))
+
+
+def test_fused_falls_back_on_model_errors(monkeypatch):
+    assert _fused(monkeypatch, ConnectionError("rate limited")) == "multistep"
+    assert _fused(monkeypatch, "not json") == "multistep"
+    assert _fused(monkeypatch, '{"gaps": []}') == "multistep"
+
+
+def test_fused_sends_no_call_without_writing(monkeypatch):
+    unused = AssertionError("the fused prompt must not be sent")
+    assert _fused(monkeypatch, unused, text="") == "multistep"
+    assert _fused(monkeypatch, unused, text="  \n") == "multistep"
+
+
+def test_mode_settings_are_validated_when_settings_load(monkeypatch):
+    for name, typo in [("EMBEDDING_BACKEND", "onnx_int8"), ("SOL_SEARCH_MODE", "half"),
+                       ("SOL_SEARCH_BACKEND", "pg"), ("RAG_EXPANSION_MODE", "fan-out")]:
+        monkeypatch.setenv(name, typo)
+        with pytest.raises(ValidationError, match=name):
+            Settings()
+        monkeypatch.delenv(name)
+    assert Settings().SOL_SEARCH_MODE == "exact"
+
+
+def test_fused_skips_malformed_gaps(monkeypatch):
+    reply = '["conventions", {"skill_domain": "conventions", "evidence_level": "no", ' \
+            '"severity": "high", "negative_examples": ["walkt home", "runned"]}]'
+    gaps = _fused(monkeypatch, reply)
+    assert [(g.skill_domain, g.severity, g.evidence) for g in gaps] == [("conventions", "high", "walkt home")]
+
+
+def test_quotes_must_occur_in_the_writing():
+    text = "on saturday me and my freind went to the store"
+    assert quote_in_text("me and  my FREIND", text)
+    assert not quote_in_text("The student uses run-on sentences", text)
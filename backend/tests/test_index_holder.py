@@ -0,0 +1,163 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import get_settings
+from app.rag import corpus_version, retrieval, vector_index
+from app.rag.corpus_version import _VersionTracker
+from app.rag.vector_index import _IndexHolder
+
+
+class FakeIndex:
+    def __init__(self, rows):
+        self.rows = rows
+        self.version = None
+
+    def __len__(self):
+        return len(self.rows)
+
+
+@pytest.fixture
+def holder(monkeypatch):
+    """An _IndexHolder over a fake corpus; `state.version` is the live corpus version."""
+    state = SimpleNamespace(version="v1", loads=[], fail=False)
+    settings = get_settings()
+    monkeypatch.setattr(settings, "SOL_INDEX_ENABLED", True)
+    monkeypatch.setattr(settings, "SOL_SNAPSHOT_PATH", None)
+    monkeypatch.setattr(settings, "SOL_INDEX_REFRESH_SECONDS", 60)
+
+    def fetch_corpus(client, version):
+        state.loads.append(version)
+        if state.fail:
+            raise ConnectionError("database unavailable")
+        return [f"{version} row"]
+
+    monkeypatch.setattr(vector_index, "current_corpus_version", lambda: state.version)
+    monkeypatch.setattr(vector_index, "get_supabase_client", lambda: None)
+    monkeypatch.setattr(vector_index, "fetch_corpus", fetch_corpus)
+    monkeypatch.setattr(vector_index.SOLVectorIndex, "from_rows", classmethod(lambda cls, rows, **options: FakeIndex(rows)))
+    state.holder = _IndexHolder()
+    return state
+
+
+def test_index_reloads_only_when_the_version_changes(holder):
+    first = holder.holder.get()
+    assert first.version == "v1" and holder.holder.get() is first
+    assert holder.loads == ["v1"]
+
+    holder.version = "v2"
+    second = holder.holder.get()
+    assert second.version == "v2" and second.rows == ["v2 row"]
+    assert holder.loads == ["v1", "v2"]
+
+
+def test_failed_reload_keeps_the_index_until_retry_at(holder):
+    first = holder.holder.get()
+    holder.version, holder.fail = "v2", True
+
+    assert holder.holder.get() is first
+    assert holder.holder.retry_at > 0
+    # Within the backoff window the database is not asked again
+    assert holder.holder.get() is first
+    assert holder.loads == ["v1", "v2"]
+
+    holder.fail = False
+    holder.holder.retry_at = 0.0
+    assert holder.holder.get().version == "v2"
+    assert holder.loads == ["v1", "v2", "v2"]
+
+
+def test_async_getter_serves_a_current_index_without_io(holder, monkeypatch):
+    loaded = holder.holder.get()
+
+    async def version():
+        return "v1"
+
+    monkeypatch.setattr(vector_index, "acurrent_corpus_version", version)
+    monkeypatch.setattr(vector_index, "_holder", holder.holder)
+    monkeypatch.setattr(vector_index, "current_corpus_version", lambda: pytest.fail("peek must not poll"))
+    assert asyncio.run(vector_index.aget_vector_index()) is loaded
+
+
+def _search_paths(monkeypatch, index, pg_search):
+    """Stubs every data path of _asearch_standards; returns the names of the paths it used."""
+    used = []
+
+    async def get_index():
+        return index
+
+    def search_index(*args):
+        used.append("index")
+        return ["index row"]
+
+    class Rpc:
+        async def execute(self):
+            used.append("rest")
+            return SimpleNamespace(data=["rest row"])
+
+    async def client():
+        return SimpleNamespace(rpc=lambda name, params: Rpc())
+
+    monkeypatch.setattr(retrieval, "aget_vector_index", get_index)
+    monkeypatch.setattr(retrieval, "search_index", search_index)
+    monkeypatch.setattr(retrieval, "get_pg_search", lambda: pg_search)
+    monkeypatch.setattr(retrieval, "get_async_supabase_client", client)
+    rows = asyncio.run(retrieval._asearch_standards("q", [0.0], "3", None, 5, 0.5))
+    return rows, used
+
+
+class FakePgSearch:
+    def __init__(self, used, error=None):
+        self.used = used
+        self.error = error
+
+    async def match(self, **params):
+        self.used.append("pg")
+        if self.error:
+            raise self.error
+        return ["pg row"]
+
+
+def test_search_prefers_index_then_pg_search_then_rest(monkeypatch):
+    calls = []
+    assert _search_paths(monkeypatch, FakeIndex(["row"]), FakePgSearch(calls)) == (["index row"], ["index"])
+    assert calls == []
+
+    # An empty or missing index goes to the direct connection
+    rows, used = _search_paths(monkeypatch, FakeIndex([]), FakePgSearch(calls))
+    assert rows == ["pg row"] and calls == ["pg"] and used == []
+
+    # A failing direct connection, or none configured, goes to the PostgREST RPC
+    calls.clear()
+    rows, used = _search_paths(monkeypatch, None, FakePgSearch(calls, ConnectionError("pool closed")))
+    assert rows == ["rest row"] and calls == ["pg"] and used == ["rest"]
+    assert _search_paths(monkeypatch, None, None) == (["rest row"], ["rest"])
+
+
+def test_version_is_fetched_outside_the_lock(monkeypatch):
+    tracker = _VersionTracker()
+    monkeypatch.setattr(get_settings(), "SOL_INDEX_REFRESH_SECONDS", 60)
+    monkeypatch.setattr(corpus_version, "get_supabase_client", lambda: None)
+
+    def fetch(client):
+        # invalidate()/set() from other threads must not wait for the round trip
+        assert tracker._lock.acquire(blocking=False)
+        tracker._lock.release()
+        return "v1"
+
+    monkeypatch.setattr(corpus_version, "fetch_corpus_version", fetch)
+    assert tracker.get() == "v1"
+
+    def fail(client):
+        raise ConnectionError("database unavailable")
+
+    # A failed poll keeps the last known version
+    monkeypatch.setattr(corpus_version, "fetch_corpus_version", fail)
+    tracker.checked_at = 0.0
+    assert tracker.get() == "v1" and tracker.is_fresh()
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.rag.ingest_pipeline import IngestPipeline
+
+
+def parse_stub(name, count):
+    """Module level so the spawned parse workers can unpickle it."""
+    return [{"content": f"{name}-{i}"} for i in range(count)]
+
+
+def embed_stub(texts):
+    return [[float(len(t))] for t in texts]
+
+
+class FlakyUpload:
+    """Fails the first `failures` calls, then records every batch it receives."""
+
+    def __init__(self, failures=1, delay=0.0):
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.failures:
+                raise ConnectionError("upload failed")
+        time.sleep(self.delay)
+        with self.lock:
+            self.batches.append([dict(c) for c in batch])
+
+
+def _pipeline(upload, **options):
+    options = {"parse_workers": 1, "embed_batch_size": 3, "upload_concurrency": 1, "retry_backoff": 0.0, **options}
+    return IngestPipeline(parse_stub, embed_stub, upload, **options)
+
+
+def test_failed_upload_is_retried_and_order_is_kept():
+    upload = FlakyUpload(failures=1)
+    pipeline = _pipeline(upload)
+    stats = asyncio.run(pipeline.run([("a", 4), ("b", 3)]))
+
+    contents = [c["content"] for batch in upload.batches for c in batch]
+    assert contents == ["a-0", "a-1", "a-2", "a-3", "b-0", "b-1", "b-2"]
+    assert [len(batch) for batch in upload.batches] == [3, 3, 1]
+    assert all(c["embedding"] == [3.0] for batch in upload.batches for c in batch)
+    assert stats["upload"].retries == 1
+    assert stats["upload"].items == stats["embed"].items == stats["parse"].items == 7
+
+
+def test_exhausted_retries_abort_the_run():
+    upload = FlakyUpload(failures=10)
+    pipeline = _pipeline(upload, upload_retries=2)
+    with pytest.raises(ConnectionError):
+        asyncio.run(pipeline.run([("a", 2)]))
+    assert upload.calls == 3
+    assert pipeline.stats["upload"].retries == 2
+
+
+def test_queues_bound_the_batches_in_flight():
+    upload = FlakyUpload(failures=0, delay=0.02)
+    embedded = []
+
+    def embed(texts):
+        embedded.append(len(upload.batches))
+        return embed_stub(texts)
+
+    pipeline = IngestPipeline(
+        parse_stub, embed, upload, parse_workers=1, embed_batch_size=1,
+        upload_concurrency=1, retry_backoff=0.0, queue_size=1,
+    )
+    asyncio.run(pipeline.run([("a", 12)]))
+
+    # Embedding runs at most one queued batch plus the one being uploaded ahead of the uploads
+    assert max(n - done for n, done in enumerate(embedded)) <= 2
+    assert len(upload.batches) == 12
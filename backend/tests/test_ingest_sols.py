@@ -0,0 +1,325 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+pytest.importorskip("llama_index.core")
+
+from app.core.config import get_settings
+from app.rag import ingest
+
+
+def parse_lines(path, source_hash):
+    """
+    One chunk per line of a text file. Module level so the spawned parse
+    workers can unpickle it; PARSE_LINES_PREFIX (inherited by the workers)
+    stands in for a parser change that alters chunk text.
+    """
+    file_name = os.path.basename(path)
+    prefix = os.environ.get("PARSE_LINES_PREFIX", "")
+    with open(path) as f:
+        lines = [prefix + line.strip() for line in f if line.strip()]
+    return [ingest._chunk_record(file_name, line, {"file_name": file_name, "source_hash": source_hash})
+            for line in lines]
+
+
+class FakeTable:
+    """Just enough of a PostgREST table query over FakeSupabase's rows."""
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.filters = {}
+        self.action = ("select", None)
+        self.window = None
+
+    def select(self, *columns, count=None):
+        return self
+
+    def insert(self, row):
+        self.action = ("insert", row)
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.action = ("upsert", rows)
+        return self
+
+    def update(self, values):
+        self.action = ("update", values)
+        return self
+
+    def delete(self):
+        self.action = ("delete", None)
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end + 1)
+        return self
+
+    def execute(self):
+        action, payload = self.action
+        if self.name == "sol_corpus_state":
+            return SimpleNamespace(data=[{"version": self.db.active}] if self.db.active else [])
+        if self.name == "sol_corpus_versions":
+            if action == "insert":
+                self.db.versions[payload["version"]] = payload["status"]
+            else:
+                self.db.versions[self.filters["version"]] = payload["status"]
+            return SimpleNamespace(data=[])
+        if action == "upsert":
+            if self.db.fail_uploads:
+                raise ConnectionError("upload failed")
+            for row in payload:
+                self.db.put(dict(row))
+            return SimpleNamespace(data=[])
+        matching = [r for r in self.db.rows if all(r.get(c) == v for c, v in self.filters.items())]
+        if action == "delete":
+            self.db.rows = [r for r in self.db.rows if r not in matching]
+            return SimpleNamespace(data=[])
+        if self.window:
+            matching = matching[slice(*self.window)]
+        return SimpleNamespace(data=matching, count=len(self.db.rows))
+
+
+class FakeRpc:
+    def __init__(self, db, name, params):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.db.calls.append((self.name, self.params))
+        return SimpleNamespace(data=getattr(self.db, self.name)(**self.params))
+
+
+class FakeSupabase:
+    """
+    In-memory sol_standards / sol_corpus_versions / sol_corpus_state with the
+    snapshot RPCs of migrations/04_sol_corpus_snapshots.sql.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.versions = {}
+        self.active = None
+        self.calls = []
+        self.fail_uploads = False
+        # Chunks copy_sol_chunks silently skips, to simulate an incomplete snapshot
+        self.lose_copies = 0
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+    def put(self, row):
+        self.rows = [r for r in self.rows
+                     if (r["corpus_version"], r["chunk_hash"]) != (row["corpus_version"], row["chunk_hash"])]
+        self.rows.append(row)
+
+    def snapshot(self, version):
+        return {r["chunk_hash"]: r for r in self.rows if r["corpus_version"] == version}
+
+    def copy_sol_chunks(self, source_version, target_version, chunks):
+        stored = self.snapshot(source_version)
+        copied = 0
+        for chunk in chunks:
+            if self.lose_copies:
+                self.lose_copies -= 1
+                continue
+            row = dict(stored[chunk["chunk_hash"]], corpus_version=target_version)
+            if chunk["metadata"] is not None:
+                row["metadata"] = chunk["metadata"]
+            self.put(row)
+            copied += 1
+        return copied
+
+    def retag_sol_chunks(self, target_version, chunks):
+        stored = self.snapshot(target_version)
+        for chunk in chunks:
+            stored[chunk["chunk_hash"]]["metadata"] = chunk["metadata"]
+        return len(chunks)
+
+    def activate_sol_corpus_version(self, new_version, expected_count):
+        count = sum(1 for r in self.snapshot(new_version).values() if r.get("embedding") is not None)
+        if count != expected_count:
+            raise RuntimeError(f"corpus version {new_version} has {count} chunks, expected {expected_count}")
+        replaced, self.active = self.active, new_version
+        for version, status in self.versions.items():
+            if status == "active":
+                self.versions[version] = "retired"
+        self.versions[new_version] = "active"
+        return replaced
+
+
+class FakeModel:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t))] for t in texts]
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    db = FakeSupabase()
+    model = FakeModel()
+    settings = get_settings()
+    monkeypatch.setattr(settings, "INGEST_PARSE_WORKERS", 1)
+    monkeypatch.setattr(settings, "INGEST_UPLOAD_RETRIES", 0)
+    monkeypatch.setattr(settings, "INGEST_DEDUP_THRESHOLD", 0.0)
+    monkeypatch.setattr(settings, "INGEST_EXPECTATION_CATALOG", False)
+    monkeypatch.setattr(ingest, "get_supabase_client", lambda: db)
+    monkeypatch.setattr(ingest, "parse_file", parse_lines)
+    monkeypatch.setattr(ingest.Embeddings, "get_embeddings", classmethod(lambda cls: model))
+
+    def write(name, *lines):
+        (tmp_path / name).write_text("\n".join(lines))
+
+    def run():
+        model.embedded.clear()
+        db.calls.clear()
+        return asyncio.run(ingest.ingest_sols(str(tmp_path)))
+
+    return SimpleNamespace(db=db, model=model, write=write, run=run, dir=tmp_path)
+
+
+def test_build_activates_a_complete_snapshot(corpus):
+    corpus.write("grade3.txt", "3.W.1 plan", "3.W.2 draft")
+    version = corpus.run()
+
+    assert corpus.db.active == version and corpus.db.versions[version] == "active"
+    assert sorted(r["content"] for r in corpus.db.snapshot(version).values()) == ["3.W.1 plan", "3.W.2 draft"]
+
+
+def test_failed_build_never_moves_the_pointer(corpus):
+    corpus.write("grade3.txt", "3.W.1 plan")
+    live = corpus.run()
+
+    corpus.write("grade3.txt", "3.W.1 plan", "3.W.3 revise")
+    corpus.db.fail_uploads = True
+    assert corpus.run() is None
+
+    draft = next(v for v, status in corpus.db.versions.items() if v != live)
+    assert corpus.db.active == live
+    assert corpus.db.versions[draft] == "failed"
+    assert corpus.db.snapshot(draft) == {}
+    assert not any(name == "activate_sol_corpus_version" for name, _ in corpus.db.calls)
+
+
+def test_count_mismatch_discards_the_draft(corpus):
+    corpus.write("grade3.txt", "3.W.1 plan", "3.W.2 draft")
+    corpus.write("grade4.txt", "4.W.1 plan")
+    live = corpus.run()
+
+    corpus.write("grade4.txt", "4.W.1 plan", "4.W.2 draft")
+    corpus.db.lose_copies = 1
+    assert corpus.run() is None
+
+    draft = next(v for v in corpus.db.versions if v != live)
+    assert corpus.db.active == live and corpus.db.versions[draft] == "failed"
+    assert corpus.db.snapshot(draft) == {}
+    # The live snapshot is untouched
+    assert len(corpus.db.snapshot(live)) == 3
+
+
+def test_copies_read_the_live_version_and_write_the_draft(corpus):
+    corpus.write("grade3.txt", "3.W.1 plan")
+    corpus.write("grade4.txt", "4.W.1 plan")
+    live = corpus.run()
+
+    corpus.write("grade4.txt", "4.W.1 plan", "4.W.2 draft")
+    version = corpus.run()
+
+    copies = [params for name, params in corpus.db.calls if name == "copy_sol_chunks"]
+    assert copies and all(p["source_version"] == live and p["target_version"] == version for p in copies)
+    assert [name for name, _ in corpus.db.calls][-1] == "activate_sol_corpus_version"
+    assert corpus.db.active == version and corpus.db.versions[live] == "retired"
+
+
+def _copied(db):
+    """chunk content -> "kept" (stored tags) or "retagged" for every chunk copied into the new snapshot."""
+    contents = {r["chunk_hash"]: r["content"] for r in db.rows}
+    return {contents[c["chunk_hash"]]: "kept" if c["metadata"] is None else "retagged"
+            for name, params in db.calls if name == "copy_sol_chunks" for c in params["chunks"]}
+
+
+def test_changed_file_reembeds_only_its_new_chunks(corpus):
+    corpus.write("grade3.txt", "3.W.1 plan", "3.W.2 draft")
+    corpus.write("grade4.txt", "4.W.1 plan", "4.W.2 draft")
+    corpus.run()
+    assert len(corpus.model.embedded) == 4
+
+    corpus.write("grade4.txt", "4.W.1 plan", "4.W.3 revise")
+    version = corpus.run()
+
+    assert corpus.model.embedded == ["4.W.3 revise"]
+    # Untouched file: carried over as stored; changed file: its surviving chunk takes the new source hash
+    assert _copied(corpus.db) == {"3.W.1 plan": "kept", "3.W.2 draft": "kept", "4.W.1 plan": "retagged"}
+    snapshot = corpus.db.snapshot(version)
+    assert sorted(r["content"] for r in snapshot.values()) == ["3.W.1 plan", "3.W.2 draft", "4.W.1 plan", "4.W.3 revise"]
+    assert {r["metadata"]["source_hash"] for r in snapshot.values() if r["metadata"]["file_name"] == "grade4.txt"} \
+        == {ingest.hash_file(str(corpus.dir / "grade4.txt"))}
+
+
+def test_new_and_removed_files(corpus):
+    corpus.write("grade3.txt", "3.W.1 plan")
+    corpus.write("grade4.txt", "4.W.1 plan")
+    corpus.run()
+
+    os.remove(corpus.dir / "grade4.txt")
+    corpus.write("grade5.txt", "5.W.1 plan")
+    version = corpus.run()
+
+    assert corpus.model.embedded == ["5.W.1 plan"]
+    assert _copied(corpus.db) == {"3.W.1 plan": "kept"}
+    assert sorted(r["content"] for r in corpus.db.snapshot(version).values()) == ["3.W.1 plan", "5.W.1 plan"]
+
+
+def test_unchanged_sources_build_nothing(corpus):
+    corpus.write("grade3.txt", "3.W.1 plan")
+    live = corpus.run()
+
+    assert corpus.run() is None
+    assert corpus.model.embedded == [] and corpus.db.calls == []
+    assert corpus.db.active == live and list(corpus.db.versions) == [live]
+
+
+def test_parser_version_bump_reparses_every_file(corpus, monkeypatch):
+    corpus.write("grade3.txt", "3.W.1 plan")
+    corpus.write("grade4.txt", "4.W.1 plan")
+    corpus.run()
+
+    # Same chunk text: every file is re-parsed and re-tagged, no chunk is re-embedded
+    monkeypatch.setattr(ingest, "PARSER_VERSION", "test-parser-2")
+    version = corpus.run()
+    assert corpus.model.embedded == []
+    assert _copied(corpus.db) == {"3.W.1 plan": "retagged", "4.W.1 plan": "retagged"}
+    assert {r["metadata"]["source_hash"] for r in corpus.db.snapshot(version).values()} == {
+        ingest.hash_file(str(corpus.dir / name)) for name in ("grade3.txt", "grade4.txt")}
+
+    # A parser change that alters the chunk text re-embeds every chunk
+    monkeypatch.setattr(ingest, "PARSER_VERSION", "test-parser-3")
+    monkeypatch.setenv("PARSE_LINES_PREFIX", "Writing > ")
+    version = corpus.run()
+    assert sorted(corpus.model.embedded) == ["Writing > 3.W.1 plan", "Writing > 4.W.1 plan"]
+    assert _copied(corpus.db) == {}
+    assert sorted(r["content"] for r in corpus.db.snapshot(version).values()) == [
+        "Writing > 3.W.1 plan", "Writing > 4.W.1 plan"]
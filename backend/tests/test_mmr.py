@@ -0,0 +1,49 @@
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.vector_index import SOLVectorIndex, maximal_marginal_relevance
+
+
+def _index():
+    # Rows 0 and 1 are near-duplicates closest to the query; row 2 covers another direction
+    embeddings = np.array([
+        [1.0, 0.10, 0.0],
+        [1.0, 0.11, 0.0],
+        [0.7, 0.0, 0.7],
+        [0.5, 0.0, -0.5],
+    ], dtype=np.float32)
+    return SOLVectorIndex(
+        ids=["a", "a-copy", "b", "c"],
+        contents=["a", "a copy", "b", "c"],
+        metadata=[{"grades": ["3"]}] * 4,
+        embeddings=embeddings,
+    )
+
+
+def test_mmr_demotes_near_duplicates():
+    index = _index()
+    plain = [r["id"] for r in index.search([1.0, 0.0, 0.0], match_count=2, match_threshold=0.0)]
+    assert plain == ["a", "a-copy"]
+    diverse = [r["id"] for r in index.search([1.0, 0.0, 0.0], match_count=2, match_threshold=0.0, mmr_lambda=0.5)]
+    assert diverse[0] == "a" and "a-copy" not in diverse
+    # Still returned once there is room for it
+    assert "a-copy" in [r["id"] for r in index.search([1.0, 0.0, 0.0], match_count=4, match_threshold=0.0, mmr_lambda=0.5)]
+
+
+def test_mmr_with_lambda_one_is_similarity_order():
+    index = _index()
+    query = [1.0, 0.0, 0.2]
+    plain = index.search(query, match_count=4, match_threshold=0.0)
+    relevance_only = index.search(query, match_count=4, match_threshold=0.0, mmr_lambda=1.0)
+    assert [r["id"] for r in relevance_only] == [r["id"] for r in plain]
+    assert [r["similarity"] for r in relevance_only] == [r["similarity"] for r in plain]
+
+
+def test_mmr_returns_pool_positions_in_selection_order():
+    vectors = np.eye(3, dtype=np.float32)
+    assert maximal_marginal_relevance(np.array([0.2, 0.9, 0.5]), vectors, 3, 1.0) == [1, 2, 0]
+    assert maximal_marginal_relevance(np.array([]), vectors[:0], 3) == []
@@ -0,0 +1,95 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.onnx_embeddings import FP32_FILE, INT8_FILE, MODEL_NAME, OnnxEmbeddings, export_onnx_model
+
+SENTENCES = [
+    "The student will write in a variety of forms to include narrative, descriptive, and expository.",
+    "Edit writing for capitalization, punctuation, spelling, and Standard English.",
+    "on saturday me and my freind went to the store",
+    "3.W.2",
+]
+
+# A slice of the SOL corpus and the kind of queries retrieval sends against it
+SOL_STANDARDS = [
+    "3.W.1 The student will engage in writing as a process.",
+    "3.W.2 The student will write in a variety of forms to include narrative, descriptive, opinion, and expository.",
+    "3.W.3 The student will edit writing for capitalization, punctuation, spelling, and Standard English.",
+    "3.LU.1 Use nouns, pronouns, adjectives, verbs, and adverbs correctly in simple sentences.",
+    "3.FFW.1 Spell grade-level words correctly, including words with common prefixes and suffixes.",
+    "4.W.1 Use a variety of prewriting strategies to generate and organize ideas.",
+    "4.W.4 Revise writing for clarity of content using specific vocabulary and information.",
+    "5.RL.2 Describe how an author's choice of words and phrases contributes to the tone.",
+    "2.W.3 Use complete sentences with subject-verb agreement and end punctuation.",
+    "6.RI.1 Identify the main idea and supporting details of an informational text.",
+]
+SOL_QUERIES = [
+    "prewriting brainstorming strategies for grade 3 writers",
+    "editing capitalization and punctuation errors",
+    "how to revise a draft for clearer word choice",
+    "spelling common grade-level words",
+    "writing an opinion paragraph",
+    "using adjectives and adverbs in sentences",
+]
+
+
+@pytest.fixture(scope="session")
+def onnx_model_dir(request):
+    """
+    fp32 + int8 exports of MiniLM. Taken from ONNX_TEST_MODEL_DIR or
+    pytest's cache; exporting downloads the model from the Hugging Face hub,
+    so it only happens with EMBEDDING_TEST_DOWNLOAD=1 (then it is cached).
+    """
+    directory = os.getenv("ONNX_TEST_MODEL_DIR") or str(request.config.cache.mkdir("minilm-onnx"))
+    if not all(os.path.exists(os.path.join(directory, name)) for name in (FP32_FILE, INT8_FILE)):
+        if not os.getenv("EMBEDDING_TEST_DOWNLOAD"):
+            pytest.skip("no exported MiniLM; set ONNX_TEST_MODEL_DIR or EMBEDDING_TEST_DOWNLOAD=1")
+        pytest.importorskip("torch")
+        pytest.importorskip("transformers")
+        export_onnx_model(directory, quantize=True)
+    pytest.importorskip("onnxruntime")
+    return directory
+
+
+def _cosine(a, b):
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def test_missing_model_is_an_error_not_an_export(tmp_path):
+    with pytest.raises(FileNotFoundError, match="--quantize"):
+        OnnxEmbeddings(str(tmp_path), quantized=True)
+    assert os.listdir(tmp_path) == []
+
+
+def test_onnx_matches_torch_backend(onnx_model_dir):
+    pytest.importorskip("torch")
+    huggingface = pytest.importorskip("langchain_huggingface")
+
+    onnx = np.array(OnnxEmbeddings(onnx_model_dir).embed_documents(SENTENCES))
+    torch = np.array(huggingface.HuggingFaceEmbeddings(model_name=MODEL_NAME).embed_documents(SENTENCES))
+
+    assert _cosine(onnx, torch).min() >= 0.99
+
+
+def test_int8_model_keeps_sol_retrieval(onnx_model_dir, k=3):
+    fp32 = OnnxEmbeddings(onnx_model_dir)
+    int8 = OnnxEmbeddings(onnx_model_dir, quantized=True)
+    texts = SENTENCES + SOL_STANDARDS + SOL_QUERIES
+
+    assert _cosine(np.array(int8.embed_documents(texts)), np.array(fp32.embed_documents(texts))).min() >= 0.99
+
+    def top_k(model):
+        corpus = np.array(model.embed_documents(SOL_STANDARDS))
+        queries = np.array(model.embed_documents(SOL_QUERIES))
+        return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+    exact, quantized = top_k(fp32), top_k(int8)
+    # Same best standard for every query, and near-identical top-k sets
+    assert (exact[:, 0] == quantized[:, 0]).all()
+    overlap = [len(set(e) & set(q)) / k for e, q in zip(exact, quantized)]
+    assert np.mean(overlap) >= 0.9
@@ -0,0 +1,14 @@
+import os
+import struct
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.pg_search import decode_vector, encode_vector
+
+
+def test_vector_codec_matches_pgvector_binary_format():
+    vector = [0.25, -1.5, 3.0]
+    data = encode_vector(vector)
+    assert data == struct.pack(">HH3f", 3, 0, *vector)
+    assert decode_vector(data) == vector
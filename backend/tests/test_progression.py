@@ -0,0 +1,123 @@
+import asyncio
+import sys
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag import retrieval
+from app.rag.progression import ProgressionGraph, neighbour_grades
+from app.rag.sol_metadata import extract_metadata, progression_standard
+from app.rag.vector_index import SOLVectorIndex
+
+CONTENTS = ["a 3.W.1", "b 2.W.1", "c 4.W.1", "d 3-4.W.2", "e 3.LU.1", "f grade 3"]
+METADATA = [
+    {"grades": ["3"], "standard_id": "W.1"},
+    {"grades": ["2"], "standard_id": "W.1"},
+    {"grades": ["4"], "standard_id": "W.1"},
+    {"grades": ["3", "4"], "standard_id": "W.2"},
+    {"grades": ["3"], "standard_id": "LU.1"},
+    {"grades": ["3"]},
+]
+
+
+def test_neighbour_grades():
+    assert neighbour_grades("3") == ["3", "2", "4"]
+    assert neighbour_grades("K") == ["K", "1"]
+    assert neighbour_grades("12", radius=2) == ["12", "11", "10"]
+
+
+def test_expand_walks_out_from_the_grade():
+    graph = ProgressionGraph(CONTENTS, METADATA)
+    assert graph.expand(["W.1"], "3") == [0, 1, 2]
+    assert graph.expand(["W.2", "LU"], "3") == [3, 4]
+    assert graph.rows("W.2", "4") == [3]
+    assert graph.expand(["W.1"], "12") == []
+
+
+def test_rows_follow_stable_key_not_corpus_order():
+    contents = ["z row", "a row", "m row"]
+    metadata = [{"grades": ["3"], "standard_id": "W.1", "file_name": f} for f in ("b.docx", "b.docx", "a.docx")]
+    assert ProgressionGraph(contents, metadata).rows("W.1", "3") == [2, 1, 0]
+    # Rows with a strand but no standard_id are not part of a progression
+    assert ProgressionGraph(["x"], [{"grades": ["3"], "strand": "LU"}]).rows("LU", "3") == []
+
+
+class FakeAsyncQuery:
+    """select().contains().eq().execute() over in-memory rows, like PostgREST's @> filter."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, columns):
+        return self
+
+    def contains(self, column, value):
+        def contained(meta):
+            return all(set(v) <= set(meta.get(k) or []) if isinstance(v, list) else meta.get(k) == v
+                       for k, v in value.items())
+        return FakeAsyncQuery([r for r in self.rows if contained(r["metadata"])])
+
+    def eq(self, column, value):
+        return self
+
+    async def execute(self):
+        return SimpleNamespace(data=[dict(r) for r in self.rows])
+
+
+def test_index_and_database_fallback_agree(monkeypatch):
+    # Shuffled corpus order, a band row, a strand-only row and an unrelated strand
+    rows = [
+        ("Writing > 4.W.3\nEdit for spelling.", {"grades": ["4"], "strand": "W", "standard_id": "W.3", "file_name": "g4.docx"}),
+        ("Language > 3.LU.1\nUse nouns.", {"grades": ["3"], "strand": "LU", "standard_id": "LU.1", "file_name": "g3.docx"}),
+        ("Language Usage overview", {"grades": ["3"], "strand": "LU", "file_name": "g3.docx"}),
+        ("Writing > 3.W.3\nEdit for capitals.", {"grades": ["3"], "strand": "W", "standard_id": "W.3", "file_name": "g3.docx"}),
+        ("Writing > 2.W.3\nEdit with help.", {"grades": ["2"], "strand": "W", "standard_id": "W.3", "file_name": "g2.docx"}),
+        ("Language > 2-3.LU.2\nUse verbs.", {"grades": ["2", "3"], "strand": "LU", "standard_id": "LU.2", "file_name": "band.docx"}),
+        ("Reading > 3.RL.1\nRetell.", {"grades": ["3"], "strand": "RL", "standard_id": "RL.1", "file_name": "g3.docx"}),
+    ]
+    contents = [c for c, _ in rows]
+    metadata = [m for _, m in rows]
+    index = SOLVectorIndex([str(i) for i in range(len(rows))], contents, metadata,
+                           np.eye(len(rows), dtype=np.float32))
+    database = [{"id": str(i), "content": c, "metadata": m} for i, (c, m) in enumerate(rows)]
+
+    async def no_version():
+        return "count:7"
+
+    async def client():
+        return SimpleNamespace(table=lambda name: FakeAsyncQuery(database))
+
+    monkeypatch.setattr(retrieval, "acurrent_corpus_version", no_version)
+    monkeypatch.setattr(retrieval, "get_async_supabase_client", client)
+
+    async def progression(loaded):
+        async def get_index():
+            return loaded
+        monkeypatch.setattr(retrieval, "aget_vector_index", get_index)
+        return await retrieval.retrieve_progression("3", "editing", match_count=10, exclude=[contents[0]])
+
+    from_index = asyncio.run(progression(index))
+    from_database = asyncio.run(progression(None))
+    assert from_index == from_database
+    assert "Language Usage overview" not in from_index and contents[0] not in from_index
+    assert from_index[0] == "Writing > 3.W.3\nEdit for capitals."
+
+
+def test_progression_chart_rows_get_their_standard():
+    assert progression_standard(
+        "Writing - 2024- Progression Chart (2).docx",
+        ["Writing Progression by Grade", "Modes and Purposes for Writing Standards"],
+    ) == ("W", 1)
+    assert progression_standard(
+        "Foundations for Reading - 2024- Progression Chart.docx", ["Phonics and Word Amalysis Standards"]
+    ) == ("FFR", 3)
+    meta = extract_metadata(
+        "Reading Literary - 2024- Progression Chart.docx",
+        "Describe how word choice contributes to tone.\nTaught in grades: 5, 6",
+        headings=["Reading Literary Progression", "Craft and Style Standards"],
+        heading_grades=["5", "6"],
+    )
+    assert meta["standard_id"] == "RL.2" and meta["grades"] == ["5", "6"]
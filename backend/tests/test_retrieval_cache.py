@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.rag import retrieval
+from app.rag.corpus_version import fetch_corpus_version, is_snapshot_version
+from app.rag.retrieval_cache import RetrievalCache, retrieval_cache_key
+
+
+class FakeQuery:
+    """Just enough of a PostgREST table query: records the table and returns canned rows."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+
+    def select(self, *columns, count=None):
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def execute(self):
+        result = self.client.responses[self.table]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class FakeClient:
+    def __init__(self, **responses):
+        self.responses = responses
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def test_hit_miss_and_copies():
+    cache = RetrievalCache(max_entries=2)
+    key = retrieval_cache_key("prewriting writing skills grade 3", "3", 5, 0.5)
+    assert cache.get("v1", key) is None
+
+    cache.put("v1", key, ["a", "b"])
+    hit = cache.get("v1", key)
+    assert hit == ["a", "b"]
+    hit.append("web result")
+    assert cache.get("v1", key) == ["a", "b"]
+    assert cache.stats() == {"version": "v1", "entries": 1, "hits": 2, "misses": 1}
+
+
+def test_new_version_drops_every_entry():
+    cache = RetrievalCache(max_entries=8)
+    cache.put("v1", "q1", ["a"])
+    cache.put("v1", "q2", ["b"])
+
+    assert cache.get("v2", "q1") is None
+    assert cache.stats()["entries"] == 0
+    # Entries computed against the old version are not resurrected by going back to it
+    assert cache.get("v1", "q2") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RetrievalCache(max_entries=2)
+    cache.put("v1", "q1", ["a"])
+    cache.put("v1", "q2", ["b"])
+    cache.get("v1", "q1")
+    cache.put("v1", "q3", ["c"])
+    assert cache.get("v1", "q2") is None
+    assert cache.get("v1", "q1") == ["a"]
+
+
+def test_fetch_corpus_version_reads_the_pointer():
+    client = FakeClient(sol_corpus_state=SimpleNamespace(data=[{"version": "abc123"}]))
+    assert fetch_corpus_version(client) == "abc123"
+    assert is_snapshot_version("abc123")
+
+
+def test_fetch_corpus_version_falls_back_to_the_row_count():
+    rows = SimpleNamespace(data=[], count=1234)
+    missing_table = FakeClient(sol_corpus_state=RuntimeError("relation does not exist"), sol_standards=rows)
+    assert fetch_corpus_version(missing_table) == "count:1234"
+    empty_table = FakeClient(sol_corpus_state=SimpleNamespace(data=[]), sol_standards=rows)
+    assert fetch_corpus_version(empty_table) == "count:1234"
+    assert not is_snapshot_version("count:1234")
+
+
+def test_retrieval_searches_again_after_a_version_bump(monkeypatch):
+    versions = iter(["v1", "v1", "v2"])
+    searches = []
+
+    async def version():
+        return next(versions)
+
+    async def embed(text):
+        return [0.0]
+
+    async def search(query, query_embedding, grade_level, stage, match_count, match_threshold):
+        searches.append(query)
+        return [{"content": f"{query} #{len(searches)}", "metadata": {}, "similarity": 0.9}]
+
+    monkeypatch.setattr(retrieval, "retrieval_cache", RetrievalCache(max_entries=8))
+    monkeypatch.setattr(retrieval, "acurrent_corpus_version", version)
+    monkeypatch.setattr(retrieval.Embeddings, "aembed_query", embed)
+    monkeypatch.setattr(retrieval, "_asearch_standards", search)
+
+    async def run():
+        return [await retrieval.retrieve_sol_standards("q", grade_level="3") for _ in range(3)]
+
+    first, cached, refreshed = asyncio.run(run())
+    assert first == cached == ["q #1"]
+    assert refreshed == ["q #2"]
+    assert searches == ["q", "q"]
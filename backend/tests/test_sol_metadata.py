@@ -0,0 +1,84 @@
+import sys
+import os
+from xml.etree import ElementTree
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.sol_metadata import (
+    ALL_GRADES,
+    W_NS,
+    extract_metadata,
+    grades_from_filename,
+    grades_from_heading,
+    table_row_sections,
+)
+
+
+def test_grades_from_filename():
+    assert grades_from_filename("Grade 10 Understanding the Standards.docx") == ["10"]
+    assert grades_from_filename("Grade 12 Understanding the Standards.docx") == ["12"]
+    assert grades_from_filename("3_Understanding the Standards.docx") == ["3"]
+    assert grades_from_filename("0-K_Understanding the Standards.docx") == ["K"]
+    assert grades_from_filename("K-2 Side By Side.docx") == ["K", "1", "2"]
+    assert grades_from_filename("7-9 Side By Side  - 2024.docx") == ["7", "8", "9"]
+    assert grades_from_filename("Grades 4-6 - Side By Side  - 2024 - Copy.docx") == ["4", "5", "6"]
+    assert grades_from_filename("Writing - 2024- Progression Chart (2).docx") == ALL_GRADES
+    assert grades_from_filename("2024-ELA-SOL-To-Post.docx") == []
+
+
+def test_grades_from_heading():
+    assert grades_from_heading("Standards Side by Side: Grade Seven – Grade Nine") == ["7", "8", "9"]
+    assert grades_from_heading("English Standards of Learning for Virginia Public Schools 2024 Kindergarten") == ["K"]
+    assert grades_from_heading("Foundations for Writing") == []
+
+
+def test_codes_narrow_but_do_not_widen_section_grades():
+    meta = extract_metadata(
+        "2024-ELA-SOL-To-Post.docx",
+        "3.W.2 Organization and Composition. Build on 2.W.2.",
+        headings=["Writing"],
+        heading_grades=["3"],
+        file_grades=[],
+    )
+    assert meta["grades"] == ["3"]
+    assert meta["strand"] == "W"
+    assert meta["stages"] == ["drafting", "revising"]
+
+
+def _table(rows):
+    w = W_NS
+    table = ElementTree.Element(w + "tbl")
+    for cells in rows:
+        row = ElementTree.SubElement(table, w + "tr")
+        for paragraphs in cells:
+            cell = ElementTree.SubElement(row, w + "tc")
+            for text in paragraphs:
+                run = ElementTree.SubElement(ElementTree.SubElement(cell, w + "p"), w + "r")
+                ElementTree.SubElement(run, w + "t").text = text
+    return table
+
+
+def test_side_by_side_table_emits_one_row_per_grade_cell():
+    table = _table([
+        [["Grade Three"], ["Grade Four"]],
+        [["Write narratives.", "Use dialogue."], ["Write narratives with pacing."]],
+    ])
+    rows = table_row_sections(table, ["Writing", "W.1-Modes and Purposes for Writing"], ["3", "4", "5"])
+    assert [r.text for r in rows] == [
+        "3.W.1 (Grade Three)\nWrite narratives.\nUse dialogue.",
+        "4.W.1 (Grade Four)\nWrite narratives with pacing.",
+    ]
+    assert rows[1].heading_grades == ["4"] and rows[1].columns == {"grade": "Grade Four"}
+    meta = extract_metadata("3-5 - Side By Side  - 2024.docx", rows[0].text, rows[0].headings, rows[0].heading_grades)
+    assert meta["standards"] == ["3.W.1"] and meta["grades"] == ["3"]
+
+
+def test_progression_chart_row_grades_are_where_the_skill_is_taught():
+    table = _table([
+        [["Writing Standards"], ["Kindergarten"], ["Grade 1"], ["Grade 2"]],
+        [["Write opinion pieces."], ["-"], ["A"], ["*"]],
+    ])
+    (row,) = table_row_sections(table, ["Writing Progression"], [])
+    assert row.headings == ["Writing Progression", "Writing Standards"]
+    assert row.heading_grades == ["1"]
+    assert row.columns == {"skill": "Write opinion pieces.", "levels": {"K": "-", "1": "A", "2": "*"}}
@@ -0,0 +1,86 @@
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.sol_metadata import codes_for_skill, codes_for_stage, grade_band
+from app.rag.standards_index import SOLCodeIndex, round_robin
+
+CONTENTS = [
+    "Writing > 3.W.2 (Grade Three)\nOrganize ideas in a logical sequence.",
+    "Understanding the Standards\nBuild on 3.W.2 and 2.W.2.",
+    "Language Usage > 3.LU.1 (Grade Three)\nUse complete sentences.",
+    "Language Usage > LU.2 (Grades 3-5)\nCapitalize proper nouns.",
+    "Writing > 5.W.3 (Grade Five)\nSee 3.W.2 for the grade three expectation.",
+    "Writing > 3.W.2 (Grade Three)\nUse transitions between paragraphs.",
+]
+METADATA = [
+    {"grades": ["3"], "standards": ["3.W.2"], "strand": "W", "file_name": "grade3.docx"},
+    {"grades": ["3"], "standards": ["2.W.2", "3.W.2"], "strand": "W", "file_name": "grade3.docx"},
+    {"grades": ["3"], "standards": ["3.LU.1"], "strand": "LU", "file_name": "grade3.docx"},
+    {"grades": ["3", "4", "5"], "standards": [], "strand": "LU", "file_name": "grades3-5.docx"},
+    {"grades": ["5"], "standards": ["3.W.2"], "strand": "W", "file_name": "grade5.docx"},
+    {"grades": ["3"], "standards": ["3.W.2"], "strand": "W", "file_name": "a-grade3.docx"},
+]
+
+
+def test_code_lookup_keeps_rows_stating_the_code_in_its_grade():
+    index = SOLCodeIndex(CONTENTS, METADATA)
+    # Stable order by source file, not row order; citing rows and other grades are left out
+    assert index.rows_for_code("3.W.2") == [5, 0]
+    assert index.rows_for_code("2.W.2") == []
+    assert index.rows_for_code("4.W.2") == []
+
+
+def test_row_order_does_not_depend_on_corpus_order():
+    order = [4, 2, 5, 0, 3, 1]
+    index = SOLCodeIndex([CONTENTS[i] for i in order], [METADATA[i] for i in order])
+    assert [order[row] for row in index.rows_for_code("3.W.2")] == [5, 0]
+    assert [order[row] for row in index.rows_for_code("3.LU")] == [2, 3]
+
+
+def test_round_robin_spreads_the_limit_over_every_ranking():
+    assert round_robin([[1, 2, 3], [4], [5, 6]], 4) == [1, 4, 5, 2]
+    assert round_robin([[1, 2], [2, 3]]) == [1, 2, 3]
+    assert round_robin([[], [7]], 5) == [7]
+
+
+def test_strand_code_matches_every_row_of_the_strand_in_the_grade():
+    index = SOLCodeIndex(CONTENTS, METADATA)
+    assert index.rows_for_code("3.LU") == [2, 3]
+    assert index.rows_for_strand("5", "LU") == [3]
+    assert index.row_for_content(CONTENTS[2]) == 2
+
+
+def test_codes_for_stage_and_skill():
+    assert codes_for_stage("3", "editing") == ["3.W.3", "3.LU", "3.FFW"]
+    assert codes_for_skill("K", "organization") == ["K.W.2"]
+    assert grade_band(["5", "3", "4"]) == "3-5"
+    assert grade_band(["K", "2"]) == "K,2"
+
+
+def test_lookup_takes_each_code_in_turn():
+    from app.rag.vector_index import SOLVectorIndex
+
+    contents = CONTENTS + [
+        "Writing > 3.W.3 (Grade Three)\nEdit for capitalization.",
+        "Writing > 3.W.3 (Grade Three)\nEdit for punctuation.",
+        "Foundational Writing > 3.FFW.1 (Grade Three)\nSpell grade-level words.",
+    ]
+    metadata = METADATA + [
+        {"grades": ["3"], "standards": ["3.W.3"], "strand": "W", "file_name": "grade3.docx"},
+        {"grades": ["3"], "standards": ["3.W.3"], "strand": "W", "file_name": "grade3.docx"},
+        {"grades": ["3"], "standards": ["3.FFW.1"], "strand": "FFW", "file_name": "grade3.docx"},
+    ]
+    index = SOLVectorIndex(
+        ids=[str(i) for i in range(len(contents))],
+        contents=contents,
+        metadata=metadata,
+        embeddings=np.eye(len(contents), dtype=np.float32),
+    )
+    rows = index.lookup(codes_for_stage("3", "editing"), 4)
+    assert [r["content"] for r in rows] == [contents[6], contents[2], contents[8], contents[7]]
+    assert all(r["similarity"] == 1.0 for r in rows)
+    assert [r["content"] for r in index.lookup(["3.W.2", "3.W.3"], 3)] == [contents[5], contents[6], contents[0]]
@@ -1,4 +1,4 @@
--- Enable pgvector extension
+-- Enable pgvector extension (>= 0.8.0: halfvec, binary_quantize, hnsw.iterative_scan)
 create extension if not exists vector;
 
 -- Profiles Table
@@ -51,34 +51,257 @@ create table public.instructional_state (
 create table public.sol_standards (
   id uuid primary key default gen_random_uuid(),
   content text not null, -- The text chunk
-  metadata jsonb not null, -- { "grade": "3", "stage": "drafting", "skill": "usage" }
-  embedding vector(384) -- MiniLM-L6-v2 dimension
+  metadata jsonb not null, -- { "grades": ["3"], "strand": "W", "standards": ["3.W.2"], "stages": [...] } (app/rag/sol_metadata.py)
+  embedding vector(384), -- MiniLM-L6-v2 dimension
+  chunk_hash text, -- sha256(file_name, text); ingest diffs on it (migrations/03_sol_standards_chunk_hash.sql)
+  corpus_version text not null -- snapshot this row belongs to (migrations/04_sol_corpus_snapshots.sql)
 );
 
+create unique index sol_standards_version_chunk_hash_key
+  on public.sol_standards (corpus_version, chunk_hash);
+
+-- ANN indexes: one over the whole corpus per search mode, plus one partial
+-- index per grade so a one-grade filter scans only that grade's graph
+-- (migrations/02_sol_standards_ann_index.sql, 08_sol_standards_quantized_search.sql,
+-- 10_sol_standards_grade_partial_indexes.sql)
+create index sol_standards_embedding_hnsw
+  on public.sol_standards using hnsw (embedding vector_cosine_ops)
+  with (m = 16, ef_construction = 64);
+
+-- Exact-match SOL code lookups (metadata @> '{"standards": ["3.W.2"]}'),
+-- see migrations/07_sol_standards_code_index.sql
+create index sol_standards_metadata_path_idx
+  on public.sol_standards using gin (metadata jsonb_path_ops);
+
+-- Quantized copies for the coarse candidate scan (halfvec, sign bits)
+create index sol_standards_embedding_halfvec_hnsw
+  on public.sol_standards using hnsw ((embedding::halfvec(384)) halfvec_cosine_ops)
+  with (m = 16, ef_construction = 64);
+
+create index sol_standards_embedding_binary_hnsw
+  on public.sol_standards using hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops)
+  with (m = 16, ef_construction = 64);
+
+do $$
+declare
+  g text;
+begin
+  foreach g in array array['K','1','2','3','4','5','6','7','8','9','10','11','12'] loop
+    execute format(
+      'create index %I on public.sol_standards using hnsw (embedding vector_cosine_ops) '
+      'with (m = 16, ef_construction = 64) where (metadata->''grades'') ? %L',
+      'sol_standards_embedding_hnsw_grades_' || lower(g), g
+    );
+    execute format(
+      'create index %I on public.sol_standards using hnsw ((embedding::halfvec(384)) halfvec_cosine_ops) '
+      'with (m = 16, ef_construction = 64) where (metadata->''grades'') ? %L',
+      'sol_standards_embedding_halfvec_hnsw_grades_' || lower(g), g
+    );
+    execute format(
+      'create index %I on public.sol_standards using hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops) '
+      'with (m = 16, ef_construction = 64) where (metadata->''grades'') ? %L',
+      'sol_standards_embedding_binary_hnsw_grades_' || lower(g), g
+    );
+  end loop;
+end;
+$$;
+
+-- Active corpus version (single row). Ingest builds a new snapshot of
+-- sol_standards and flips this pointer with activate_sol_corpus_version;
+-- match_sol_standards only reads the active snapshot and API workers key
+-- their in-memory caches off it.
+create table public.sol_corpus_state (
+  id integer primary key default 1 check (id = 1),
+  version text not null,
+  updated_at timestamptz default now()
+);
+
+create table public.sol_corpus_versions (
+  version text primary key,
+  status text not null default 'building'
+    check (status in ('building', 'active', 'retired', 'failed')),
+  chunk_count integer,
+  created_at timestamptz default now(),
+  activated_at timestamptz
+);
+
+-- Expectations extracted per grade x stage x chunk at ingest time, per corpus
+-- version (see migrations/09_sol_expectation_catalog.sql)
+create table public.sol_expectation_catalog (
+  corpus_version text not null,
+  extractor text not null,
+  grade text not null,
+  stage text not null,
+  content_hash text not null,
+  expectations jsonb not null,
+  created_at timestamptz default now(),
+  primary key (corpus_version, extractor, grade, stage, content_hash)
+);
+
+-- Copies chunks from one snapshot into another without re-embedding them.
+-- `chunks` is [{"chunk_hash": ..., "metadata": {...} | null}]; a null
+-- metadata keeps the stored one. Returns the number of rows copied.
+create or replace function copy_sol_chunks (
+  source_version text,
+  target_version text,
+  chunks jsonb
+) returns integer language sql as $$
+  with copied as (
+    insert into sol_standards (content, metadata, embedding, chunk_hash, corpus_version)
+    select s.content, coalesce(c.metadata, s.metadata), s.embedding, s.chunk_hash, target_version
+      from jsonb_to_recordset(chunks) as c(chunk_hash text, metadata jsonb)
+      join sol_standards s
+        on s.chunk_hash = c.chunk_hash
+       and s.corpus_version = source_version
+    on conflict (corpus_version, chunk_hash) do nothing
+    returning 1
+  )
+  select count(*)::integer from copied;
+$$;
+
+-- Rewrites the metadata of chunks in a snapshot that is still being built
+-- (near-duplicate merges, see migrations/06_sol_retag_chunks.sql).
+create or replace function retag_sol_chunks (
+  target_version text,
+  chunks jsonb
+) returns integer language sql as $$
+  with retagged as (
+    update sol_standards s
+       set metadata = c.metadata
+      from jsonb_to_recordset(chunks) as c(chunk_hash text, metadata jsonb)
+     where s.chunk_hash = c.chunk_hash
+       and s.corpus_version = target_version
+       and exists (
+         select 1 from sol_corpus_versions v
+          where v.version = target_version and v.status = 'building'
+       )
+    returning 1
+  )
+  select count(*)::integer from retagged;
+$$;
+
+-- Validates a built snapshot and makes it the active one. Raises (and
+-- changes nothing) if the snapshot does not hold exactly expected_count
+-- embedded chunks. Returns the version it replaced.
+create or replace function activate_sol_corpus_version (
+  new_version text,
+  expected_count integer
+) returns text language plpgsql as $$
+declare
+  previous_version text;
+  actual_count integer;
+begin
+  select count(*) into actual_count
+    from sol_standards
+   where corpus_version = new_version
+     and embedding is not null;
+  if actual_count <> expected_count then
+    raise exception 'SOL corpus version % has % embedded chunks, expected %',
+      new_version, actual_count, expected_count;
+  end if;
+
+  -- Row lock serialises concurrent activations
+  select version into previous_version from sol_corpus_state where id = 1 for update;
+
+  insert into sol_corpus_state (id, version, updated_at)
+    values (1, new_version, now())
+    on conflict (id) do update set version = excluded.version, updated_at = excluded.updated_at;
+
+  update sol_corpus_versions
+     set status = 'retired'
+   where status = 'active' and version <> new_version;
+  insert into sol_corpus_versions (version, status, chunk_count, activated_at)
+    values (new_version, 'active', actual_count, now())
+    on conflict (version) do update
+      set status = 'active', chunk_count = excluded.chunk_count, activated_at = excluded.activated_at;
+
+  delete from sol_standards
+   where corpus_version in (
+     select version from sol_corpus_versions
+      where status in ('retired', 'failed')
+        and version is distinct from previous_version
+   );
+
+  return previous_version;
+end;
+$$;
+
 -- Create a search function for RAG
+-- A one-grade filter is inlined so the planner uses that grade's partial HNSW
+-- index (the grade applies before the distance ordering); the threshold is
+-- applied to the ANN top-k rather than inside the scan. Only the active corpus
+-- snapshot is searched. search_mode 'halfvec'/'binary' scans the quantized
+-- indexes and rescores candidates exactly
+-- (migrations/08_sol_standards_quantized_search.sql, 10_sol_standards_grade_partial_indexes.sql).
 create or replace function match_sol_standards (
   query_embedding vector(384),
   match_threshold float,
   match_count int,
-  filter_metadata jsonb default '{}'
+  filter_metadata jsonb default '{}',
+  search_mode text default 'exact',
+  rescore_factor int default 10
 ) returns table (
   id uuid,
   content text,
   metadata jsonb,
   similarity float
-) language plpgsql stable as $$
-begin
-  return query (
-    select
-      sol_standards.id,
-      sol_standards.content,
-      sol_standards.metadata,
-      1 - (sol_standards.embedding <=> query_embedding) as similarity
-    from sol_standards
-    where 1 - (sol_standards.embedding <=> query_embedding) > match_threshold
-    and sol_standards.metadata @> filter_metadata
-    order by sol_standards.embedding <=> query_embedding
-    limit match_count
+) language plpgsql stable
+set hnsw.ef_search = 100
+set hnsw.iterative_scan = relaxed_order
+as $$
+declare
+  filter_grade text := coalesce(
+    case when jsonb_array_length(coalesce(filter_metadata->'grades', '[]')) = 1
+         then filter_metadata->'grades'->>0 end,
+    filter_metadata->>'grade'
   );
+  remaining_filter jsonb := filter_metadata;
+  grade_predicate text := 'true';
+  candidate_order text;
+  candidate_count int := match_count;
+  active_version text;
+begin
+  select version into active_version from sol_corpus_state where sol_corpus_state.id = 1;
+
+  -- Inline the grade as a literal so the planner picks that grade's partial index.
+  if filter_grade is not null then
+    grade_predicate := format('(s.metadata->''grades'') ? %L', filter_grade);
+    remaining_filter := filter_metadata - 'grade' - 'grades';
+  end if;
+
+  -- Must match the index expressions above for the planner to use them
+  candidate_order := case search_mode
+    when 'exact' then 's.embedding <=> $1'
+    when 'halfvec' then 's.embedding::halfvec(384) <=> $1::halfvec(384)'
+    when 'binary' then 'binary_quantize(s.embedding)::bit(384) <~> binary_quantize($1)'
+  end;
+  if candidate_order is null then
+    raise exception 'unknown search_mode %', search_mode;
+  end if;
+  if search_mode <> 'exact' then
+    candidate_count := match_count * greatest(rescore_factor, 1);
+  end if;
+
+  return query execute format(
+    'select ranked.id, ranked.content, ranked.metadata, ranked.similarity
+       from (
+         select c.id, c.content, c.metadata,
+                1 - (c.embedding <=> $1) as similarity
+           from (
+             select s.id, s.content, s.metadata, s.embedding
+               from sol_standards s
+              where %s
+                and s.corpus_version = $5
+                and s.metadata @> $2
+              order by %s
+              limit $6
+           ) c
+          order by c.embedding <=> $1
+          limit $3
+       ) ranked
+      where ranked.similarity > $4
+      order by ranked.similarity desc',
+    grade_predicate, candidate_order
+  ) using query_embedding, remaining_filter, match_count, match_threshold, active_version, candidate_count;
 end;
 $$;
@@ -0,0 +1,58 @@
+-- ANN search for SOL standards.
+--
+-- sol_standards.embedding had no index, so match_sol_standards computed the
+-- distance to every row and only then applied `metadata @> filter`. This adds
+-- an HNSW index and rewrites the function so the grade is a predicate of its
+-- own, inlined as a literal ahead of the distance ordering; once the
+-- per-grade partial indexes exist (10_sol_standards_grade_partial_indexes.sql)
+-- the planner scans only that grade's graph. The similarity threshold is
+-- applied to the ANN top-k instead of inside the scan (a threshold in WHERE
+-- defeats the index).
+--
+-- Objects are created unqualified so the script can also be replayed into a
+-- scratch schema (see backend/benchmark_pgvector.py).
+
+create index if not exists sol_standards_embedding_hnsw
+  on sol_standards using hnsw (embedding vector_cosine_ops)
+  with (m = 16, ef_construction = 64);
+
+create or replace function match_sol_standards (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_metadata jsonb default '{}'
+) returns table (
+  id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+) language plpgsql stable
+set hnsw.ef_search = 100
+as $$
+declare
+  filter_grade text := filter_metadata->>'grade';
+  remaining_filter jsonb := filter_metadata - 'grade';
+  grade_predicate text := 'true';
+begin
+  -- Inline the grade as a literal so the planner can match a partial index on it.
+  if filter_grade is not null then
+    grade_predicate := format('s.metadata->>''grade'' = %L', filter_grade);
+  end if;
+
+  return query execute format(
+    'select ranked.id, ranked.content, ranked.metadata, ranked.similarity
+       from (
+         select s.id, s.content, s.metadata,
+                1 - (s.embedding <=> $1) as similarity
+           from sol_standards s
+          where %s
+            and s.metadata @> $2
+          order by s.embedding <=> $1
+          limit $3
+       ) ranked
+      where ranked.similarity > $4
+      order by ranked.similarity desc',
+    grade_predicate
+  ) using query_embedding, remaining_filter, match_count, match_threshold;
+end;
+$$;
@@ -0,0 +1,13 @@
+-- Content-addressed SOL chunks for incremental ingestion.
+--
+-- backend/app/rag/ingest.py used to delete every row and re-embed the whole
+-- corpus on each run. Chunks now carry sha256(file_name || '\0' || text) so
+-- ingest can embed only new chunks, delete only vanished ones and upsert on
+-- the hash. Rows ingested before this migration have no hash; the next
+-- ingest run treats them as stale and replaces them.
+
+alter table sol_standards
+  add column if not exists chunk_hash text;
+
+create unique index if not exists sol_standards_chunk_hash_key
+  on sol_standards (chunk_hash);
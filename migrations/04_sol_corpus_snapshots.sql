@@ -0,0 +1,175 @@
+-- Versioned SOL corpus snapshots with an atomic active-version pointer.
+--
+-- Ingest used to modify the live rows in place, so match_sol_standards saw a
+-- half-written corpus for the whole ingest window (or for good, if a batch
+-- failed). Every row now belongs to a corpus_version. Ingest builds a new
+-- version next to the live one (unchanged chunks are copied server side,
+-- embeddings included), validates its row count and then calls
+-- activate_sol_corpus_version, which flips sol_corpus_state.version in one
+-- transaction. Readers only ever see the active version.
+--
+-- The version being replaced is kept until the next activation so readers
+-- that started paging it finish on a consistent snapshot; older snapshots are
+-- deleted at activation time.
+--
+-- API workers poll sol_corpus_state.version to drop their retrieval caches
+-- and reload the in-process vector index (app/rag/corpus_version.py). Before
+-- this migration they fall back to a row-count signature, which misses
+-- in-place edits.
+
+create table if not exists sol_corpus_state (
+  id integer primary key default 1 check (id = 1),
+  version text not null,
+  updated_at timestamptz default now()
+);
+
+create table if not exists sol_corpus_versions (
+  version text primary key,
+  status text not null default 'building'
+    check (status in ('building', 'active', 'retired', 'failed')),
+  chunk_count integer,
+  created_at timestamptz default now(),
+  activated_at timestamptz
+);
+
+alter table sol_standards
+  add column if not exists corpus_version text;
+
+-- Adopt the rows that are live today as the first snapshot
+insert into sol_corpus_state (id, version)
+  values (1, md5(random()::text))
+  on conflict (id) do nothing;
+
+update sol_standards
+   set corpus_version = (select version from sol_corpus_state where id = 1)
+ where corpus_version is null;
+
+insert into sol_corpus_versions (version, status, chunk_count, activated_at)
+  select s.version, 'active', (select count(*) from sol_standards where corpus_version = s.version), now()
+    from sol_corpus_state s
+   where s.id = 1
+  on conflict (version) do nothing;
+
+alter table sol_standards
+  alter column corpus_version set not null;
+
+-- The same chunk may exist once per snapshot
+drop index if exists sol_standards_chunk_hash_key;
+create unique index if not exists sol_standards_version_chunk_hash_key
+  on sol_standards (corpus_version, chunk_hash);
+
+-- Copies chunks from one snapshot into another without re-embedding them.
+-- `chunks` is [{"chunk_hash": ..., "metadata": {...} | null}]; a null
+-- metadata keeps the stored one. Returns the number of rows copied.
+create or replace function copy_sol_chunks (
+  source_version text,
+  target_version text,
+  chunks jsonb
+) returns integer language sql as $$
+  with copied as (
+    insert into sol_standards (content, metadata, embedding, chunk_hash, corpus_version)
+    select s.content, coalesce(c.metadata, s.metadata), s.embedding, s.chunk_hash, target_version
+      from jsonb_to_recordset(chunks) as c(chunk_hash text, metadata jsonb)
+      join sol_standards s
+        on s.chunk_hash = c.chunk_hash
+       and s.corpus_version = source_version
+    on conflict (corpus_version, chunk_hash) do nothing
+    returning 1
+  )
+  select count(*)::integer from copied;
+$$;
+
+-- Validates a built snapshot and makes it the active one. Raises (and
+-- changes nothing) if the snapshot does not hold exactly expected_count
+-- embedded chunks. Returns the version it replaced.
+create or replace function activate_sol_corpus_version (
+  new_version text,
+  expected_count integer
+) returns text language plpgsql as $$
+declare
+  previous_version text;
+  actual_count integer;
+begin
+  select count(*) into actual_count
+    from sol_standards
+   where corpus_version = new_version
+     and embedding is not null;
+  if actual_count <> expected_count then
+    raise exception 'SOL corpus version % has % embedded chunks, expected %',
+      new_version, actual_count, expected_count;
+  end if;
+
+  -- Row lock serialises concurrent activations
+  select version into previous_version from sol_corpus_state where id = 1 for update;
+
+  insert into sol_corpus_state (id, version, updated_at)
+    values (1, new_version, now())
+    on conflict (id) do update set version = excluded.version, updated_at = excluded.updated_at;
+
+  update sol_corpus_versions
+     set status = 'retired'
+   where status = 'active' and version <> new_version;
+  insert into sol_corpus_versions (version, status, chunk_count, activated_at)
+    values (new_version, 'active', actual_count, now())
+    on conflict (version) do update
+      set status = 'active', chunk_count = excluded.chunk_count, activated_at = excluded.activated_at;
+
+  delete from sol_standards
+   where corpus_version in (
+     select version from sol_corpus_versions
+      where status in ('retired', 'failed')
+        and version is distinct from previous_version
+   );
+
+  return previous_version;
+end;
+$$;
+
+-- Same ANN search as 02, restricted to the active snapshot. While a new
+-- snapshot is being built the HNSW indexes also hold its rows, so iterative
+-- scans (pgvector >= 0.8) keep fetching until match_count active rows pass.
+create or replace function match_sol_standards (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_metadata jsonb default '{}'
+) returns table (
+  id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+) language plpgsql stable
+set hnsw.ef_search = 100
+set hnsw.iterative_scan = relaxed_order
+as $$
+declare
+  filter_grade text := filter_metadata->>'grade';
+  remaining_filter jsonb := filter_metadata - 'grade';
+  grade_predicate text := 'true';
+  active_version text;
+begin
+  select version into active_version from sol_corpus_state where sol_corpus_state.id = 1;
+
+  -- Inline the grade as a literal so the planner can match a partial index on it.
+  if filter_grade is not null then
+    grade_predicate := format('s.metadata->>''grade'' = %L', filter_grade);
+  end if;
+
+  return query execute format(
+    'select ranked.id, ranked.content, ranked.metadata, ranked.similarity
+       from (
+         select s.id, s.content, s.metadata,
+                1 - (s.embedding <=> $1) as similarity
+           from sol_standards s
+          where %s
+            and s.corpus_version = $5
+            and s.metadata @> $2
+          order by s.embedding <=> $1
+          limit $3
+       ) ranked
+      where ranked.similarity > $4
+      order by ranked.similarity desc',
+    grade_predicate
+  ) using query_embedding, remaining_filter, match_count, match_threshold, active_version;
+end;
+$$;
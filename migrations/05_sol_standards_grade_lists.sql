@@ -0,0 +1,69 @@
+-- Per-chunk grade lists.
+--
+-- Ingest now extracts grades from the document structure (SOL codes, grade
+-- headings, file grade bands) and stores metadata.grades = ["3"] or, for
+-- side-by-side documents and progression charts, a band like
+-- ["3","4","5"]. A single grade value cannot express a band, so
+-- match_sol_standards now inlines `metadata->'grades' ? g` for a one-grade
+-- filter; 10_sol_standards_grade_partial_indexes.sql builds the per-grade
+-- partial HNSW indexes on that predicate. Filters may use {"grades": ["3"]}
+-- or the legacy {"grade": "3"}. Needs pgvector >= 0.8.0 (hnsw.iterative_scan).
+
+-- Rows ingested before this migration: lift the single tag into a list
+update sol_standards
+   set metadata = metadata || jsonb_build_object(
+         'grades',
+         case when metadata ? 'grade' then jsonb_build_array(metadata->>'grade') else '[]'::jsonb end
+       )
+ where not metadata ? 'grades';
+
+create or replace function match_sol_standards (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_metadata jsonb default '{}'
+) returns table (
+  id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+) language plpgsql stable
+set hnsw.ef_search = 100
+set hnsw.iterative_scan = relaxed_order
+as $$
+declare
+  filter_grade text := coalesce(
+    case when jsonb_array_length(coalesce(filter_metadata->'grades', '[]')) = 1
+         then filter_metadata->'grades'->>0 end,
+    filter_metadata->>'grade'
+  );
+  remaining_filter jsonb := filter_metadata;
+  grade_predicate text := 'true';
+  active_version text;
+begin
+  select version into active_version from sol_corpus_state where sol_corpus_state.id = 1;
+
+  -- Inline the grade as a literal so the planner can match that grade's partial index.
+  if filter_grade is not null then
+    grade_predicate := format('(s.metadata->''grades'') ? %L', filter_grade);
+    remaining_filter := filter_metadata - 'grade' - 'grades';
+  end if;
+
+  return query execute format(
+    'select ranked.id, ranked.content, ranked.metadata, ranked.similarity
+       from (
+         select s.id, s.content, s.metadata,
+                1 - (s.embedding <=> $1) as similarity
+           from sol_standards s
+          where %s
+            and s.corpus_version = $5
+            and s.metadata @> $2
+          order by s.embedding <=> $1
+          limit $3
+       ) ranked
+      where ranked.similarity > $4
+      order by ranked.similarity desc',
+    grade_predicate
+  ) using query_embedding, remaining_filter, match_count, match_threshold, active_version;
+end;
+$$;
@@ -0,0 +1,27 @@
+-- Metadata rewrites for chunks already uploaded to a snapshot that is still
+-- being built.
+--
+-- Ingest merges near-duplicate chunks (app/rag/dedup.py): the first chunk of
+-- a group is kept and records every source file and grade. It may already be
+-- uploaded when a later file contributes a duplicate, so its final metadata
+-- is written afterwards with retag_sol_chunks. Only `building` snapshots can
+-- be retagged; live ones stay immutable.
+
+create or replace function retag_sol_chunks (
+  target_version text,
+  chunks jsonb
+) returns integer language sql as $$
+  with retagged as (
+    update sol_standards s
+       set metadata = c.metadata
+      from jsonb_to_recordset(chunks) as c(chunk_hash text, metadata jsonb)
+     where s.chunk_hash = c.chunk_hash
+       and s.corpus_version = target_version
+       and exists (
+         select 1 from sol_corpus_versions v
+          where v.version = target_version and v.status = 'building'
+       )
+    returning 1
+  )
+  select count(*)::integer from retagged;
+$$;
@@ -0,0 +1,12 @@
+-- Exact-match lookup of SOL standards by code.
+--
+-- Ingest tags each chunk with the grade-qualified codes it states
+-- (metadata.standards = ["3.W.2"]), its strand and grades. API workers answer
+-- code lookups from an in-memory index (app/rag/standards_index.py); without
+-- one, lookup_sol_standards falls back to jsonb containment queries such as
+--   metadata @> '{"standards": ["3.W.2"]}'
+--   metadata @> '{"grades": ["3"], "strand": "LU"}'
+-- which this index serves without scanning the table.
+
+create index if not exists sol_standards_metadata_path_idx
+  on sol_standards using gin (metadata jsonb_path_ops);
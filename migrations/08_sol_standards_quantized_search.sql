@@ -0,0 +1,102 @@
+-- Quantized candidate scan with exact rescoring for match_sol_standards.
+--
+-- The float32 vector(384) column stays the source of truth. Two expression
+-- HNSW indexes hold quantized copies (their per-grade partial counterparts
+-- are built by 10_sol_standards_grade_partial_indexes.sql):
+--   halfvec(384)  16-bit floats, about half the size of the float32 graph
+--   bit(384)      sign bits (binary_quantize), about 1/32 of the vectors, Hamming distance
+-- match_sol_standards gains search_mode ('exact' | 'halfvec' | 'binary'):
+-- the quantized modes take match_count * rescore_factor candidates from the
+-- quantized index and re-rank them by exact cosine distance on the float
+-- column, so returned similarities are unchanged. Callers that do not pass
+-- search_mode get the previous exact behaviour.
+--
+-- Needs pgvector >= 0.8.0: halfvec and binary_quantize arrived in 0.7, and
+-- match_sol_standards sets hnsw.iterative_scan (0.8) like 04/05 do. Once a
+-- deployment runs on a quantized mode, the float32 HNSW index can be dropped
+-- to reclaim its memory; exact rescoring does not use it.
+
+create index if not exists sol_standards_embedding_halfvec_hnsw
+  on sol_standards using hnsw ((embedding::halfvec(384)) halfvec_cosine_ops)
+  with (m = 16, ef_construction = 64);
+
+create index if not exists sol_standards_embedding_binary_hnsw
+  on sol_standards using hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops)
+  with (m = 16, ef_construction = 64);
+
+-- New trailing parameters with defaults: replace rather than overload, so
+-- named-argument calls through PostgREST stay unambiguous.
+drop function if exists match_sol_standards(vector, float, int, jsonb);
+
+create or replace function match_sol_standards (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_metadata jsonb default '{}',
+  search_mode text default 'exact',
+  rescore_factor int default 10
+) returns table (
+  id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+) language plpgsql stable
+set hnsw.ef_search = 100
+set hnsw.iterative_scan = relaxed_order
+as $$
+declare
+  filter_grade text := coalesce(
+    case when jsonb_array_length(coalesce(filter_metadata->'grades', '[]')) = 1
+         then filter_metadata->'grades'->>0 end,
+    filter_metadata->>'grade'
+  );
+  remaining_filter jsonb := filter_metadata;
+  grade_predicate text := 'true';
+  candidate_order text;
+  candidate_count int := match_count;
+  active_version text;
+begin
+  select version into active_version from sol_corpus_state where sol_corpus_state.id = 1;
+
+  -- Inline the grade as a literal so the planner picks that grade's partial index (10).
+  if filter_grade is not null then
+    grade_predicate := format('(s.metadata->''grades'') ? %L', filter_grade);
+    remaining_filter := filter_metadata - 'grade' - 'grades';
+  end if;
+
+  -- Must match the index expressions (above and in 10) for the planner to use them
+  candidate_order := case search_mode
+    when 'exact' then 's.embedding <=> $1'
+    when 'halfvec' then 's.embedding::halfvec(384) <=> $1::halfvec(384)'
+    when 'binary' then 'binary_quantize(s.embedding)::bit(384) <~> binary_quantize($1)'
+  end;
+  if candidate_order is null then
+    raise exception 'unknown search_mode %', search_mode;
+  end if;
+  if search_mode <> 'exact' then
+    candidate_count := match_count * greatest(rescore_factor, 1);
+  end if;
+
+  return query execute format(
+    'select ranked.id, ranked.content, ranked.metadata, ranked.similarity
+       from (
+         select c.id, c.content, c.metadata,
+                1 - (c.embedding <=> $1) as similarity
+           from (
+             select s.id, s.content, s.metadata, s.embedding
+               from sol_standards s
+              where %s
+                and s.corpus_version = $5
+                and s.metadata @> $2
+              order by %s
+              limit $6
+           ) c
+          order by c.embedding <=> $1
+          limit $3
+       ) ranked
+      where ranked.similarity > $4
+      order by ranked.similarity desc',
+    grade_predicate, candidate_order
+  ) using query_embedding, remaining_filter, match_count, match_threshold, active_version, candidate_count;
+end;
+$$;
@@ -0,0 +1,21 @@
+-- Expectation catalog: gap analysis step 2 precomputed at ingest time.
+--
+-- Structured expectations (skill_domain, expectation, indicators) are
+-- extracted once per grade x stage x chunk by the ingest build step
+-- (app/rag/expectation_catalog.py) instead of by the LLM on every request.
+-- Rows belong to a corpus version, like sol_standards; content_hash is the
+-- sha256 of the chunk text and extractor identifies the prompt and model
+-- that produced the entry. Building a version copies the entries of
+-- unchanged chunks from the previous one and deletes catalogs of older
+-- versions.
+
+create table if not exists sol_expectation_catalog (
+  corpus_version text not null,
+  extractor text not null,
+  grade text not null,
+  stage text not null,
+  content_hash text not null,
+  expectations jsonb not null,
+  created_at timestamptz default now(),
+  primary key (corpus_version, extractor, grade, stage, content_hash)
+);
@@ -0,0 +1,45 @@
+-- Per-grade partial HNSW indexes for match_sol_standards.
+--
+-- Almost every search filters on one grade. Over a whole-corpus HNSW index
+-- that filter can only be applied to the candidates the graph returns, i.e.
+-- after the distance ordering, and a grade holding 1/13 of the rows leaves
+-- few of them. match_sol_standards (08) inlines a one-grade filter as the
+-- literal predicate `(metadata->'grades') ? '<grade>'`, so with one partial
+-- index per grade on that predicate the planner walks only that grade's
+-- graph: the grade is applied before the distance ordering and every
+-- candidate matches it.
+--
+-- One index per grade for each search mode's ordering expression (float32,
+-- halfvec, bit), all created here once grades are lists (05) and the
+-- quantized expressions exist (08). Grades partition the rows (only band
+-- rows repeat), so each mode's partial indexes together take about as much
+-- memory as its whole-corpus index, which stays for unfiltered and
+-- multi-grade searches. Filters on anything else still go through the
+-- `metadata @> filter` containment check and hnsw.iterative_scan.
+--
+-- Needs pgvector >= 0.8.0 like 08. Objects are unqualified so the benchmarks
+-- can replay the migrations into a scratch schema.
+
+do $$
+declare
+  g text;
+begin
+  foreach g in array array['K','1','2','3','4','5','6','7','8','9','10','11','12'] loop
+    execute format(
+      'create index if not exists %I on sol_standards using hnsw (embedding vector_cosine_ops) '
+      'with (m = 16, ef_construction = 64) where (metadata->''grades'') ? %L',
+      'sol_standards_embedding_hnsw_grades_' || lower(g), g
+    );
+    execute format(
+      'create index if not exists %I on sol_standards using hnsw ((embedding::halfvec(384)) halfvec_cosine_ops) '
+      'with (m = 16, ef_construction = 64) where (metadata->''grades'') ? %L',
+      'sol_standards_embedding_halfvec_hnsw_grades_' || lower(g), g
+    );
+    execute format(
+      'create index if not exists %I on sol_standards using hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops) '
+      'with (m = 16, ef_construction = 64) where (metadata->''grades'') ? %L',
+      'sol_standards_embedding_binary_hnsw_grades_' || lower(g), g
+    );
+  end loop;
+end;
+$$;